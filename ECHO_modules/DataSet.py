@@ -5,8 +5,11 @@ from itertools import islice
 from . import geographies
 from .DataSetResults import DataSetResults
 from .get_data import get_echo_data
-from .utilities import get_facs_in_counties, filter_by_geometry
-from .utilities import get_min_max_coord
+from .crosswalk import LOOKUP_REGION_TYPES, crosswalk_registry_ids
+from .facilities import county_filter, filter_by_geometry, get_facs_in_counties
+from .facilities import get_min_max_coord, local_facilities
+from .dimension import PROGRAM_FLAGS
+from .program_index import program_ids
 import json
 import requests
 import time
@@ -135,6 +138,15 @@ class DataSet:
 
         if (region_type == 'Neighborhood'):
             return self._get_nbhd_data(region_value, years) # TODO: can't continue, has geometry data
+
+        if (region_type in LOOKUP_REGION_TYPES):
+            # No ECHO field for these regions, so look up their facilities in the crosswalk
+            states = [state] if isinstance(state, str) else state
+            registry_ids = crosswalk_registry_ids(region_type, region_value, states)
+            if registry_ids is None:
+                print("No crosswalk was found. Run crosswalk.build_crosswalk() for the state first.")
+                return None
+            return self.get_data_by_ids(registry_ids, use_registry_id=True, years=years)
         
         filter = self._set_facility_filter( region_type, region_value, state )
         try:
@@ -150,15 +162,13 @@ class DataSet:
             print(self.last_sql)
             program_data = get_echo_data( x_sql, self.idx_field, self.table_name, api=self.api, token=self.token) 
             print(self.idx_field)
+            if ( region_type == 'County' and program_data is not None and 'FAC_COUNTY' in program_data.columns ):
+                # The filter can match other counties with names like these
+                program_data = get_facs_in_counties( program_data, region_value )
             program_data = self._apply_date_filter(program_data, years)
         except pd.errors.EmptyDataError:
             print( "No program records were found.")
 
-        if (region_type == 'County'):
-            if (type(region_value) == str):
-                region_value = [region_value,]
-            program_data = get_facs_in_counties(program_data, region_value)
-
         if ( program_data is not None ):
             print( "There were {} program records found".format( str( len( program_data ))))        
         return program_data
@@ -222,6 +232,13 @@ class DataSet:
         else:
             ee_ids_len = len( ee_ids )
 
+        # Look the ids up in the local EXP_PGM index, if it has been built
+        local = program_ids( ee_ids )
+        if ( local is not None ):
+            print( "{} ids were searched".format( str( ee_ids_len )))
+            print( "{} program ids were found".format( str( len( local ))))
+            return local['PGM_ID']
+
         iterator = iter(ee_ids)
         while chunk := list(islice(iterator, self.ids_per_request)):
             id_string = ""
@@ -283,6 +300,14 @@ class DataSet:
     # Spatial data function
     def _get_nbhd_data(self, points, years=None):
 
+        # Find the program's facilities in the local facility dimension, if it has them
+        echo_types = self.echo_type if type(self.echo_type) == list else [self.echo_type]
+        found = [local_facilities(None, 'Neighborhood', points, flag=PROGRAM_FLAGS[t], active=False)
+                 for t in echo_types]
+        if all(f is not None for f in found):
+            echo_ids = [i for f in found for i in f.index.to_list()]
+            return self.get_data_by_ids(ids=echo_ids, use_registry_id=True, years=years)
+
         min_lon = min(p[0] for p in points)
         max_lon = max(p[0] for p in points)
         min_lat = min(p[1] for p in points)
@@ -427,7 +452,10 @@ class DataSet:
             return None
         elif region_type == 'State':
             region_value = state
-        if region_type == 'County' or region_type == 'State':
+        if region_type == 'County':
+            # Select the counties in the query, by all of the names ECHO has for them
+            filter = county_filter( state, region_value )
+        elif region_type == 'State':
             filter = '' + geographies.region_field['State']['field'] + ''
             filter += ' = \'' + state + '\''
         else:
@@ -0,0 +1,244 @@
+'''
+Aggregate DataSet records by facility.
+
+The records are grouped on their integer-coded facility ID alone, and
+the count, sum, first and last dates and totals by year come out of one
+pass with numpy. The facility name and coordinates are joined afterwards
+from a table with one row per facility, so a facility whose records have
+slightly different coordinates or names isn't split into several, and the
+records themselves are left as they are.
+'''
+
+import numpy as np
+import pandas as pd
+
+# The facility fields joined to the aggregated records
+FACILITY_FIELDS = ['FAC_NAME', 'FAC_LAT', 'FAC_LONG']
+PENALTY_PROGRAMS = ('CAA Penalties', 'RCRA Penalties', 'CWA Penalties')
+EMISSION_PROGRAMS = ('Greenhouse Gas Emissions', 'Toxic Releases')
+SDWA_YEAR_PROGRAMS = ('SDWA Public Water Systems', 'SDWA Serious Violators')
+# The fiscal year SDWA_YEAR_PROGRAMS are mapped for
+SDWA_FISCAL_YEAR = 2021
+
+
+def record_dates(values, date_format):
+    '''
+    Parse the dates of records. Each distinct value is only parsed once.
+    Year fields ('%Y'), including CWA's YEARQTR, become the start of the year.
+    Dates DataSet.store_results has already parsed are used as they are.
+
+    Parameters
+    ----------
+    values : Series
+        The date field, e.g. a DataSet's date_field
+    date_format : str
+        The DataSet's date_format, e.g. '%m/%d/%Y'
+
+    Returns
+    -------
+    ndarray
+        datetime64[ns], NaT where a value can't be parsed
+    '''
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.Series(values, copy=False).to_numpy('datetime64[ns]')
+    codes, uniques = pd.factorize(pd.Series(values, copy=False))
+    uniques = pd.Series(np.asarray(uniques, dtype=object)).astype(str)
+    if date_format == '%Y':
+        uniques = uniques.str[0:4]
+    parsed = pd.to_datetime(uniques, format=date_format, errors='coerce').to_numpy(dtype='datetime64[ns]')
+    dates = np.full(len(codes), np.datetime64('NaT'), dtype='datetime64[ns]')
+    dates[codes >= 0] = parsed[codes[codes >= 0]]
+    return dates
+
+
+def record_ids(df, idx_field):
+    '''
+    The facility ID of each record, from a column or from the index, where
+    get_echo_data puts it.
+
+    Parameters
+    ----------
+    df : DataFrame
+    idx_field : str
+        The facility ID field, e.g. a DataSet's idx_field
+
+    Returns
+    -------
+    Series or Index
+    '''
+    if idx_field in df.columns:
+        return df[idx_field]
+    return df.index.get_level_values(idx_field)
+
+
+def _first_values(df, fields, codes, n):
+    # The first non-missing value of each field for each code
+    keep = codes >= 0
+    return df.loc[keep, fields].groupby(codes[keep]).first().reindex(range(n))
+
+
+def facility_dimension(df, idx_field, fields=FACILITY_FIELDS):
+    '''
+    A table with one row per facility and its first non-missing value of
+    each field.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Records with the facility fields
+    idx_field : str
+        The facility ID field or index level, e.g. a DataSet's idx_field
+    fields : list
+        The facility fields to keep
+
+    Returns
+    -------
+    DataFrame
+        Indexed by idx_field
+    '''
+    codes, ids = pd.factorize(record_ids(df, idx_field))
+    dimension = _first_values(df, [f for f in fields if f in df.columns], codes, len(ids))
+    dimension.index = pd.Index(ids, name=idx_field)
+    return dimension
+
+
+def aggregate_records(df, idx_field, values=None, dates=None, label='count', fields=FACILITY_FIELDS):
+    '''
+    Aggregate records by facility in one pass: the number of records and,
+    if values are given, their sum; the first and last dates; and the
+    count or sum for each year.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The records
+    idx_field : str
+        The facility ID field or index level. Records without one are left out.
+    values : array-like
+        Optional value of each record to sum. Missing values count as 0.
+    dates : array-like
+        Optional datetime64 date of each record (see record_dates)
+    label : str
+        The name of the column with the sum (or count, if there are no
+        values). The yearly columns are named label_YYYY.
+    fields : list
+        Facility fields to join from the first records of each facility
+
+    Returns
+    -------
+    DataFrame
+        One row per facility, with idx_field, fields, count, label,
+        first_date, last_date and label_YYYY columns
+    '''
+    codes, ids = pd.factorize(record_ids(df, idx_field))
+    n = len(ids)
+    keep = codes >= 0
+    kept = codes[keep]
+    result = pd.DataFrame({idx_field: ids})
+    result = pd.concat([result, _first_values(df, [f for f in fields if f in df.columns], codes, n)
+                        .reset_index(drop=True)], axis=1)
+    result['count'] = np.bincount(kept, minlength=n)
+    weights = None
+    if values is not None:
+        weights = np.nan_to_num(np.asarray(values, dtype=float)[keep])
+        result[label] = np.bincount(kept, weights=weights, minlength=n)
+    elif label != 'count':
+        result[label] = result['count']
+
+    if dates is not None:
+        dates = np.asarray(dates, dtype='datetime64[ns]')[keep]
+        dated = ~np.isnat(dates)
+        span = pd.Series(dates[dated]).groupby(kept[dated]).agg(['min', 'max']).reindex(range(n))
+        result['first_date'] = span['min'].to_numpy()
+        result['last_date'] = span['max'].to_numpy()
+        # A count (or sum) for each facility and year, from one bincount
+        years = dates.astype('datetime64[Y]').astype(np.int64)[dated] + 1970
+        if len(years):
+            year_codes, year_values = pd.factorize(years, sort=True)
+            cells = kept[dated] * len(year_values) + year_codes
+            by_year = np.bincount(cells, weights=None if weights is None else weights[dated],
+                                  minlength=n * len(year_values)).reshape(n, len(year_values))
+            for i, year in enumerate(year_values):
+                result[f'{label}_{year}'] = by_year[:, i]
+    return result
+
+
+def program_metric(df, dataset, program=None, all_years=False):
+    '''
+    What aggregate_by_facility measures for a DataSet: the value of each
+    record (or None to count records), the name of the result, and the
+    records to include.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The DataSet's records, which are not changed
+    dataset : DataSet
+    program : str
+        Optional - the program to measure for. Defaults to dataset.name.
+    all_years : bool
+        Include every fiscal year of SDWA_YEAR_PROGRAMS, not just
+        SDWA_FISCAL_YEAR
+
+    Returns
+    -------
+    dict
+        values, aggregator, rows (a boolean mask) and positive (whether
+        only facilities with a result above 0 are kept)
+    '''
+    program = program or dataset.name
+    rows = np.ones(len(df), dtype=bool)
+    if program == 'CWA Violations':
+        values = sum(pd.to_numeric(df[c], errors='coerce').fillna(0)
+                     for c in ('NUME90Q', 'NUMCVDT', 'NUMSVCD', 'NUMPSCH')).to_numpy()
+        return dict(values=values, aggregator='sum', rows=rows, positive=True)
+    if program in PENALTY_PROGRAMS:
+        values = pd.to_numeric(df[dataset.agg_col], errors='coerce').fillna(0)
+        if program == 'CWA Penalties':
+            values = values + pd.to_numeric(df['STATE_LOCAL_PENALTY_AMT'], errors='coerce').fillna(0)
+        return dict(values=values.to_numpy(), aggregator='Amount', rows=rows, positive=True)
+    if program in EMISSION_PROGRAMS or program in SDWA_YEAR_PROGRAMS:
+        if program in SDWA_YEAR_PROGRAMS and not all_years:
+            # Only the latest fiscal year
+            rows = (pd.to_numeric(df[dataset.date_field], errors='coerce') == SDWA_FISCAL_YEAR).to_numpy()
+        values = pd.to_numeric(df[dataset.agg_col], errors='coerce').to_numpy()
+        return dict(values=values, aggregator='sum', rows=rows, positive=False)
+    # Count the records with a date
+    rows = df[dataset.date_field].notna().to_numpy()
+    return dict(values=None, aggregator='count', rows=rows, positive=True)
+
+
+def aggregate_program(df, dataset, program=None):
+    '''
+    Aggregate a DataSet's records by facility, measuring what suits the
+    program (see program_metric), without changing the records.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The DataSet's records, e.g. a DataSetResults' dataframe
+    dataset : DataSet
+    program : str
+        Optional - the program to measure for. Defaults to dataset.name.
+
+    Returns
+    -------
+    tuple
+        The DataFrame of facilities and the name of its aggregated column
+    '''
+    metric = program_metric(df, dataset, program)
+    rows = metric['rows']
+    records = df[rows] if not rows.all() else df
+    values = None if metric['values'] is None else metric['values'][rows]
+    dates = None
+    if dataset.date_field in records.columns:
+        dates = record_dates(records[dataset.date_field], dataset.date_format)
+    aggregator = metric['aggregator']
+    result = aggregate_records(records, dataset.idx_field, values, dates, aggregator)
+    if aggregator == 'sum' and dataset.agg_col in df.columns and (program or dataset.name) != 'CWA Violations':
+        result[dataset.agg_col] = result['sum']
+    elif aggregator == 'count':
+        result[dataset.date_field] = result['count']
+    if metric['positive']:
+        result = result[result[aggregator] > 0].reset_index(drop=True)
+    return result, aggregator
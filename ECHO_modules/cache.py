@@ -0,0 +1,43 @@
+'''
+Where ECHO_modules keeps files it has downloaded or built so they don't
+have to be fetched again on every call. Set the ECHO_MODULES_CACHE_DIR
+environment variable to use a different directory.
+'''
+
+import os
+import threading
+
+CACHE_DIR = os.environ.get('ECHO_MODULES_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'ECHO_modules'))
+
+
+def cache_path(*parts):
+    '''
+    Return the path of a file in the cache, creating its directory if needed.
+
+    Parameters
+    ----------
+    parts : str
+        Path components under the cache directory, e.g. 'tracts', 'tl_2010_36_tract10.parquet'
+
+    Returns
+    -------
+    str
+    '''
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def write_atomic(path, write):
+    '''
+    Call write(tmp_path) and move the result to path, so a reader never sees
+    a partly written file, e.g. when several states are loaded in parallel.
+    '''
+    tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
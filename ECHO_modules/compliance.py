@@ -0,0 +1,222 @@
+'''
+Quarterly compliance histories, such as CAA_3YR_COMPL_QTRS_HISTORY, as
+bitmasks.
+
+ECHO_EXPORTER has a character for each quarter: 'V' for a violation, 'S'
+for significant noncompliance, and others for quarters in compliance or
+unknown. get_echo_data decodes ECHO_EXPORTER's histories once, into two
+uint16 columns for each: one with a bit set for each quarter in violation
+and one for each quarter in significant noncompliance. Bit 0 is the most recent
+quarter (the last character). Counting quarters, finding runs of them and
+comparing recent quarters with earlier ones are then integer operations.
+'''
+
+import numpy as np
+import pandas as pd
+
+# The compliance histories in ECHO_EXPORTER, most recent quarter last
+HISTORY_FIELDS = ['CAA_3YR_COMPL_QTRS_HISTORY', 'CWA_13QTRS_COMPL_HISTORY',
+                  'RCRA_3YR_COMPL_QTRS_HISTORY', 'SDWA_3YR_COMPL_QTRS_HISTORY']
+# Suffixes of the bitmask columns added for each history
+VIOLATION_SUFFIX = '_VIOL_MASK'
+SNC_SUFFIX = '_SNC_MASK'
+# The most quarters a uint16 mask holds
+MASK_QUARTERS = 16
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _history_chars(history):
+    # The characters of the histories as an array of bytes, one row each
+    values = pd.Series(history, copy=False).fillna('').astype(str).to_numpy(dtype=object)
+    chars = values.astype('S') if len(values) else np.empty(0, dtype='S1')
+    width = max(chars.dtype.itemsize, 1)
+    return chars.astype(f'S{width}').view(np.uint8).reshape(len(chars), width)
+
+
+def history_bitmasks(history):
+    '''
+    Decode compliance histories into violation and significant
+    noncompliance bitmasks. Only the most recent MASK_QUARTERS quarters are
+    kept.
+
+    Parameters
+    ----------
+    history : Series
+        The history strings, e.g. CAA_3YR_COMPL_QTRS_HISTORY
+
+    Returns
+    -------
+    tuple
+        uint16 arrays of the quarters with 'V' and with 'S', aligned with history
+    '''
+    chars = _history_chars(history)
+    lengths = (chars != 0).sum(axis=1)
+    violations = np.zeros(len(chars), dtype=np.uint16)
+    snc = np.zeros(len(chars), dtype=np.uint16)
+    for position in range(chars.shape[1]):
+        # The bit of the character, counting back from the last one in its string
+        bit = lengths - 1 - position
+        weight = np.where((bit >= 0) & (bit < MASK_QUARTERS),
+                          np.left_shift(1, bit.clip(0, MASK_QUARTERS - 1)), 0).astype(np.uint16)
+        violations |= np.where(chars[:, position] == ord('V'), weight, np.uint16(0))
+        snc |= np.where(chars[:, position] == ord('S'), weight, np.uint16(0))
+    return violations, snc
+
+
+def add_history_bitmasks(df, fields=HISTORY_FIELDS):
+    '''
+    Add the violation and significant noncompliance bitmasks of each
+    compliance history in df, e.g. CAA_3YR_COMPL_QTRS_HISTORY_VIOL_MASK and
+    CAA_3YR_COMPL_QTRS_HISTORY_SNC_MASK.
+
+    Parameters
+    ----------
+    df : DataFrame
+    fields : list
+        The history fields to decode, if df has them
+
+    Returns
+    -------
+    DataFrame
+        df, with the bitmask columns
+    '''
+    if df is None:
+        return df
+    for field in fields:
+        if field in df.columns:
+            df[field + VIOLATION_SUFFIX], df[field + SNC_SUFFIX] = history_bitmasks(df[field])
+    return df
+
+
+def popcount(masks):
+    '''
+    The number of bits set in each mask, i.e. the number of quarters.
+
+    Parameters
+    ----------
+    masks : array-like
+        uint16 bitmasks
+
+    Returns
+    -------
+    ndarray
+    '''
+    masks = np.asarray(masks, dtype=np.uint16)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks)
+    return _POPCOUNT[masks & 0xff] + _POPCOUNT[masks >> 8]
+
+
+def consecutive_quarters(masks):
+    '''
+    The number of most recent quarters in a row with their bit set, e.g.
+    how many quarters a facility has been in violation up to now.
+
+    Parameters
+    ----------
+    masks : array-like
+        uint16 bitmasks
+
+    Returns
+    -------
+    ndarray
+    '''
+    masks = np.asarray(masks, dtype=np.uint16)
+    # The trailing ones of the mask are the trailing zeros of its complement
+    clear = ~masks
+    lowest = clear & (~clear + np.uint16(1))
+    return np.where(lowest == 0, MASK_QUARTERS, np.log2(np.maximum(lowest, 1))).astype(np.uint8)
+
+
+def longest_run(masks):
+    '''
+    The longest run of quarters in a row with their bit set, at any time.
+
+    Parameters
+    ----------
+    masks : array-like
+        uint16 bitmasks
+
+    Returns
+    -------
+    ndarray
+    '''
+    runs = np.asarray(masks, dtype=np.uint16).copy()
+    longest = np.zeros(runs.shape, dtype=np.uint8)
+    # Each step leaves the bits that end a run at least one longer
+    while runs.any():
+        longest += runs != 0
+        runs &= runs >> np.uint16(1)
+    return longest
+
+
+def quarters_between(masks, start=0, stop=4):
+    '''
+    The number of quarters with their bit set from start to stop quarters
+    back, e.g. start=0, stop=4 for the last year and 4, 8 for the year
+    before, to compare them.
+
+    Parameters
+    ----------
+    masks : array-like
+        uint16 bitmasks
+    start : int
+        The first quarter back, 0 being the most recent
+    stop : int
+        The quarter back to stop before
+
+    Returns
+    -------
+    ndarray
+    '''
+    window = ((1 << stop) - 1) ^ ((1 << start) - 1)
+    return popcount(np.asarray(masks, dtype=np.uint16) & np.uint16(window))
+
+
+def noncompliance_counts(history):
+    '''
+    The number of quarters in violation ('V') or significant noncompliance
+    ('S') in each compliance history, e.g. CAA_3YR_COMPL_QTRS_HISTORY.
+
+    Parameters
+    ----------
+    history : Series
+        The compliance history strings
+
+    Returns
+    -------
+    Series
+        The counts, aligned with history
+    '''
+    chars = _history_chars(history)
+    counts = ((chars == ord('S')) | (chars == ord('V'))).sum(axis=1)
+    return pd.Series(counts.astype(np.int16), index=getattr(history, 'index', None))
+
+
+def facility_noncompliance(df, field):
+    '''
+    The number of quarters in violation or significant noncompliance for
+    each facility, from the bitmasks of the history if df has them (see
+    add_history_bitmasks) and from the history itself if not, or where they
+    are missing, e.g. for rows concatenated from data without them.
+
+    Parameters
+    ----------
+    df : DataFrame
+    field : str
+        The history field, e.g. 'CAA_3YR_COMPL_QTRS_HISTORY'
+
+    Returns
+    -------
+    ndarray
+    '''
+    if field + VIOLATION_SUFFIX in df.columns and field + SNC_SUFFIX in df.columns:
+        violations = df[field + VIOLATION_SUFFIX]
+        snc = df[field + SNC_SUFFIX]
+        missing = (violations.isna() | snc.isna()).to_numpy()
+        masks = violations.fillna(0).to_numpy(dtype=np.uint16) | snc.fillna(0).to_numpy(dtype=np.uint16)
+        counts = popcount(masks).astype(np.int16)
+        if missing.any() and field in df.columns:
+            counts[missing] = noncompliance_counts(df[field][missing]).to_numpy()
+        return counts
+    return noncompliance_counts(df[field]).to_numpy()
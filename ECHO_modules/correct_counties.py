@@ -7,22 +7,16 @@ Created on Wed Sep  6 17:05:40 2023
 
 The ECHO_Exporter data for facilities has inconsistent names for counties.
 This script strips the most common extra substrings so we can consolidate
-the facilities into counties.
+the facilities into counties. The same correction is applied to retrieved
+data as the FAC_COUNTY_CANON column.
 """
-from csv import reader
 import pandas as pd
+from ECHO_modules.reference import build_reference_tables, canonical_counties
 
 input_filename = "../data/state_counties.csv"
 counties = pd.read_csv(input_filename)
-counties['County'] = ''
-
-to_strip = [' COUNTY', ' BOROUGH', ' (CA)', '(CA)', ' (CITY)', ' CENSUS AREA', 
-            ' CITY AND BOROUGH', ' CITY AND', ' CITY', ' PARISH', ' COUNT', 
-            ' COUN', ' (B)', ' MUNICIPIO']
-for index, row in counties.iterrows():
-    cx = row['FAC_COUNTY'].rstrip()
-    for x in to_strip:
-        strip_len = -(len(x))
-        cx = cx[:strip_len] if cx.endswith(x) else cx
-    row['County'] = cx
+# Strip the suffixes (see reference.COUNTY_SUFFIXES), keeping the corrections
+# already made by hand in the packaged table
+counties['County'] = canonical_counties(counties['FAC_COUNTY'], counties['FAC_STATE']).astype(object)
 counties.to_csv('../data/state_counties_corrected.csv')
+build_reference_tables('../data')
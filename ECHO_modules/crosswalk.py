@@ -0,0 +1,205 @@
+'''
+A crosswalk from ECHO_EXPORTER facilities (REGISTRY_ID) to the codes of
+the geographies they are in: census tract and block group, ZIP code
+(ZCTA), HUC8/10/12 watershed, county FIPS code and current congressional
+district.
+
+The facilities in a state are matched to the boundaries once, by
+build_crosswalk, and the codes are kept in the cache. After that, finding
+the facilities in a HUC12 or a census tract, or grouping records by county
+FIPS code, is a lookup instead of a spatial query or a match on county
+names.
+'''
+
+import glob
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from ECHO_modules.cache import cache_path, write_atomic
+from ECHO_modules.geometry import points_to_regions
+from ECHO_modules.get_data import get_echo_data, get_spatial_data
+
+# Crosswalk column: (region type in geographies.spatial_tables, id field in its boundaries)
+CROSSWALK_LEVELS = {
+    'TRACT_GEOID': ('Census Tract', 'GEOID10'),
+    'BLOCK_GROUP_GEOID': ('Census Block Group', 'GEOID'),
+    'ZCTA': ('Zip Code', 'ZIP_CODE'),
+    'HUC8': ('Watershed', 'huc8'),
+    'HUC10': ('HUC10 Watersheds', 'huc10'),
+    'HUC12': ('HUC12 Watersheds', 'huc12'),
+    'COUNTY_FIPS': ('County', 'GEOID'),
+    'CD_GEOID': ('Current Congressional District', 'GEOID'),
+}
+# The region types that have no ECHO_EXPORTER field, so their facilities
+# are found through the crosswalk
+LOOKUP_REGION_TYPES = {
+    'Census Tract': 'TRACT_GEOID',
+    'Census Block Group': 'BLOCK_GROUP_GEOID',
+    'HUC10 Watersheds': 'HUC10',
+    'HUC12 Watersheds': 'HUC12',
+    'Current Congressional District': 'CD_GEOID',
+}
+
+
+def _crosswalk_file(state):
+    return cache_path('crosswalk', f'{state}.parquet')
+
+
+def build_crosswalk(states, levels=None, api=True, token=None):
+    '''
+    Match every ECHO_EXPORTER facility in the states to the boundaries of
+    each level and store the codes in the cache. Rebuild after the
+    ECHO_EXPORTER data or the boundaries change.
+
+    Parameters
+    ----------
+    states : list
+        State abbreviations e.g. ["NY", "NJ"]
+    levels : list
+        Optional - crosswalk columns to build, e.g. ["HUC12", "TRACT_GEOID"].
+        Defaults to all of CROSSWALK_LEVELS.
+    api : bool
+        If True, use the API to get the facilities. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Returns
+    -------
+    list
+        The states for which a crosswalk was written
+    '''
+    if levels is None:
+        levels = list(CROSSWALK_LEVELS)
+    built = []
+    for state in states:
+        sql = f"select REGISTRY_ID, FAC_LAT, FAC_LONG from ECHO_EXPORTER where FAC_STATE = '{state}'"
+        facilities = get_echo_data(sql, api=api, token=token)
+        if facilities is None or facilities.empty:
+            print(f"No facilities were found for {state}.")
+            continue
+        crosswalk = pd.DataFrame({'REGISTRY_ID': pd.to_numeric(facilities['REGISTRY_ID'])
+                                                   .to_numpy(dtype='int64')})
+        missing = None
+        for column in levels:
+            region_type, id_field = CROSSWALK_LEVELS[column]
+            regions, _ = get_spatial_data(region_type, [state], state_boundaries=False)
+            if regions.empty:
+                # Every state has boundaries at each level, so they couldn't be fetched
+                missing = region_type
+                break
+            # Services differ in the case of their field names
+            id_field = next((c for c in regions.columns if c.lower() == id_field.lower()), id_field)
+            crosswalk[column] = points_to_regions(facilities, regions, id_field).to_numpy()
+            crosswalk[column] = crosswalk[column].astype('string').astype('category')
+        if missing is not None:
+            # Rather than storing a crosswalk that finds no facilities in them
+            print(f"No {missing} boundaries could be fetched for {state}, so its crosswalk wasn't written.")
+            continue
+        crosswalk = crosswalk.sort_values('REGISTRY_ID', ignore_index=True)
+        write_atomic(_crosswalk_file(state), lambda tmp_path: crosswalk.to_parquet(tmp_path))
+        print(f"Wrote the crosswalk for {len(crosswalk)} facilities in {state}.")
+        built.append(state)
+    _load_state.cache_clear()
+    return built
+
+
+@lru_cache(maxsize=None)
+def _load_state(state):
+    path = _crosswalk_file(state)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path).set_index('REGISTRY_ID')
+
+
+def load_crosswalk(states=None):
+    '''
+    Return the crosswalk for the states, indexed by REGISTRY_ID.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state that has a
+        crosswalk in the cache.
+
+    Returns
+    -------
+    DataFrame or None
+        None if no crosswalk has been built for the states
+    '''
+    if states is None:
+        states = [os.path.basename(f)[:-len('.parquet')]
+                  for f in glob.glob(os.path.join(os.path.dirname(_crosswalk_file('XX')), '*.parquet'))]
+    elif isinstance(states, str):
+        states = [states]
+    frames = [f for f in (_load_state(s) for s in sorted(states)) if f is not None]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames).astype({c: 'category' for c in frames[0].columns})
+
+
+def crosswalk_registry_ids(region_type, codes, states=None):
+    '''
+    The REGISTRY_IDs of the facilities in the regions.
+
+    Parameters
+    ----------
+    region_type : str
+        One of LOOKUP_REGION_TYPES, e.g. 'HUC12 Watersheds'
+    codes : list or str
+        The region codes, e.g. HUC12s or tract GEOIDs
+    states : list
+        Optional - limit the lookup to these states' crosswalks
+
+    Returns
+    -------
+    ndarray or None
+        The REGISTRY_IDs, or None if there is no crosswalk to look in
+    '''
+    crosswalk = load_crosswalk(states)
+    if crosswalk is None:
+        return None
+    if isinstance(codes, str):
+        codes = ''.join(codes.split()).split(',')
+    column = crosswalk[LOOKUP_REGION_TYPES[region_type]]
+    return crosswalk.index.to_numpy()[column.isin([str(c) for c in codes]).to_numpy()]
+
+
+def crosswalk_codes(registry_ids, column, states=None):
+    '''
+    The code of the given level for each facility.
+
+    Parameters
+    ----------
+    registry_ids : sequence
+        The REGISTRY_IDs
+    column : str
+        One of CROSSWALK_LEVELS, e.g. 'COUNTY_FIPS'
+    states : list
+        Optional - limit the lookup to these states' crosswalks
+
+    Returns
+    -------
+    ndarray or None
+        The codes aligned with registry_ids (NaN where a facility is not in
+        the crosswalk), or None if there is no crosswalk to look in
+    '''
+    crosswalk = load_crosswalk(states)
+    if crosswalk is None or column not in crosswalk.columns:
+        return None
+    ids = pd.to_numeric(pd.Series(registry_ids), errors='coerce').to_numpy(dtype='float64')
+    index = crosswalk.index.to_numpy()
+    if not crosswalk.index.is_monotonic_increasing:
+        order = np.argsort(index, kind='stable')
+        index = index[order]
+        codes = crosswalk[column].to_numpy()[order]
+    else:
+        codes = crosswalk[column].to_numpy()
+    # Binary search the sorted REGISTRY_IDs
+    pos = np.searchsorted(index, ids).clip(0, len(index) - 1)
+    found = index[pos] == ids
+    result = np.full(len(ids), np.nan, dtype=object)
+    result[found] = codes[pos[found]]
+    return result
@@ -0,0 +1,252 @@
+'''
+A local table of every ECHO_EXPORTER facility with only the fields most
+lookups need: its REGISTRY_ID, name and coordinates, the program flags and
+IDs, the region fields and whether it is active.
+
+build_facility_dimension stores a state's facilities in the cache as a
+parquet file sorted by REGISTRY_ID, along with the ECHO_EXPORTER
+last_modified date it was built from, so it is only fetched again after
+ECHO_EXPORTER is updated. The files are read once, and facilities are then
+found by state from the file and by REGISTRY_ID with a binary search,
+without querying the database.
+'''
+
+import glob
+import json
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from ECHO_modules.cache import cache_path, write_atomic
+from ECHO_modules.geographies import states as all_states
+from ECHO_modules.get_data import get_echo_data, get_last_modified
+
+# Program (echo_type): its ECHO_EXPORTER flag field
+PROGRAM_FLAGS = {'AIR': 'AIR_FLAG', 'NPDES': 'NPDES_FLAG', 'RCRA': 'RCRA_FLAG',
+                 'SDWA': 'SDWIS_FLAG', 'GHG': 'GHG_FLAG', 'TRI': 'TRI_FLAG'}
+# The ECHO_EXPORTER fields kept for each facility
+DIMENSION_FIELDS = (['REGISTRY_ID', 'FAC_NAME', 'FAC_STREET', 'FAC_CITY', 'FAC_STATE', 'FAC_ZIP',
+                     'FAC_COUNTY', 'FAC_FIPS_CODE', 'FAC_EPA_REGION', 'FAC_DERIVED_HUC',
+                     'FAC_DERIVED_CD113', 'FAC_LAT', 'FAC_LONG', 'FAC_ACTIVE_FLAG', 'DFR_URL']
+                    + list(PROGRAM_FLAGS.values()) + [p + '_IDS' for p in PROGRAM_FLAGS])
+# Fields with few distinct values, stored as categories
+_CATEGORIES = ['FAC_STATE', 'FAC_COUNTY', 'FAC_COUNTY_CANON', 'FAC_EPA_REGION', 'FAC_ACTIVE_FLAG'] \
+    + list(PROGRAM_FLAGS.values())
+
+
+def _dimension_file(state):
+    return cache_path('facility_dimension', f'{state}.parquet')
+
+
+def _stamps_file():
+    return cache_path('facility_dimension', 'last_modified.json')
+
+
+def _read_stamps():
+    # The last_modified date each state's file was built from
+    try:
+        with open(_stamps_file()) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_stamps(stamps):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(stamps, f, indent=1, sort_keys=True)
+    write_atomic(_stamps_file(), write)
+
+
+def build_facility_dimension(states=None, last_modified=None, api=True, token=None):
+    '''
+    Store the DIMENSION_FIELDS of every ECHO_EXPORTER facility in the states
+    in the cache. States already built from the same ECHO_EXPORTER
+    last_modified date are skipped.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state.
+    last_modified : str
+        Optional - ECHO_EXPORTER's last_modified date. Looked up from its
+        schema if not given. If it isn't known, every state is rebuilt.
+    api : bool
+        If True, use the API to get the facilities. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Returns
+    -------
+    list
+        The states that were built
+    '''
+    if states is None:
+        states = all_states
+    elif isinstance(states, str):
+        states = [states]
+    if last_modified is None:
+        last_modified = get_last_modified('ECHO_EXPORTER', api=api, token=token)
+    stamps = _read_stamps()
+    built = []
+    for state in states:
+        if last_modified is not None and stamps.get(state) == last_modified \
+                and os.path.exists(_dimension_file(state)):
+            continue
+        sql = f"select {', '.join(DIMENSION_FIELDS)} from ECHO_EXPORTER where FAC_STATE = '{state}'"
+        facilities = get_echo_data(sql, api=api, token=token)
+        if facilities is None or facilities.empty:
+            print(f"No facilities were found for {state}.")
+            continue
+        if 'REGISTRY_ID' not in facilities.columns:
+            facilities = facilities.reset_index()
+        facilities['REGISTRY_ID'] = pd.to_numeric(facilities['REGISTRY_ID']).astype('int64')
+        for field in ('FAC_LAT', 'FAC_LONG'):
+            facilities[field] = pd.to_numeric(facilities[field], errors='coerce')
+        for field in _CATEGORIES:
+            if field in facilities.columns:
+                facilities[field] = facilities[field].astype('category')
+        facilities = facilities.sort_values('REGISTRY_ID', ignore_index=True)
+        write_atomic(_dimension_file(state), lambda tmp_path: facilities.to_parquet(tmp_path))
+        stamps[state] = last_modified
+        _write_stamps(stamps)
+        built.append(state)
+    if built:
+        print(f"Stored {len(built)} state(s) of facilities.")
+    _load_state.cache_clear()
+    return built
+
+
+@lru_cache(maxsize=None)
+def _load_state(state):
+    path = _dimension_file(state)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def dimension_states():
+    '''
+    The states whose facilities are in the cache.
+
+    Returns
+    -------
+    list
+    '''
+    return sorted(os.path.basename(f)[:-len('.parquet')]
+                  for f in glob.glob(os.path.join(os.path.dirname(_dimension_file('XX')), '*.parquet')))
+
+
+def has_facility_dimension(states=None):
+    '''
+    Whether the facilities of all of the states are in the cache.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state.
+
+    Returns
+    -------
+    bool
+    '''
+    if states is None:
+        states = all_states
+    elif isinstance(states, str):
+        states = [states]
+    built = set(dimension_states())
+    return all(s in built for s in states)
+
+
+def dimension_last_modified(states=None):
+    '''
+    The ECHO_EXPORTER last_modified dates the states' facilities were
+    stored from, as one stamp, e.g. to tell whether something built from
+    them is out of date.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state in the cache.
+
+    Returns
+    -------
+    str or None
+        None if any of the states' dates isn't known
+    '''
+    if states is None:
+        states = dimension_states()
+    elif isinstance(states, str):
+        states = [states]
+    stamps = _read_stamps()
+    dates = [stamps.get(s) for s in sorted(states)]
+    if not dates or any(d is None for d in dates):
+        return None
+    return json.dumps(dict(zip(sorted(states), dates)), sort_keys=True)
+
+
+def load_facility_dimension(states=None, columns=None):
+    '''
+    The facilities of the states, sorted by REGISTRY_ID within each state.
+    A single state's table is the same DataFrame on every call, so don't
+    modify it.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state in the cache.
+    columns : list
+        Optional - the fields to return. Defaults to all of them.
+
+    Returns
+    -------
+    DataFrame or None
+        None if none of the states are in the cache
+    '''
+    if states is None:
+        states = dimension_states()
+    elif isinstance(states, str):
+        states = [states]
+    frames = [f for f in (_load_state(s) for s in sorted(states)) if f is not None]
+    if not frames:
+        return None
+    if columns is not None:
+        frames = [f[[c for c in columns if c in f.columns]] for f in frames]
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def lookup_facilities(registry_ids, columns=None, states=None):
+    '''
+    The facilities with the REGISTRY_IDs, found with a binary search of the
+    stored facilities.
+
+    Parameters
+    ----------
+    registry_ids : sequence
+        The REGISTRY_IDs
+    columns : list
+        Optional - the fields to return. Defaults to all of them.
+    states : list
+        Optional - limit the lookup to these states
+
+    Returns
+    -------
+    DataFrame or None
+        The facilities that were found, indexed by REGISTRY_ID in the order
+        of registry_ids, or None if no states are in the cache
+    '''
+    dimension = load_facility_dimension(states, columns if columns is None else ['REGISTRY_ID'] + list(columns))
+    if dimension is None:
+        return None
+    index = dimension['REGISTRY_ID'].to_numpy()
+    order = None
+    if not dimension['REGISTRY_ID'].is_monotonic_increasing:
+        order = np.argsort(index, kind='stable')
+        index = index[order]
+    ids = pd.to_numeric(pd.Series(registry_ids), errors='coerce').to_numpy(dtype='float64')
+    pos = np.searchsorted(index, ids).clip(0, max(len(index) - 1, 0))
+    found = index[pos] == ids if len(index) else np.zeros(len(ids), dtype=bool)
+    rows = pos[found] if order is None else order[pos[found]]
+    return dimension.iloc[rows].set_index('REGISTRY_ID')
@@ -0,0 +1,189 @@
+'''
+Summarize discharge monitoring reports (the "2020 Discharge Monitoring",
+"2022 Discharge Monitoring" and "Effluent Violations" DataSets) a batch of
+facilities at a time.
+
+These tables have a row for every permit, outfall, parameter and
+monitoring period, too many to hold for a large region. dmr_batches
+fetches only the fields the summary needs, a few hundred permits at a
+time, and summarize_dmrs reduces each batch to one row per permit, outfall
+and parameter before merging it into the running summary, so memory
+depends on the number of permits and parameters rather than the number of
+reports.
+'''
+
+from itertools import islice
+import numpy as np
+import pandas as pd
+from ECHO_modules.aggregation import record_dates, record_ids
+from ECHO_modules.facilities import get_active_facilities
+from ECHO_modules.get_data import get_echo_data
+
+DMR_PROGRAMS = ('2020 Discharge Monitoring', '2022 Discharge Monitoring', 'Effluent Violations')
+# Summary field: the DMR field it comes from
+DMR_FIELDS = {
+    'outfall': 'PERM_FEATURE_NMBR',
+    'parameter': 'PARAMETER_CODE',
+    'description': 'PARAMETER_DESC',
+    'value': 'DMR_VALUE_STANDARD_UNITS',
+    'nodi': 'NODI_CODE',
+    'exceedence': 'EXCEEDENCE_PCT',
+    'violation': 'VIOLATION_CODE',
+}
+# The violation code of an effluent limit exceedance
+EXCEEDANCE_CODE = 'E90'
+SUMMARY_COLUMNS = ['records', 'reported', 'exceedances', 'max_exceedence_pct', 'first_period',
+                   'last_period', 'description']
+
+
+def dmr_batches(dataset, registry_ids, ids_per_request=300, api=True, token=None):
+    '''
+    Get a DataSet's discharge monitoring reports for the facilities, a batch
+    of facilities at a time, with only the fields summarize_dmrs uses. The
+    facilities' REGISTRY_IDs are turned into the program IDs the reports are
+    kept by (e.g. EXTERNAL_PERMIT_NMBR) with DataSet.get_pgm_ids.
+
+    Parameters
+    ----------
+    dataset : DataSet
+        One of DMR_PROGRAMS
+    registry_ids : sequence
+        The REGISTRY_IDs of the facilities
+    ids_per_request : int
+        The number of program IDs in each batch
+    api : bool
+        If True, use the API to get the data. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Yields
+    ------
+    DataFrame
+        The reports of a batch of facilities
+    '''
+    pgm_ids = dataset.get_pgm_ids(registry_ids)
+    if pgm_ids is None:
+        return
+    columns = list(dict.fromkeys([dataset.idx_field, dataset.date_field] + list(DMR_FIELDS.values())))
+    iterator = iter(pd.unique(pd.Series(pgm_ids).dropna().astype(str)))
+    while chunk := list(islice(iterator, ids_per_request)):
+        sql = 'select {} from {} where {} in ({})'.format(
+            ', '.join(columns), dataset.table_name, dataset.idx_field,
+            ','.join("'" + i + "'" for i in chunk))
+        batch = get_echo_data(sql, table_name=dataset.table_name, api=api, token=token)
+        if batch is not None:
+            yield batch
+
+
+def summarize_batch(df, dataset):
+    '''
+    Reduce a batch of reports to one row per permit, outfall and parameter.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Reports of one of DMR_PROGRAMS, which are not changed
+    dataset : DataSet
+
+    Returns
+    -------
+    DataFrame
+        The SUMMARY_COLUMNS, indexed by the DataSet's idx_field, outfall and
+        parameter
+    '''
+    def field(name):
+        column = DMR_FIELDS[name]
+        return df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+
+    exceedence = pd.to_numeric(field('exceedence'), errors='coerce')
+    # A report was received if it has a value and no "no data" code
+    reported = (field('value').notna() & field('nodi').isna()).to_numpy()
+    exceeded = ((exceedence > 0) | (field('violation') == EXCEEDANCE_CODE)).to_numpy()
+    periods = record_dates(df[dataset.date_field], dataset.date_format)
+    batch = pd.DataFrame({
+        dataset.idx_field: np.asarray(record_ids(df, dataset.idx_field)),
+        'outfall': field('outfall').to_numpy(), 'parameter': field('parameter').to_numpy(),
+        'records': 1, 'reported': reported.astype(np.int64), 'exceedances': exceeded.astype(np.int64),
+        'max_exceedence_pct': exceedence.to_numpy(), 'first_period': periods, 'last_period': periods,
+        'description': field('description').to_numpy()})
+    return _combine(batch, dataset.idx_field)
+
+
+def _combine(partial, idx_field):
+    # Merge rows with the same permit, outfall and parameter
+    return partial.groupby([idx_field, 'outfall', 'parameter'], dropna=False, sort=False).agg(
+        records=('records', 'sum'), reported=('reported', 'sum'), exceedances=('exceedances', 'sum'),
+        max_exceedence_pct=('max_exceedence_pct', 'max'), first_period=('first_period', 'min'),
+        last_period=('last_period', 'max'), description=('description', 'first'))
+
+
+def summarize_dmrs(batches, dataset):
+    '''
+    Summarize discharge monitoring reports by permit, outfall and parameter
+    as batches of them stream past. Only the summary so far is kept between
+    batches.
+
+    Parameters
+    ----------
+    batches : iterable
+        DataFrames of reports, e.g. from dmr_batches
+    dataset : DataSet
+        One of DMR_PROGRAMS
+
+    Returns
+    -------
+    DataFrame
+        records, reported, completeness (the share of records reported),
+        exceedances, max_exceedence_pct, first_period, last_period and
+        description, indexed by the DataSet's idx_field, outfall and
+        parameter
+    '''
+    summary = None
+    for batch in batches:
+        if batch is None or batch.empty:
+            continue
+        partial = summarize_batch(batch, dataset)
+        summary = partial if summary is None else \
+            _combine(pd.concat([summary, partial]).reset_index(), dataset.idx_field)
+    if summary is None:
+        return None
+    summary.insert(2, 'completeness', summary['reported'] / summary['records'])
+    return summary.sort_index()
+
+
+def region_dmr_summary(dataset, region_type, region_value, state=None, ids_per_request=300,
+                       api=True, token=None):
+    '''
+    Summarize a DataSet's discharge monitoring reports for the active
+    facilities of a region, without holding all of the reports at once.
+
+    Parameters
+    ----------
+    dataset : DataSet
+        One of DMR_PROGRAMS
+    region_type : str
+        The type of region:  'State', 'County', etc.
+    region_value : list
+        The selected regions of the region_type
+    state : str
+        The state, which could be None
+    ids_per_request : int
+        The number of facilities to get the reports of at a time
+    api : bool
+        If True, use the API to get the data. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Returns
+    -------
+    DataFrame or None
+        See summarize_dmrs
+    '''
+    facilities = get_active_facilities(state, region_type, region_value, api=api, token=token, local=True)
+    if facilities is None:
+        print("No facilities were found for this region.")
+        return None
+    if 'NPDES_FLAG' in facilities.columns:
+        facilities = facilities[facilities['NPDES_FLAG'] == 'Y']
+    batches = dmr_batches(dataset, facilities.index, ids_per_request, api=api, token=token)
+    return summarize_dmrs(batches, dataset)
@@ -0,0 +1,175 @@
+'''
+How long it takes from a violation to the next inspection or enforcement
+action at the same facility, e.g. from RCRA Violations to RCRA Penalties.
+
+Each program's records are reduced to a stream of events, a facility key
+and a date, sorted once by date. The violations are matched to the first
+response at the same facility on or after them with pandas.merge_asof,
+which does the matching for every facility at once. The results can then
+be summarized as response rates and lags, and repeat violations as the
+gaps between a facility's violations.
+'''
+
+import numpy as np
+import pandas as pd
+from ECHO_modules.aggregation import record_dates, record_ids
+
+
+def _records(records, dataset):
+    # The DataFrame and DataSet of a DataSetResults, or of a DataFrame and its DataSet
+    if dataset is None:
+        return records.dataframe, records.dataset
+    return records, dataset
+
+
+def event_stream(records, dataset=None, key=None, date_field=None):
+    '''
+    A program's records as events: a facility key and a date, sorted by date.
+
+    Parameters
+    ----------
+    records : DataSetResults or DataFrame
+        The records, which are not changed
+    dataset : DataSet
+        The records' DataSet, if records is a DataFrame
+    key : str
+        Optional - the facility field to match events on. Defaults to the
+        DataSet's idx_field.
+    date_field : str
+        Optional - the date field. Defaults to the DataSet's date_field.
+
+    Returns
+    -------
+    DataFrame
+        key and date, without records missing either
+    '''
+    df, dataset = _records(records, dataset)
+    key = key or dataset.idx_field
+    date_field = date_field or dataset.date_field
+    events = pd.DataFrame({'key': np.asarray(record_ids(df, key), dtype=object),
+                           'date': record_dates(df[date_field], dataset.date_format)})
+    events = events[events['key'].notna().to_numpy() & ~np.isnat(events['date'].to_numpy())]
+    return events.sort_values('date', kind='stable', ignore_index=True)
+
+
+def _match_key(violations, responses):
+    # The field to match facilities on: the DataSets' index field if they
+    # share it, and the REGISTRY_ID of every program view if not
+    if violations[1].idx_field == responses[1].idx_field:
+        return violations[1].idx_field
+    return 'REGISTRY_ID'
+
+
+def response_lags(violations, responses, window=None, key=None, violation_dataset=None,
+                  response_dataset=None):
+    '''
+    Match each violation to the first response (an inspection or
+    enforcement action) at the same facility on or after it.
+
+    Parameters
+    ----------
+    violations : DataSetResults or DataFrame
+        e.g. RCRA Violations
+    responses : DataSetResults or DataFrame
+        e.g. RCRA Penalties
+    window : int
+        Optional - the most days after a violation for a response to count
+    key : str
+        Optional - the facility field to match on. Defaults to the DataSets'
+        idx_field if they have the same one, and REGISTRY_ID if not.
+    violation_dataset : DataSet
+        The DataSet of violations, if it is a DataFrame
+    response_dataset : DataSet
+        The DataSet of responses, if it is a DataFrame
+
+    Returns
+    -------
+    DataFrame
+        A row for each violation: key, violation_date, response_date and
+        lag_days (NaN where there was no response in the window)
+    '''
+    violations = _records(violations, violation_dataset)
+    responses = _records(responses, response_dataset)
+    key = key or _match_key(violations, responses)
+    left = event_stream(*violations, key=key).rename(columns={'date': 'violation_date'})
+    right = event_stream(*responses, key=key).rename(columns={'date': 'response_date'})
+    # Integer codes for the facilities of both streams, so the join is by number
+    codes, _ = pd.factorize(pd.concat([left['key'], right['key']], ignore_index=True))
+    left['code'] = codes[:len(left)]
+    right['code'] = codes[len(left):]
+    right['date'] = right['response_date']
+    tolerance = None if window is None else pd.Timedelta(days=window)
+    matched = pd.merge_asof(left, right[['code', 'date', 'response_date']], left_on='violation_date',
+                            right_on='date', by='code', direction='forward', tolerance=tolerance)
+    matched['lag_days'] = (matched['response_date'] - matched['violation_date']).dt.days
+    return matched[['key', 'violation_date', 'response_date', 'lag_days']].rename(columns={'key': key})
+
+
+def repeat_gaps(violations, dataset=None, key=None):
+    '''
+    The days between each violation and the facility's previous one.
+
+    Parameters
+    ----------
+    violations : DataSetResults or DataFrame
+        e.g. CAA Violations
+    dataset : DataSet
+        The DataSet of violations, if it is a DataFrame
+    key : str
+        Optional - the facility field. Defaults to the DataSet's idx_field.
+
+    Returns
+    -------
+    DataFrame
+        A row for each violation: key, date and gap_days (NaN for a
+        facility's first violation)
+    '''
+    df, dataset = _records(violations, dataset)
+    key = key or dataset.idx_field
+    events = event_stream(df, dataset, key)
+    codes, _ = pd.factorize(events['key'])
+    # Sort by facility, keeping the dates in order within each
+    order = np.argsort(codes, kind='stable')
+    events = events.iloc[order].reset_index(drop=True)
+    codes = codes[order]
+    dates = events['date'].to_numpy()
+    gaps = np.full(len(events), np.nan)
+    same = codes[1:] == codes[:-1]
+    gaps[1:][same] = (dates[1:][same] - dates[:-1][same]) / np.timedelta64(1, 'D')
+    events['gap_days'] = gaps
+    return events.rename(columns={'key': key})
+
+
+def response_summary(lags, by=None):
+    '''
+    Summarize response_lags: the number of violations, the share with a
+    response and the median and mean lag.
+
+    Parameters
+    ----------
+    lags : DataFrame
+        From response_lags
+    by : str
+        Optional - 'year' for the year of the violations, or a column of
+        lags, e.g. the facility key. Defaults to one summary of all of them.
+
+    Returns
+    -------
+    DataFrame
+        violations, responded, response_rate, median_lag_days and
+        mean_lag_days
+    '''
+    if by is None:
+        groups = np.zeros(len(lags), dtype=int)
+    elif by == 'year':
+        groups = lags['violation_date'].dt.year.rename('year')
+    else:
+        groups = lags[by]
+    summary = lags.groupby(groups).agg(violations=('violation_date', 'size'),
+                                       responded=('lag_days', 'count'),
+                                       median_lag_days=('lag_days', 'median'),
+                                       mean_lag_days=('lag_days', 'mean'))
+    summary.insert(2, 'response_rate', summary['responded'] / summary['violations'])
+    if by is None:
+        summary.index = ['All']
+    return summary
@@ -0,0 +1,459 @@
+'''
+Select ECHO_EXPORTER facilities by region: counties, the regions in the
+crosswalk, drawn neighborhoods and rectangles.
+
+These are the data layer functions that used to live in utilities. They
+don't need any of the mapping, charting or widget libraries, so DataSet
+and batch jobs can use them without importing those. utilities still
+exports them.
+'''
+
+import geopandas
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon
+from ECHO_modules.get_data import get_echo_data
+from ECHO_modules.reference import county_canon, county_variants
+from ECHO_modules.crosswalk import LOOKUP_REGION_TYPES, crosswalk_registry_ids
+from ECHO_modules.dimension import has_facility_dimension, load_facility_dimension, lookup_facilities
+
+# The active facilities of each region that has been looked up, and the
+# integer-coded IDs of each program among them
+_ACTIVE = {}
+
+
+def get_county_variants( state, selected ):
+    '''
+    Get all of the different FAC_COUNTY names the ECHO data has for the
+    selected counties, e.g. "JEFFERSON" and "JEFFERSON COUNTY" for "JEFFERSON",
+    so the counties can be selected in the database query rather than by
+    fetching the whole state.
+
+    Parameters
+    ----------
+    state : str
+        The state, e.g. 'TX'
+    selected : list
+        List of selected (corrected) county names
+
+    Returns
+    -------
+    list
+        The FAC_COUNTY values for the selected counties
+    '''
+    if isinstance( selected, str ):
+        selected = [selected,]
+    return county_variants( state, selected )
+
+
+def county_filter( state, selected ):
+    '''
+    Build the SQL condition selecting facilities in the counties of the state.
+    As well as the FAC_COUNTY names the corrected county table has for them,
+    it matches names that start with the county once they are trimmed and
+    upper cased, which includes every name reference.canonical_counties
+    could correct to the county. Narrow the results to the counties with
+    get_facs_in_counties, since this can also match other counties whose
+    names start with the same words.
+
+    Parameters
+    ----------
+    state : str
+        The state, e.g. 'TX'
+    selected : list
+        List of selected (corrected) county names
+
+    Returns
+    -------
+    str
+        e.g. "FAC_STATE = 'TX' and (FAC_COUNTY in ('JEFFERSON','JEFFERSON COUNTY')
+        or UPPER(TRIM(FAC_COUNTY)) like 'JEFFERSON%')"
+    '''
+    if isinstance( selected, str ):
+        selected = [selected,]
+    variants = get_county_variants( state, selected )
+    # Quote the names, doubling any quotes in them (e.g. PRINCE GEORGE'S)
+    def quote( name ):
+        return "'" + str(name).replace("'", "''") + "'"
+    county_str = ",".join( quote( c ) for c in variants )
+    if not county_str:
+        county_str = "''" # No known names for the counties
+    conditions = [ "FAC_COUNTY in ({})".format( county_str ) ]
+    conditions += [ "UPPER(TRIM(FAC_COUNTY)) like {}".format( quote( str(c).strip().upper() + '%' ))
+                    for c in selected if str(c).strip() ]
+    return "FAC_STATE = '{}' and ({})".format( state, ' or '.join( conditions ))
+
+def get_facs_in_counties( df, selected ):
+    '''
+    The dataframe df that is passed in will have all facilities for the state.
+    The list selected passed in will have the corrected names of the counties
+    we are interested in.
+    We must accumulate facilities in all the alternative county names that the
+    ECHO data has for facilities.  E.g., "Jefferson" and "Jefferson County"
+    may both be in the ECHO data, but we want to consolidate them into
+    "Jefferson".
+
+    Parameters
+    ----------
+    df - DataFrame with facilities for the entire state.
+    selected - List of selected counties.
+
+    Returns
+    -------
+    Dataframe with all facilities in the selected counties.
+
+    '''
+
+    if df.empty:
+        return None
+    if isinstance( selected, str ):
+        selected = [selected,]
+    # The corrected names, if they weren't added when the data was retrieved
+    return df[county_canon( df ).isin( selected ).to_numpy()]
+
+
+def local_facilities( state, region_type, regions_selected, flag=None, active=True ):
+    '''
+    Select the facilities of a region from the local facility dimension
+    (see dimension.build_facility_dimension) instead of the database.
+
+    Parameters
+    ----------
+    state : str
+        The state, which could be None
+    region_type : str
+        The type of region:  'State', 'Congressional District', etc.
+    regions_selected : list
+        The selected regions of the specified region_type
+    flag : str
+        Optional - only facilities with this program flag set, e.g. 'NPDES_FLAG'
+    active : bool
+        Only include facilities with FAC_ACTIVE_FLAG set to 'Y'
+
+    Returns
+    -------
+    Dataframe or None
+        The facilities, indexed by REGISTRY_ID, or None if the dimension
+        doesn't have the states the region could be in
+    '''
+    # Regions within a state only need that state; the others could be anywhere
+    if region_type in ( 'State', 'County', 'Congressional District' ) or \
+            ( region_type in LOOKUP_REGION_TYPES and state ):
+        searched = [ state ]
+    else:
+        searched = None
+    if not has_facility_dimension( searched ):
+        return None
+
+    if region_type in LOOKUP_REGION_TYPES:
+        registry_ids = crosswalk_registry_ids( region_type, regions_selected, searched )
+        if registry_ids is None:
+            return None
+        df = lookup_facilities( registry_ids, states=searched ).reset_index()
+    else:
+        df = load_facility_dimension( searched )
+    if region_type == 'County':
+        if isinstance( regions_selected, str ):
+            regions_selected = [ regions_selected, ]
+        in_counties = get_facs_in_counties( df, regions_selected )
+        df = df.iloc[0:0] if in_counties is None else in_counties
+    elif region_type == 'Congressional District':
+        districts = pd.to_numeric( pd.Series( list( regions_selected )), errors='coerce' )
+        df = df[ pd.to_numeric( df['FAC_DERIVED_CD113'], errors='coerce' ).isin( districts ) ]
+    elif region_type in ( 'Zip Code', 'Watershed' ):
+        field = 'FAC_ZIP' if region_type == 'Zip Code' else 'FAC_DERIVED_HUC'
+        codes = ''.join( regions_selected.split() ).split( ',' )
+        df = df[ df[field].astype( str ).isin( codes ) ]
+    elif region_type == 'Neighborhood':
+        df = get_facs_in_rect( df, 'FAC_LAT', 'FAC_LONG', regions_selected )
+        if not df.empty:
+            df = filter_by_geometry( regions_selected, df ).drop( columns='geometry' )
+    elif region_type not in ( 'State', 'Nationwide' ) and region_type not in LOOKUP_REGION_TYPES:
+        return None
+    if active:
+        df = df[ df['FAC_ACTIVE_FLAG'] == 'Y' ]
+    if flag is not None:
+        df = df[ df[flag] == 'Y' ]
+    return df.set_index( 'REGISTRY_ID' )
+
+def get_active_facilities( state, region_type, regions_selected, api=True, token=None, local=False):
+    '''
+    Get a Dataframe with the ECHO_EXPORTER facilities with FAC_ACTIVE_FLAG
+    set to 'Y' for the region selected.
+
+    Parameters
+    ----------
+    state : str
+        The state, which could be None
+    region_type : str
+        The type of region:  'State', 'Congressional District', etc.
+    regions_selected : list
+        The selected regions of the specified region_type
+    api : bool
+        If True, use the API to get the data.  If False, use the local delta lake connection
+    local : bool
+        If True, select the facilities from the local facility dimension
+        when it has them (see local_facilities). It only has the
+        dimension.DIMENSION_FIELDS, rather than every ECHO_EXPORTER field.
+
+    Returns
+    -------
+    Dataframe
+        The active facilities returned from the database query
+    '''
+
+    if local:
+        df_active = local_facilities( state, region_type, regions_selected )
+        if df_active is not None:
+            return df_active if not df_active.empty else None
+
+    try:
+        if ( region_type == 'Nationwide' ):
+            sql = 'select * from ECHO_EXPORTER where FAC_ACTIVE_FLAG = \'Y\''
+            sql = sql.format( state )
+            df_active = get_echo_data( sql, 'REGISTRY_ID', api=api, token=token)
+        elif region_type == 'State':
+            sql = 'select * from ECHO_EXPORTER where FAC_STATE = \'{}\''
+            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
+            sql = sql.format( state )
+            df_active = get_echo_data( sql, 'REGISTRY_ID', api=api, token=token)
+        elif region_type == 'County':
+            sql = 'select * from ECHO_EXPORTER where {}'
+            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
+            sql = sql.format( county_filter( state, regions_selected ))
+            df_active = get_echo_data( sql, 'REGISTRY_ID', api=api, token=token)
+            if df_active is not None:
+                # The filter can match other counties with names like these
+                df_active = get_facs_in_counties( df_active, regions_selected )
+        elif ( region_type == 'Congressional District'):
+            cd_str = ",".join( map( lambda x: str(x), regions_selected ))
+            sql = 'select * from ECHO_EXPORTER where FAC_STATE = \'{}\''
+            sql += ' and FAC_DERIVED_CD113 in ({})'
+            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
+            sql = sql.format( state, cd_str )
+            df_active = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
+        elif ( region_type == 'Zip Code' ):
+            regions_selected = ''.join(regions_selected.split())
+            zc_str = ",".join( map( lambda x: "\'"+str(x)+"\'", regions_selected.split(',') ))
+            sql = 'select * from ECHO_EXPORTER where FAC_ZIP in ({})'
+            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
+            sql = sql.format( zc_str )
+            df_active = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
+        elif region_type == 'Watershed':
+            regions_selected = ''.join(regions_selected.split())
+            ws_str = ",".join( map( lambda x: "\'"+str(x)+"\'", regions_selected.split(',') ))
+            sql = 'select * from ECHO_EXPORTER where FAC_DERIVED_HUC in ({})'
+            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
+            sql = sql.format( ws_str )
+            df_active = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
+        elif region_type in LOOKUP_REGION_TYPES:
+            # No ECHO field for these regions, so look up their facilities in the crosswalk
+            registry_ids = crosswalk_registry_ids(region_type, regions_selected, [state] if state else None)
+            if registry_ids is None:
+                print("No crosswalk was found. Run crosswalk.build_crosswalk() for the state first.")
+                return None
+            df_active = None
+            for start in range(0, len(registry_ids), 1000):
+                id_str = ",".join(map(str, registry_ids[start:start + 1000]))
+                sql = 'select * from ECHO_EXPORTER where REGISTRY_ID in ({})'
+                sql += ' and FAC_ACTIVE_FLAG = \'Y\''
+                sql = sql.format( id_str )
+                chunk = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
+                if chunk is not None:
+                    df_active = chunk if df_active is None else pd.concat([df_active, chunk])
+        elif region_type == 'Neighborhood':
+            #poly_str = ''
+            points = regions_selected
+            
+            min_lon = min(p[0] for p in points)
+            max_lon = max(p[0] for p in points)
+            min_lat = min(p[1] for p in points)
+            max_lat = max(p[1] for p in points)
+
+            sql = f"SELECT * FROM ECHO_EXPORTER WHERE FAC_ACTIVE_FLAG = 'Y' AND (FAC_LAT >= {min_lat} AND FAC_LAT <= {max_lat}) AND (FAC_LONG >= NEGATIVE({abs(min_lon)}) AND FAC_LONG <= NEGATIVE({abs(max_lon)}));"
+            # display(sql)
+            df_active = get_echo_data( sql, "REGISTRY_ID", api=api, token=token) # Get all facs within a bbox
+            df_active = filter_by_geometry(points, df_active) # Clip facs to just those in actual shape  
+            
+        else:
+            df_active = None
+    except pd.errors.EmptyDataError:
+        df_active = None
+
+    return df_active
+
+def _freeze( value ):
+    # A hashable version of the regions selected, e.g. a list of points
+    if isinstance( value, (list, tuple) ):
+        return tuple( _freeze( v ) for v in value )
+    return value
+
+def active_universe( state, region_type, regions_selected, api=True, token=None ):
+    '''
+    The active facilities of a region, as from get_active_facilities, only
+    looked up the first time the region is asked for, and from the local
+    facility dimension if it has them. The same DataFrame is returned on
+    every call, so don't modify it.
+
+    Parameters
+    ----------
+    state : str
+        The state, which could be None
+    region_type : str
+        The type of region:  'State', 'Congressional District', etc.
+    regions_selected : list
+        The selected regions of the specified region_type
+    api : bool
+        If True, use the API to get the data.  If False, use the local delta lake connection
+
+    Returns
+    -------
+    Dataframe
+        The active facilities, or None if there are none
+    '''
+    key = ( state, region_type, _freeze( regions_selected ), api )
+    if key not in _ACTIVE:
+        df_active = get_active_facilities( state, region_type, regions_selected, api=api, token=token,
+                                           local=True )
+        if df_active is None:
+            return None
+        _ACTIVE[key] = { 'facilities': df_active, 'ids': {} }
+    return _ACTIVE[key]['facilities']
+
+def clear_active_universe():
+    '''
+    Forget the active facilities of every region, so they're queried again.
+    '''
+    _ACTIVE.clear()
+
+def _program_codes( state, region_type, regions_selected, field, api ):
+    # The code of each active facility's program IDs in a sorted vocabulary of
+    # them, -1 where it has none
+    entry = _ACTIVE[( state, region_type, _freeze( regions_selected ), api )]
+    if field not in entry['ids']:
+        codes, vocabulary = pd.factorize( entry['facilities'][field], sort=True )
+        entry['ids'][field] = ( codes, pd.Index( vocabulary ) )
+    return entry['ids'][field]
+
+def facilities_without( state, region_type, regions_selected, echo_type, ids, api=True, token=None ):
+    '''
+    The active facilities of a region regulated under a program but without
+    any of the program IDs given, e.g. the facilities in a county with no
+    CWA violations. The region's facilities are only queried once (see
+    active_universe), so comparing several programs in it costs no more
+    queries.
+
+    Parameters
+    ----------
+    state : str
+        The state, which could be None
+    region_type : str
+        The type of region:  'State', 'Congressional District', etc.
+    regions_selected : list
+        The selected regions of the specified region_type
+    echo_type : str
+        The program's ECHO_EXPORTER prefix, e.g. 'NPDES' for NPDES_IDS
+    ids : array-like
+        The program IDs to leave out, e.g. a DataSet's idx_field
+    api : bool
+        If True, use the API to get the data.  If False, use the local delta lake connection
+
+    Returns
+    -------
+    Dataframe
+        The active facilities, or None if there are none
+    '''
+    df_active = active_universe( state, region_type, regions_selected, api=api, token=token )
+    if df_active is None:
+        return None
+    codes, vocabulary = _program_codes( state, region_type, regions_selected, echo_type + '_IDS', api )
+    # Mark the program IDs that are in ids, then keep the facilities whose IDs aren't
+    found = vocabulary.get_indexer( pd.unique( pd.Series( ids ).dropna() ))
+    seen = np.zeros( len( vocabulary ) + 1, dtype=bool )
+    seen[found[found >= 0]] = True
+    seen[-1] = True # Facilities without program IDs
+    return df_active[~seen[codes]]
+
+def filter_by_geometry(points, df): 
+    # Bounding Box
+    min_lon = min(p[0] for p in points)
+    max_lon = max(p[0] for p in points)
+    min_lat = min(p[1] for p in points)
+    max_lat = max(p[1] for p in points)
+    
+    # Make a geopandas dataframe of all facilities
+    facs_gdf = geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(df['FAC_LONG'], df['FAC_LAT']), crs="EPSG:4269")
+    
+    filtered_facs = facs_gdf[
+        (facs_gdf.geometry.x >= min_lon) & 
+        (facs_gdf.geometry.x <= max_lon) & 
+        (facs_gdf.geometry.y >= min_lat) & 
+        (facs_gdf.geometry.y <= max_lat)
+    ]
+    
+    # Filter more by creating a polygon using the points to get the facilities inside the polygon
+    polygon = Polygon(points)
+    filtered_facs = filtered_facs[filtered_facs.geometry.intersects(polygon)]
+    
+    return filtered_facs
+
+def get_min_max_coord(coord_set):
+    '''
+    Get the minimum and maximum values of the set of 
+    (longitude, latitude) coordinates.
+
+    Parameters
+    ----------
+    coord_set : set
+        The set of (longitude, latitude) values.
+
+    Return
+    ------
+    A tuple with the results
+    '''
+
+    min_lat = 90
+    max_lat = 0
+    min_long = 180
+    max_long = -180
+    for x in list(coord_set):
+        lat = x[1]
+        long = x[0]
+        min_lat = lat if lat < min_lat else min_lat
+        max_lat = lat if lat > max_lat else max_lat
+        min_long = long if long < min_long else min_long
+        max_long = long if long > max_long else max_long
+        '''
+        for coord in x:
+            lat = coord[1]
+            long = coord[0]
+            min_lat = lat if lat < min_lat else min_lat
+            max_lat = lat if lat > max_lat else max_lat
+            min_long = long if long < min_long else min_long
+            max_long = long if long > max_long else max_long
+        '''
+    return (min_lat, max_lat, min_long, max_long)
+
+def get_facs_in_rect(df, lat_field, long_field, rect_set):
+    '''
+    Select the facilities whose latitude and longitude values
+    are inside the rectangle
+
+    Parameters
+    ----------
+    df : DataFrame
+        Containing the lat_field and long_field
+
+    lat_field : str
+        The name of the latitude field in the dataframe
+
+    long_field : str
+        The name of the longitude field
+
+    rect_set : set
+        The set of (longitude, latitude) values
+    '''
+    (min_lat, max_lat, min_long, max_long) = get_min_max_coord(rect_set)
+    result_df = df.loc[((df[lat_field] >= min_lat) & (df[lat_field] <= max_lat) & \
+                        (df[long_field] >= min_long) & (df[long_field] <= max_long))]
+    return result_df
@@ -69,6 +69,20 @@ spatial_tables = {
         id_field = "GEOID10", # 
         match_field="GEOID10", # 
         pretty_field="GEOID10" # NAMELSAD10 ?
+    ),
+
+    "Census Block Group": dict(
+        table_name = "tigerweb_tracts_blocks_1", # TIGERweb current block groups
+        id_field = "GEOID", # state, county, tract and block group e.g. 360290001101
+        match_field="GEOID",
+        pretty_field="GEOID"
+    ),
+
+    "Current Congressional District": dict(
+        table_name = "tigerweb_legislative_0", # TIGERweb current Congress
+        id_field = "GEOID", # state FIPS and district e.g. NY-26 = 3626
+        match_field="GEOID",
+        pretty_field="BASENAME"
     )
 }
 
@@ -92,12 +106,12 @@ states = ['AK','AL','AR','AZ','CA','CO','CT','DC','DE','FL','GA','HI','IA','ID',
         'NH','NJ','NM','NV','NY','OH','OK','OR','PA','RI','SC','SD','TN','TX','UT',
         'VA','VT','WA','WI','WV','WY']
 
-fips = { "AK": "02",  "AL": "01",  "AR": "05",  "AS": "60",  "AZ": "04",  "CA": "06",  "CO": "08",  
-    "CT": "09",  "DC": "11",  "DE": "10",  "FL": "12",  "GA": "13",  "GU": "66",  "HI": "15",  "IA": "19",  
-    "ID": "16",  "IL": "17",  "IN": "18",  "KS": "20",  "KY": "21",  "LA": "22",  "MA": "25",  "MD": "24",  
-    "ME": "23",  "MI": "26",  "MN": "27",  "MO": "29",  "MS": "28",  "MT": "30",  "NC": "37",  "ND": "38",  
-    "NE": "31",  "NH": "33",  "NJ": "34",  "NM": "35",  "NV": "32",  "NY": "36",  "OH": "39",  "OK": "40",  
-    "OR": "41",  "PA": "42",  "PR": "72",  "RI": "44",  "SC": "45",  "SD": "46",  "TN": "47",  "TX": "48",  
-    "UT": "49",  "VA": "51",  "VI": "78",  "VT": "50",  "WA": "53",  "WI": "55",  "WV": "54",  "WY": "56"}
-
-huc8 = {"AK":["19010102","19010103","19010104","19010105","19010106","19010107","19010204","19010205","19010206","19010207","19010208","19010209","19010210","19010211","19010212","19010301","19010302","19010303","19010304","19010402","19010403","19010404","19010405","19010406","19010500","19020101","19020102","19020103","19020104","19020201","19020202","19020203","19020301","19020302","19020401","19020402","19020501","19020502","19020503","19020504","19020505","19020601","19020602","19020701","19020702","19020800","19030101","19030102","19030103","19030104","19030201","19030202","19030203","19030204","19030205","19030206","19030301","19030302","19030303","19030304","19030305","19030306","19030401","19030403","19030404","19030405","19030406","19030407","19030501","19030502","19030503","19050101","19050102","19050103","19050104","19050105","19050201","19050202","19050203","19050301","19050302","19050303","19050304","19050401","19050402","19050403","19050404","19050405","19050500","19060101","19060102","19060103","19060201","19060202","19060203","19060204","19060205","19060206","19060301","19060302","19060303","19060304","19060401","19060402","19060403","19060501","19060502","19060504","19060505","19070101","19070102","19070103","19070104","19070402","19070403","19070502","19070503","19070505","19070506","19080103","19080104","19080105","19080106","19080107","19080108","19080201","19080202","19080203","19080204","19080301","19080302","19080303","19080304","19080305","19080306","19080307","19080308","19080309","19080310","19080311","19080401","19080402","19080403","19080404","19090101","19090102","19090103","19090104","19090105","19090106","19090107","19090108","19090109","19090201","19090202","19090203","19090204","19090205","19090301","19090302","19090303","19090304","19090305"],"AL":["03130002","03130003","03130004","03130012","03140103","03140104","03140106","03140107","03140201","03140202","03140203","03140301","03140302","03140303","03140304","03140305","03150105","03150106","03150107","03150108","03150109","03150110","03150201","03150202","03150203","03150204","03160101","03160103","03160105","03160106","03160107","03160108","03160109","03160110","03160111","03160112","03160113","03160201","03160202","03160203","03160204","03160205","03170002","03170003","03170008","03170009","06020001","06030001","06030002","06030003","06030004","06030005","06030006"],"AR":["08010100","08020100","08020203","08020204","08020205","08020301","08020302","08020303","08020304","08020401","08020402","08030100","08040101","08040102","08040103","08040201","08040202","08040203","08040204","08040205","08040206","08050001","08050002","11010001","11010003","11010004","11010005","11010006","11010007","11010008","11010009","11010010","11010011","11010012","11010013","11010014","11070206","11070208","11070209","11110103","11110104","11110105","11110201","11110202","11110203","11110204","11110205","11110206","11110207","11140105","11140106","11140108","11140109","11140201","11140203","11140205","11140302","11140304"],"AS":["22030001","22030002","22030003","22030004","22030005"],"AZ":["14070006","14070007","14080105","14080106","14080201","14080204","14080205","15010001","15010002","15010003","15010004","15010005","15010006","15010007","15010009","15010010","15010014","15020001","15020002","15020003","15020004","15020005","15020006","15020007","15020008","15020009","15020010","15020011","15020012","15020013","15020014","15020015","15020016","15020017","15020018","15030101","15030103","15030104","15030105","15030106","15030107","15030108","15030201","15030202","15030203","15030204","15040002","15040003","15040004","15040005","15040006","15040007","15050100","15050201","15050202","15050203","15050301","15050302","15050303","15050304","15050305","15050306","15060101","15060102","15060103","15060104","15060105","15060106","15060201","15060202","15060203","15070101","15070102","15070103","15070104","15070201","15070202","15070203","15080101","15080102","15080103","15080200","15080301","15080302"],"CA":["15030101","15030102","15030104","15030107","16040203","16040204","16050101","16050102","16050201","16050301","16050302","16060010","16060015","17100309","17100311","17100312","17120007","18010101","18010102","18010103","18010104","18010105","18010106","18010107","18010108","18010109","18010110","18010204","18010205","18010206","18010207","18010208","18010209","18010210","18010211","18010212","18020001","18020002","18020003","18020004","18020005","18020104","18020111","18020115","18020116","18020121","18020122","18020123","18020125","18020126","18020128","18020129","18020151","18020152","18020153","18020154","18020155","18020156","18020157","18020158","18020159","18020161","18020162","18020163","18030001","18030002","18030003","18030004","18030005","18030006","18030007","18030009","18030010","18030012","18040001","18040002","18040003","18040006","18040007","18040008","18040009","18040010","18040011","18040012","18040013","18040014","18040051","18050001","18050002","18050003","18050004","18050005","18050006","18060002","18060003","18060004","18060005","18060006","18060007","18060008","18060009","18060010","18060013","18060014","18060015","18070101","18070102","18070103","18070104","18070105","18070106","18070107","18070201","18070202","18070203","18070204","18070301","18070302","18070303","18070304","18070305","18080001","18080002","18080003","18090101","18090102","18090103","18090201","18090202","18090203","18090204","18090205","18090206","18090207","18090208","18100100","18100201","18100202","18100203","18100204"],"CN":["01010004","01010005","01010006","01010007","01010008","01010009","01010010","01010011","01020001","01030001","01030002","01040001","01050001","01050004","01080101","04010101","04090001","04090002","04090004","04090006","04090007","04130001","04160001","04160002","04160003","04160004","04170001","04170002","04170003","04170004","04170005","04170006","04180000","04200002","04200003","04200004","04200005","04200006","04200007","04200008","04200009","04210001","04210002","04210003","04210004","04220001","04220002","04220003","04220004","04230001","04230002","04230003","04230004","04230005","04230006","04240001","04240002","04250001","04250002","04250003","04250004","04250005","04260000","04270101","04270102","04270103","04270104","04270105","04270106","04270107","04270201","04270202","04270203","04270204","04270205","04280001","04280002","04290001","04290007","04290008","04300107","04300108","04300109","04300201","04300202","04310001","04320000","04330000","09010002","09010003","09010004","09010005","09010006","09010007","09010008","09010009","09020311","09020312","09020314","09020315","09020316","09020317","09020318","09020319","09030001","09030003","09030006","09030008","09030009","09030010","09030011","09040001","09040002","09040003","09040004","10030203","10050001","10050002","10050003","10050006","10050007","10050008","10050010","10050011","10050013","10050015","10060003","10060004","10060006","10060007","17010101","17010103","17010104","17010105","17010106","17010107","17010108","17010109","17010110","17010206","17010215","17010216","17020001","17020002","17020006","17020007","17020017","17020018","17020019","17020020","17020021","17110001","17110002","17110003","17110004","17110005","17110020","17110021","19010105","19010106","19010107","19010108","19010109","19010110","19010111","19010112","19010113","19010114","19010115","19010205","19010206","19010207","19010208","19010213","19010214","19010215","19010216","19010217","19010218","19010219","19010220","19010221","19010222","19010223","19010224","19010225","19010226","19010301","19010302","19010303","19010304","19010305","19010306","19010307","19010308","19010401","19010402","19010403","19010404","19010405","19010406","19020103","19060504","19060505","19060506","19070101","19070102","19070103","19070104","19070105","19070106","19070107","19070108","19070109","19070110","19070201","19070202","19070203","19070301","19070302","19070303","19070304","19070401","19070402","19070403","19070404","19070501","19070502","19070503","19070505","19070506","19080101","19080102","19080103","19080106","19080108","19080301"],"CO":["10180001","10180002","10180010","10190001","10190002","10190003","10190004","10190005","10190006","10190007","10190008","10190009","10190010","10190011","10190012","10190013","10190014","10190015","10190016","10190017","10190018","10250001","10250002","10250003","10250005","10250006","10250012","10250013","10260001","10260002","10260004","11020001","11020002","11020003","11020004","11020005","11020006","11020007","11020008","11020009","11020010","11020011","11020012","11020013","11030001","11030002","11040001","11040002","11040003","11040004","11040005","11080001","13010001","13010002","13010003","13010004","13010005","13020101","13020102","14010001","14010002","14010003","14010004","14010005","14020001","14020002","14020003","14020004","14020005","14020006","14030001","14030002","14030003","14030004","14030005","14040106","14040109","14050001","14050002","14050003","14050005","14050006","14050007","14060010","14080101","14080102","14080104","14080105","14080107","14080201","14080202","14080203"],"CT":["01080205","01080206","01080207","01100001","01100002","01100003","01100004","01100005","01100006","01100007","02030101","02030102","02030203"],"DC":["02070008","02070010"],"DE":["02040202","02040204","02040205","02040206","02040207","02040303","02060002","02060005","02080109","02080110","02080111"],"FL":["03070203","03070204","03070205","03080101","03080102","03080103","03080201","03080202","03080203","03090101","03090102","03090103","03090201","03090202","03090203","03090204","03090205","03090206","03100101","03100102","03100103","03100201","03100202","03100203","03100204","03100205","03100206","03100207","03100208","03110101","03110102","03110103","03110201","03110202","03110203","03110205","03110206","03120001","03120003","03130004","03130008","03130011","03130012","03130013","03130014","03140101","03140102","03140103","03140104","03140105","03140106","03140107","03140202","03140203","03140304","03140305"],"GA":["03060102","03060103","03060104","03060105","03060106","03060108","03060109","03060201","03060202","03060203","03060204","03070101","03070102","03070103","03070104","03070105","03070106","03070107","03070201","03070202","03070203","03070204","03070205","03110103","03110201","03110202","03110203","03110204","03120001","03120002","03120003","03130001","03130002","03130003","03130004","03130005","03130006","03130007","03130008","03130009","03130010","03130011","03150101","03150102","03150103","03150104","03150105","03150108","06010202","06020001","06020002","06020003","06030001"],"GU":["22010000"],"HI":["20010000","20020000","20030000","20040000","20050000","20060000","20070000","20080001","20080002","20090001","20090002","20090003","20090004","20090005","20090006","20090007","20090008","20090010"],"IA":["07020009","07040008","07060001","07060002","07060003","07060004","07060005","07060006","07080101","07080102","07080103","07080104","07080105","07080106","07080107","07080201","07080202","07080203","07080204","07080205","07080206","07080207","07080208","07080209","07100002","07100003","07100004","07100005","07100006","07100007","07100008","07100009","07110001","07110002","10170203","10170204","10230001","10230002","10230003","10230004","10230005","10230006","10230007","10240001","10240002","10240003","10240004","10240005","10240009","10240010","10240012","10240013","10280101","10280102","10280103","10280201"],"ID":["10020001","10020004","10020007","16010102","16010201","16010202","16010203","16010204","16020309","17010101","17010103","17010104","17010105","17010204","17010205","17010213","17010214","17010215","17010216","17010301","17010302","17010303","17010304","17010305","17010306","17010308","17040103","17040104","17040105","17040201","17040202","17040203","17040204","17040205","17040206","17040207","17040208","17040209","17040210","17040211","17040212","17040213","17040214","17040215","17040216","17040217","17040218","17040219","17040220","17040221","17050101","17050102","17050103","17050104","17050105","17050106","17050107","17050108","17050111","17050112","17050113","17050114","17050115","17050120","17050121","17050122","17050123","17050124","17050201","17060101","17060103","17060107","17060108","17060109","17060201","17060202","17060203","17060204","17060205","17060206","17060207","17060208","17060209","17060210","17060301","17060302","17060303","17060304","17060305","17060306","17060307","17060308"],"IL":["04040001","04040002","04190000","05120108","05120109","05120111","05120112","05120113","05120114","05120115","05140202","05140203","05140204","05140206","07060005","07080101","07080104","07090002","07090003","07090004","07090005","07090006","07090007","07110001","07110004","07110009","07120001","07120002","07120003","07120004","07120005","07120006","07120007","07130001","07130002","07130003","07130004","07130005","07130006","07130007","07130008","07130009","07130010","07130011","07130012","07140101","07140105","07140106","07140108","07140201","07140202","07140203","07140204","08010100"],"IN":["04040001","04050001","04100003","04100004","04100005","04100007","04190000","05080001","05080002","05080003","05090203","05120101","05120102","05120103","05120104","05120105","05120106","05120107","05120108","05120109","05120110","05120111","05120113","05120201","05120202","05120203","05120204","05120205","05120206","05120207","05120208","05120209","05140101","05140104","05140201","05140202","07120001","07120002","07120003"],"KS":["10240005","10240007","10240008","10240011","10250001","10250002","10250003","10250004","10250009","10250010","10250011","10250012","10250013","10250014","10250015","10250016","10250017","10260001","10260002","10260003","10260004","10260005","10260006","10260007","10260008","10260009","10260010","10260011","10260012","10260013","10260014","10260015","10270101","10270102","10270103","10270104","10270205","10270206","10270207","10290101","10290102","10290103","10290104","10290108","10300101","11020009","11030001","11030002","11030003","11030004","11030005","11030006","11030007","11030008","11030009","11030010","11030011","11030012","11030013","11030014","11030015","11030016","11030017","11030018","11040002","11040003","11040004","11040005","11040006","11040007","11040008","11050001","11060001","11060002","11060003","11060004","11060005","11070101","11070102","11070103","11070104","11070106","11070201","11070202","11070203","11070204","11070205","11070206","11070207","11100102"],"KY":["05070201","05070202","05070203","05070204","05090101","05090103","05090104","05090201","05090203","05100101","05100102","05100201","05100202","05100203","05100204","05100205","05110001","05110002","05110003","05110004","05110005","05110006","05130101","05130102","05130103","05130104","05130105","05130205","05130206","05140101","05140102","05140103","05140104","05140201","05140202","05140203","05140204","05140205","05140206","06010206","06040005","06040006","07140105","08010100","08010201","08010202"],"LA":["03170009","03180004","03180005","08030100","08030208","08030209","08040202","08040205","08040206","08040207","08040301","08040302","08040303","08040304","08040305","08040306","08050001","08050002","08050003","08060100","08060203","08060204","08070100","08070201","08070202","08070203","08070204","08070205","08070300","08080101","08080102","08080103","08080201","08080202","08080203","08080204","08080205","08080206","08090100","08090201","08090202","08090203","08090301","08090302","11140201","11140202","11140203","11140204","11140205","11140206","11140207","11140208","11140209","11140304","11140306","12010002","12010004","12010005","12040201","12040202"],"MA":["01060003","01070004","01070005","01070006","01080201","01080202","01080203","01080204","01080205","01080206","01080207","01090001","01090002","01090003","01090004","01100001","01100002","01100005","02020003","02020006"],"MD":["02040205","02040303","02050306","02060001","02060002","02060003","02060004","02060005","02060006","02070001","02070002","02070003","02070004","02070007","02070008","02070009","02070010","02070011","02080101","02080102","02080109","02080110","02080111","05020004","05020006"],"ME":["01010002","01010003","01010004","01010005","01010006","01010007","01010008","01010009","01010010","01010011","01020001","01020002","01020003","01020004","01020005","01030001","01030002","01030003","01040001","01040002","01050001","01050002","01050003","01050004","01060001","01060002","01060003","01080101","04300202","04310001"],"MI":["04010302","04020101","04020102","04020103","04020104","04020105","04020201","04020202","04020203","04030106","04030107","04030108","04030109","04030110","04030111","04030112","04030113","04030114","04040001","04050001","04050002","04050003","04050004","04050005","04050006","04050007","04060101","04060102","04060103","04060104","04060105","04070003","04070004","04070005","04070006","04070007","04080101","04080102","04080103","04080104","04080201","04080202","04080203","04080204","04080205","04080206","04090001","04090002","04090003","04090004","04100001","04100002","04100003","04100006","04100013","04180000","04190000","04200001","04200002","04240002","04260000","07050002","07070001","07120001"],"MN":["04010101","04010102","04010201","04010202","04010301","04180000","07010101","07010102","07010103","07010104","07010105","07010106","07010107","07010108","07010201","07010202","07010203","07010204","07010205","07010206","07010207","07020001","07020002","07020003","07020004","07020005","07020006","07020007","07020008","07020009","07020010","07020011","07020012","07030001","07030003","07030004","07030005","07040001","07040002","07040003","07040004","07040006","07040008","07060001","07060002","07080102","07080201","07080202","07080203","07100001","07100002","07100003","09020101","09020102","09020103","09020104","09020106","09020107","09020108","09020301","09020302","09020303","09020304","09020305","09020306","09020309","09020311","09020312","09020314","09030001","09030002","09030003","09030005","09030006","09030007","09030008","09030009","10170202","10170203","10170204","10230003"],"MO":["07080104","07100009","07110001","07110002","07110003","07110004","07110005","07110006","07110007","07110008","07110009","07140101","07140102","07140103","07140104","07140105","07140107","08010100","08010300","08020202","08020203","08020204","08020302","10240001","10240004","10240005","10240010","10240011","10240012","10240013","10270104","10280101","10280102","10280103","10280201","10280202","10280203","10290102","10290103","10290104","10290105","10290106","10290107","10290108","10290109","10290110","10290111","10290201","10290202","10290203","10300101","10300102","10300103","10300104","10300200","11010001","11010002","11010003","11010006","11010007","11010008","11010009","11010010","11010011","11070206","11070207","11070208"],"MP":["22020101","22020102","22020103","22020104","22020201","22020202","22020203","22020204","22020205","22020206","22020207","22020208","22020209","22020210"],"MS":["03160101","03160102","03160103","03160104","03160105","03160106","03160108","03160201","03160202","03170001","03170002","03170003","03170004","03170005","03170006","03170007","03170008","03170009","03180001","03180002","03180003","03180004","03180005","06030005","06030006","06040001","08010100","08010207","08010208","08010210","08010211","08020100","08030100","08030201","08030202","08030203","08030204","08030205","08030206","08030207","08030208","08030209","08060100","08060201","08060202","08060203","08060204","08060205","08060206","08070100","08070201","08070202","08070203","08070205","08090203"],"MT":["09040001","09040002","10020001","10020002","10020003","10020004","10020005","10020006","10020007","10020008","10030101","10030102","10030103","10030104","10030105","10030201","10030202","10030203","10030204","10030205","10040101","10040102","10040103","10040104","10040105","10040106","10040201","10040202","10040203","10040204","10040205","10050001","10050002","10050003","10050004","10050005","10050006","10050007","10050008","10050009","10050010","10050011","10050012","10050013","10050014","10050015","10050016","10060001","10060002","10060003","10060004","10060005","10060006","10060007","10070001","10070002","10070003","10070004","10070005","10070006","10070007","10070008","10080010","10080014","10080015","10080016","10090101","10090102","10090207","10090208","10090209","10090210","10100001","10100002","10100003","10100004","10100005","10110201","10110202","10110203","10110204","10120202","17010101","17010102","17010103","17010104","17010105","17010106","17010201","17010202","17010203","17010204","17010205","17010206","17010207","17010208","17010209","17010210","17010211","17010212","17010213","17010301","17010302","17010304","17040202","17040214","17040215","17040216","17060203","17060204","17060207","17060301","17060302","17060303","17060307"],"MX":["13030102","13030201","13030202","13040100","13040201","13040202","13040203","13040205","13040208","13040210","13040212","13080001","13080002","13080003","13090001","13090002","13100000","13110000","13120000","15030107","15030108","15050202","15050301","15080101","15080102","15080103","15080200","15080301","15080302","15080303","18070304","18070305","18100202","18100204"],"NC":["03010102","03010103","03010104","03010106","03010107","03010201","03010202","03010203","03010204","03010205","03020101","03020102","03020103","03020104","03020105","03020201","03020202","03020203","03020204","03020301","03020302","03030002","03030003","03030004","03030005","03030006","03030007","03040101","03040102","03040103","03040104","03040105","03040201","03040202","03040203","03040204","03040206","03040208","03050101","03050102","03050103","03050105","03050109","03060101","03060102","05050001","06010102","06010103","06010105","06010106","06010107","06010108","06010201","06010202","06010203","06010204","06020002","06020003"],"ND":["07020001","09010002","09010003","09010004","09010005","09010006","09010007","09010008","09020101","09020104","09020105","09020106","09020107","09020109","09020201","09020202","09020203","09020204","09020205","09020301","09020306","09020307","09020308","09020310","09020311","09020315","09020316","10060005","10060006","10060007","10100004","10110101","10110102","10110201","10110202","10110203","10110204","10110205","10130101","10130102","10130103","10130104","10130106","10130201","10130202","10130203","10130204","10130205","10130206","10130301","10130303","10160001","10160002","10160003","10160004"],"NE":["10120106","10120108","10140101","10140201","10140203","10150002","10150003","10150004","10150005","10150006","10150007","10170101","10170104","10170203","10180009","10180012","10180013","10180014","10190012","10190015","10190016","10190017","10190018","10200101","10200102","10200103","10200201","10200202","10200203","10210001","10210002","10210003","10210004","10210005","10210006","10210007","10210008","10210009","10210010","10220001","10220002","10220003","10220004","10230001","10230006","10240001","10240004","10240005","10240006","10240007","10240008","10250001","10250002","10250003","10250004","10250005","10250006","10250007","10250008","10250009","10250011","10250014","10250015","10250016","10260012","10270201","10270202","10270203","10270204","10270205","10270206","10270207"],"NH":["01040001","01040002","01060002","01060003","01070001","01070002","01070003","01070004","01070006","01080101","01080102","01080103","01080104","01080106","01080107","01080201","01080202","04300202"],"NJ":["02020007","02030101","02030103","02030104","02030105","02030202","02040104","02040105","02040201","02040202","02040204","02040206","02040301","02040302","02040303"],"NM":["11020010","11040001","11040002","11080001","11080002","11080003","11080004","11080005","11080006","11080007","11080008","11090101","11090102","11090103","11090104","11100101","11100103","11120101","11120102","12050001","12050002","12050005","12080001","12080003","12080004","12080006","13010002","13010005","13020101","13020102","13020201","13020202","13020203","13020204","13020205","13020206","13020207","13020208","13020209","13020210","13020211","13030101","13030102","13030103","13030201","13030202","13040100","13050001","13050002","13050003","13050004","13060001","13060002","13060003","13060004","13060005","13060006","13060007","13060008","13060009","13060010","13060011","13070001","13070002","13070007","14080101","14080103","14080104","14080105","14080106","14080107","14080201","14080204","15020001","15020002","15020003","15020004","15020006","15040001","15040002","15040003","15040004","15040006","15080302","15080303"],"NV":["15010005","15010006","15010010","15010011","15010012","15010013","15010015","15030101","15030102","16020301","16020306","16020307","16020308","16030006","16040101","16040102","16040103","16040104","16040105","16040106","16040107","16040108","16040109","16040201","16040202","16040203","16040204","16040205","16050101","16050102","16050103","16050104","16050201","16050202","16050203","16050301","16050302","16050303","16050304","16060001","16060002","16060003","16060004","16060005","16060006","16060007","16060008","16060009","16060010","16060011","16060012","16060013","16060014","16060015","17040211","17040213","17050102","17050104","17050105","17050106","17050107","17120007","17120008","17120009","18080001","18080002","18080003","18090101","18090102","18090201","18090202","18090203"],"NY":["01100005","01100006","02020001","02020002","02020003","02020004","02020005","02020006","02020007","02020008","02030101","02030102","02030103","02030104","02030201","02030202","02030203","02040101","02040102","02040104","02040301","02050101","02050102","02050103","02050104","02050105","04120101","04120102","04120103","04130001","04130002","04130003","04140101","04140102","04140201","04140202","04140203","04140301","04140302","04260000","04270101","04280002","04290001","04290002","04290003","04290004","04290005","04290006","04290007","04290008","04300101","04300104","04300106","04300108","04300109","04300201","05010001","05010002","05010004"],"OH":["04100001","04100002","04100003","04100004","04100005","04100006","04100007","04100008","04100009","04100010","04100011","04100012","04110001","04110002","04110003","04110004","04120101","04260000","05030101","05030102","05030103","05030106","05030201","05030202","05030204","05040001","05040002","05040003","05040004","05040005","05040006","05060001","05060002","05060003","05080001","05080002","05080003","05090101","05090103","05090201","05090202","05090203","05120101","05120103"],"OK":["11040001","11040002","11040006","11040007","11040008","11050001","11050002","11050003","11060001","11060002","11060003","11060004","11060005","11060006","11070103","11070105","11070106","11070107","11070205","11070206","11070207","11070208","11070209","11090103","11090106","11090201","11090202","11090203","11090204","11100101","11100102","11100103","11100104","11100201","11100203","11100301","11100302","11100303","11110101","11110102","11110103","11110104","11110105","11120105","11120202","11120302","11120303","11120304","11130101","11130102","11130105","11130201","11130202","11130203","11130206","11130208","11130210","11130301","11130302","11130303","11130304","11140101","11140102","11140103","11140104","11140105","11140106","11140107","11140108","11140109"],"OR":["16040201","16040205","17050103","17050105","17050106","17050107","17050108","17050109","17050110","17050115","17050116","17050117","17050118","17050119","17050201","17050202","17050203","17060101","17060102","17060103","17060104","17060105","17060106","17070101","17070102","17070103","17070104","17070105","17070201","17070202","17070203","17070204","17070301","17070302","17070303","17070304","17070305","17070306","17070307","17080001","17080003","17080006","17090001","17090002","17090003","17090004","17090005","17090006","17090007","17090008","17090009","17090010","17090011","17090012","17100106","17100201","17100202","17100203","17100204","17100205","17100206","17100207","17100301","17100302","17100303","17100304","17100305","17100306","17100307","17100308","17100309","17100310","17100311","17100312","17120001","17120002","17120003","17120004","17120005","17120006","17120007","17120008","17120009","18010101","18010201","18010202","18010203","18010204","18010205","18010206","18010209","18020001"],"PA":["02040101","02040103","02040104","02040105","02040106","02040201","02040202","02040203","02040205","02050101","02050103","02050104","02050105","02050106","02050107","02050201","02050202","02050203","02050204","02050205","02050206","02050301","02050302","02050303","02050304","02050305","02050306","02060002","02060003","02070002","02070003","02070004","02070009","04110003","04120101","04130002","04260000","05010001","05010002","05010003","05010004","05010005","05010006","05010007","05010008","05010009","05020003","05020004","05020005","05020006","05030101","05030102","05030103","05030104","05030105","05030106"],"PR":["21010002","21010003","21010004","21010005","21010007","21010008"],"RI":["01090002","01090003","01090004","01090006","01100001","01100007","02030202","02030203"],"SC":["03040104","03040105","03040201","03040202","03040203","03040204","03040205","03040206","03040207","03040208","03050101","03050102","03050103","03050104","03050105","03050106","03050107","03050108","03050109","03050110","03050111","03050112","03050201","03050202","03050203","03050204","03050205","03050206","03050207","03050208","03050209","03050210","03060101","03060102","03060103","03060106","03060107","03060109","03060110","06010105"],"SD":["07020001","07020003","07020004","09020101","09020105","10110201","10110202","10120106","10120107","10120108","10120109","10120110","10120111","10120112","10120113","10120201","10120202","10120203","10130102","10130105","10130106","10130205","10130301","10130302","10130303","10130304","10130305","10130306","10140101","10140102","10140103","10140104","10140105","10140201","10140202","10140203","10140204","10150003","10150004","10150006","10160003","10160004","10160005","10160006","10160007","10160008","10160009","10160011","10170101","10170102","10170103","10170104","10170201","10170202","10170203","10230001"],"TN":["03150101","05050001","05110002","05130101","05130103","05130104","05130105","05130106","05130107","05130108","05130201","05130202","05130203","05130204","05130205","05130206","06010101","06010102","06010103","06010104","06010105","06010106","06010107","06010108","06010201","06010202","06010203","06010204","06010205","06010206","06010207","06010208","06020001","06020002","06020003","06020004","06030001","06030002","06030003","06030004","06030005","06040001","06040002","06040003","06040004","06040005","06040006","08010100","08010201","08010202","08010203","08010204","08010205","08010206","08010207","08010208","08010209","08010210","08010211","08030204"],"TX":["11080006","11090101","11090102","11090103","11090104","11090105","11090106","11090201","11100101","11100102","11100103","11100104","11100201","11100202","11100203","11120101","11120102","11120103","11120104","11120105","11120201","11120202","11120301","11120302","11120304","11130101","11130102","11130103","11130104","11130105","11130201","11130204","11130205","11130206","11130207","11130209","11130210","11130301","11140101","11140106","11140201","11140206","11140301","11140302","11140303","11140304","11140305","11140306","11140307","12010001","12010002","12010003","12010004","12010005","12020001","12020002","12020003","12020004","12020005","12020006","12020007","12030101","12030102","12030103","12030104","12030105","12030106","12030107","12030108","12030109","12030201","12030202","12030203","12040101","12040102","12040103","12040104","12040201","12040202","12040203","12040204","12040205","12050001","12050002","12050003","12050004","12050005","12050006","12050007","12060101","12060102","12060103","12060104","12060105","12060201","12060202","12060203","12060204","12070101","12070102","12070103","12070104","12070201","12070202","12070203","12070204","12070205","12080001","12080002","12080003","12080004","12080005","12080006","12080007","12080008","12090101","12090102","12090103","12090104","12090105","12090106","12090107","12090108","12090109","12090110","12090201","12090202","12090203","12090204","12090205","12090206","12090301","12090302","12090401","12090402","12100101","12100102","12100201","12100202","12100203","12100204","12100301","12100302","12100303","12100304","12100401","12100402","12100403","12100404","12100405","12100406","12100407","12110101","12110102","12110103","12110104","12110105","12110106","12110107","12110108","12110109","12110110","12110111","12110201","12110202","12110203","12110204","12110205","12110206","12110207","12110208","13030102","13040100","13040201","13040202","13040203","13040204","13040205","13040206","13040207","13040208","13040209","13040210","13040211","13040212","13040301","13040302","13040303","13050003","13050004","13060011","13070001","13070002","13070003","13070004","13070005","13070006","13070007","13070008","13070009","13070010","13070011","13070012","13080001","13080002","13080003","13090001","13090002"],"UM":["22040001","22040002","22040003","22040004","22040005","22040006","22040007"],"UT":["14010005","14030001","14030002","14030004","14030005","14040106","14040107","14040108","14050007","14060003","14060004","14060005","14060006","14060007","14060008","14060009","14060010","14070001","14070002","14070003","14070004","14070005","14070006","14070007","14080201","14080202","14080203","14080204","14080205","15010003","15010008","15010009","15010010","15010013","16010101","16010102","16010201","16010202","16010203","16010204","16020101","16020102","16020201","16020202","16020203","16020204","16020301","16020302","16020303","16020304","16020305","16020306","16020307","16020308","16020309","16020310","16030001","16030002","16030003","16030004","16030005","16030006","16030007","16030008","16030009","17040210","17040211"],"VA":["02040303","02040304","02070001","02070003","02070004","02070005","02070006","02070007","02070008","02070010","02070011","02080101","02080102","02080103","02080104","02080105","02080106","02080107","02080108","02080110","02080111","02080201","02080202","02080203","02080204","02080205","02080206","02080207","02080208","03010101","03010102","03010103","03010104","03010105","03010106","03010201","03010202","03010203","03010204","03010205","03040101","05050001","05050002","05050003","05070201","05070202","05100201","05130101","06010101","06010102","06010104","06010205","06010206"],"VI":["21020001","21020002"],"VT":["01080101","01080102","01080103","01080104","01080105","01080106","01080107","01080201","01080203","02020003","04300101","04300102","04300103","04300105","04300107","04300108","04300109","04300202"],"WA":["17010214","17010215","17010216","17010303","17010305","17010306","17010307","17010308","17020001","17020002","17020003","17020004","17020005","17020006","17020007","17020008","17020009","17020010","17020011","17020012","17020013","17020014","17020015","17020016","17030001","17030002","17030003","17060103","17060106","17060107","17060108","17060109","17060110","17060306","17070101","17070102","17070105","17070106","17080001","17080002","17080003","17080004","17080005","17080006","17100101","17100102","17100103","17100104","17100105","17100106","17110001","17110002","17110003","17110004","17110005","17110006","17110007","17110008","17110009","17110010","17110011","17110012","17110013","17110014","17110015","17110016","17110017","17110018","17110019","17110020","17110021"],"WI":["04010201","04010301","04010302","04020101","04020102","04030101","04030102","04030103","04030104","04030105","04030106","04030108","04030201","04030202","04030203","04030204","04040002","04040003","04180000","04190000","07030001","07030002","07030005","07040001","07040003","07040005","07040006","07040007","07050001","07050002","07050003","07050004","07050005","07050006","07050007","07060001","07060003","07060005","07070001","07070002","07070003","07070004","07070005","07070006","07090001","07090002","07090003","07090004","07090005","07090006","07120004","07120006"],"WV":["02070001","02070002","02070003","02070004","02070005","02070006","02070007","02070008","02080201","05020001","05020002","05020003","05020004","05020005","05020006","05030101","05030106","05030201","05030202","05030203","05050002","05050003","05050004","05050005","05050006","05050007","05050008","05050009","05070101","05070102","05070201","05070202","05070204","05090101","05090102","05090103","06010205"],"WY":["10020007","10020008","10070001","10070002","10070006","10080001","10080002","10080003","10080004","10080005","10080006","10080007","10080008","10080009","10080010","10080011","10080012","10080013","10080014","10080016","10090101","10090201","10090202","10090203","10090204","10090205","10090206","10090207","10090208","10110201","10120101","10120102","10120103","10120104","10120105","10120106","10120107","10120108","10120201","10120202","10120203","10150002","10180002","10180003","10180004","10180005","10180006","10180007","10180008","10180009","10180010","10180011","10180012","10180013","10190007","10190008","10190009","10190015","10190016","10190017","14040101","14040102","14040103","14040104","14040105","14040106","14040107","14040108","14040109","14040200","14050003","14050004","16010101","16010102","16020101","17040101","17040102","17040103","17040104","17040105","17040202","17040203","17040204"]}
+# fips (state abbreviation: FIPS code) and huc8 (state abbreviation: list of
+# HUC8 watersheds) are loaded from ECHO_modules/data on first use
+def __getattr__(name):
+    from ECHO_modules import reference
+    if name == 'fips':
+        return reference.fips_map()
+    if name == 'huc8':
+        return reference.huc8_map()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,316 @@
+'''
+Work with boundary geometries (counties, ZIP codes, watersheds, etc.).
+
+Full resolution polygons make for very large folium maps, so there are
+functions here to simplify regions at a few tolerances, pick the one that
+suits the extent being mapped, and round coordinates so the GeoJSON sent
+to the browser stays small. There are also functions to match facilities
+to the regions they are in.
+'''
+
+import math
+import numpy as np
+import pandas as pd
+import shapely
+
+# Simplification tolerances in degrees, from close-up to national views
+SIMPLIFY_TOLERANCES = (0.0002, 0.001, 0.005, 0.02)
+# The width in pixels we assume a map is drawn at when picking a tolerance
+MAP_WIDTH_PX = 1000
+# Coordinate decimal places to keep when the regions are not simplified
+FULL_PRECISION = 6
+
+
+def _simplify_coverage(geoms, tolerance):
+    '''
+    helper function for `simplify_regions`
+    Simplify the polygons as a coverage so the edges shared by neighboring
+    regions are simplified the same way and no slivers open up between them.
+    GEOS 3.12+ is needed for that; older versions fall back to simplifying
+    each polygon on its own.
+    '''
+    if hasattr(shapely, 'coverage_simplify'):
+        try:
+            return shapely.coverage_simplify(geoms, tolerance)
+        except shapely.errors.GEOSException:
+            pass
+    return shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+
+def simplify_regions(regions, tolerances=SIMPLIFY_TOLERANCES):
+    '''
+    Create simplified versions of the regions at several tolerances.
+
+    Parameters
+    ----------
+    regions : GeoDataFrame
+        Polygons in a geographic (degree) CRS, e.g. from get_spatial_data
+    tolerances : tuple
+        The tolerances, in degrees, at which to simplify
+
+    Returns
+    -------
+    dict
+        Keys are the tolerances and values are copies of regions with
+        simplified geometries
+    '''
+    regions = regions[~regions.geometry.isna()]
+    levels = {}
+    for tolerance in tolerances:
+        level = regions.copy()
+        level.geometry = _simplify_coverage(regions.geometry.values, tolerance)
+        levels[tolerance] = level
+    return levels
+
+
+def pick_tolerance(bounds, tolerances=SIMPLIFY_TOLERANCES, width_px=MAP_WIDTH_PX):
+    '''
+    Choose the coarsest tolerance that is still smaller than one pixel
+    when the bounds are fit to a map width_px wide.
+
+    Parameters
+    ----------
+    bounds : sequence
+        minx, miny, maxx, maxy of the area being mapped
+    tolerances : tuple
+        The available tolerances
+    width_px : int
+        The width of the map in pixels
+
+    Returns
+    -------
+    float or None
+        The tolerance, or None if even the finest one would be visible
+    '''
+    minx, miny, maxx, maxy = bounds
+    pixel = max(maxx - minx, maxy - miny) / width_px
+    candidates = [t for t in tolerances if t <= pixel]
+    if not candidates:
+        return None
+    return max(candidates)
+
+
+def quantize_regions(regions, digits):
+    '''
+    Round the coordinates of the regions to the given number of decimal
+    places. Neighboring regions share the same vertices along their common
+    edge, and those round to the same values, so no gaps open up.
+
+    Parameters
+    ----------
+    regions : GeoDataFrame
+    digits : int
+        Decimal places to keep
+
+    Returns
+    -------
+    GeoDataFrame
+        A copy of regions with rounded coordinates
+    '''
+    regions = regions.copy()
+    regions.geometry = shapely.transform(regions.geometry.values,
+                                         lambda coords: np.round(coords, digits))
+    return regions
+
+
+def map_regions(regions, levels=None, bounds=None, width_px=MAP_WIDTH_PX):
+    '''
+    Return the version of the regions to hand to folium: simplified to suit
+    the extent of the map and with coordinates rounded to match.
+
+    Parameters
+    ----------
+    regions : GeoDataFrame
+        The full resolution regions
+    levels : dict
+        Optional output of simplify_regions, to reuse across maps
+    bounds : sequence
+        Optional minx, miny, maxx, maxy of the map. Defaults to the extent
+        of the regions.
+    width_px : int
+        The width of the map in pixels
+
+    Returns
+    -------
+    GeoDataFrame
+        In EPSG:4326
+    '''
+    regions = regions[~regions.geometry.isna()]
+    if regions.empty:
+        return regions
+    if regions.crs is not None and not regions.crs.equals("EPSG:4326"):
+        regions = regions.to_crs(4326)
+        levels = None # These would be in the wrong CRS
+    if bounds is None:
+        bounds = regions.total_bounds
+    tolerances = SIMPLIFY_TOLERANCES if levels is None else tuple(levels.keys())
+    tolerance = pick_tolerance(bounds, tolerances, width_px)
+    if tolerance is None:
+        return quantize_regions(regions, FULL_PRECISION)
+    if levels is not None:
+        regions = levels[tolerance]
+    else:
+        regions = simplify_regions(regions, (tolerance,))[tolerance]
+    # Keep about one more decimal place than the tolerance resolves
+    digits = min(FULL_PRECISION, math.ceil(-math.log10(tolerance)) + 1)
+    return quantize_regions(regions, digits)
+
+
+def points_to_regions(df, regions, id_field, lat_field='FAC_LAT', long_field='FAC_LONG'):
+    '''
+    Find the region that each facility (or other point) falls in, using a
+    spatial index over the regions so that large numbers of points can be
+    matched at once.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The points, with latitude and longitude columns
+    regions : GeoDataFrame
+        The polygons to match the points to
+    id_field : str
+        The column in regions identifying each polygon
+    lat_field : str
+        The latitude column in df
+    long_field : str
+        The longitude column in df
+
+    Returns
+    -------
+    Series
+        The id_field value of the region each point is in, aligned with df.
+        Points outside every region, or without coordinates, are NaN.
+    '''
+    if regions.crs is not None and not regions.crs.is_geographic:
+        regions = regions.to_crs(4326)
+    lats = pd.to_numeric(df[lat_field], errors='coerce').to_numpy(dtype=float)
+    longs = pd.to_numeric(df[long_field], errors='coerce').to_numpy(dtype=float)
+    located = ~(np.isnan(lats) | np.isnan(longs))
+    points = shapely.points(longs[located], lats[located])
+
+    tree = shapely.STRtree(regions.geometry.values)
+    point_idx, region_idx = tree.query(points, predicate='intersects')
+    # A point on the edge between two regions matches both, so keep the first
+    point_idx, first = np.unique(point_idx, return_index=True)
+    region_idx = region_idx[first]
+
+    ids = np.full(len(df), np.nan, dtype=object)
+    ids[np.flatnonzero(located)[point_idx]] = regions[id_field].to_numpy()[region_idx]
+    return pd.Series(ids, index=df.index, name=id_field)
+
+
+# Earth radius used by Web Mercator (EPSG:3857), in metres
+MERCATOR_RADIUS = 6378137.0
+
+
+def _to_mercator(lats, longs):
+    x = np.radians(longs) * MERCATOR_RADIUS
+    y = np.log(np.tan(np.pi / 4 + np.radians(np.clip(lats, -85.0511, 85.0511)) / 2)) * MERCATOR_RADIUS
+    return x, y
+
+
+def _from_mercator(x, y):
+    longs = np.degrees(x / MERCATOR_RADIUS)
+    lats = np.degrees(2 * np.arctan(np.exp(y / MERCATOR_RADIUS)) - np.pi / 2)
+    return lats, longs
+
+
+def _hex_cells(x, y, size):
+    '''
+    helper function for `bin_points`
+    The axial (q, r) coordinates of the pointy-top hexagons of width size
+    that the points fall in, by rounding in cube coordinates.
+    '''
+    radius = size / np.sqrt(3)
+    q = (np.sqrt(3) / 3 * x - y / 3) / radius
+    r = (2 / 3 * y) / radius
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def bin_points(df, value_field=None, cell_size=50000, shape='hex', agg='sum',
+               lat_field='FAC_LAT', long_field='FAC_LONG'):
+    '''
+    Aggregate points (e.g. facilities from aggregate_by_facility) into
+    hexagonal or square cells, for mapping dense data at low zoom. The cells
+    are regular in Web Mercator, so they look regular on a web map.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The points, with latitude and longitude columns
+    value_field : str
+        Optional column to aggregate, e.g. the aggregator from aggregate_by_facility
+    cell_size : float
+        The width of a cell in Web Mercator metres
+    shape : str
+        'hex' or 'square'
+    agg : str
+        How to aggregate value_field in each cell: 'sum' or 'mean'
+    lat_field : str
+        The latitude column in df
+    long_field : str
+        The longitude column in df
+
+    Returns
+    -------
+    GeoDataFrame
+        One row per cell with any points: cell (an id), count (the number
+        of points) and, if value_field is given, value_field aggregated.
+        In EPSG:4326.
+    '''
+    import geopandas
+
+    lats = pd.to_numeric(df[lat_field], errors='coerce').to_numpy(dtype=float)
+    longs = pd.to_numeric(df[long_field], errors='coerce').to_numpy(dtype=float)
+    located = ~(np.isnan(lats) | np.isnan(longs))
+    x, y = _to_mercator(lats[located], longs[located])
+
+    if shape == 'hex':
+        i, j = _hex_cells(x, y, cell_size)
+    elif shape == 'square':
+        i, j = np.floor(x / cell_size).astype(np.int64), np.floor(y / cell_size).astype(np.int64)
+    else:
+        raise ValueError("shape must be 'hex' or 'square'")
+
+    # One integer key per cell, then count and sum with bincount
+    i_min = i.min() if len(i) else 0
+    j_min = j.min() if len(j) else 0
+    rows = (j.max() - j_min + 1) if len(j) else 1
+    codes, cells = pd.factorize((i - i_min) * rows + (j - j_min))
+    ci, cj = cells // rows + i_min, cells % rows + j_min
+    result = pd.DataFrame({'cell': [f'{a}_{b}' for a, b in zip(ci, cj)],
+                           'count': np.bincount(codes, minlength=len(cells))})
+    if value_field is not None:
+        values = pd.to_numeric(df[value_field], errors='coerce').to_numpy(dtype=float)[located]
+        has_value = ~np.isnan(values)
+        totals = np.bincount(codes[has_value], weights=values[has_value], minlength=len(cells))
+        if agg == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                totals = totals / np.bincount(codes[has_value], minlength=len(cells))
+        elif agg != 'sum':
+            raise ValueError("agg must be 'sum' or 'mean'")
+        result[value_field] = totals
+
+    # The corners of the cells, in Mercator and then degrees
+    if shape == 'hex':
+        radius = cell_size / np.sqrt(3)
+        cx = radius * np.sqrt(3) * (ci + cj / 2)
+        cy = radius * 1.5 * cj
+        angles = np.radians(np.arange(6) * 60 + 30)
+        corner_x = cx[:, None] + radius * np.cos(angles)[None, :]
+        corner_y = cy[:, None] + radius * np.sin(angles)[None, :]
+    else:
+        corner_x = (ci[:, None] + np.array([0, 1, 1, 0])[None, :]) * cell_size
+        corner_y = (cj[:, None] + np.array([0, 0, 1, 1])[None, :]) * cell_size
+    corner_lats, corner_longs = _from_mercator(corner_x, corner_y)
+    rings = np.stack([corner_longs, corner_lats], axis=-1)
+    rings = np.concatenate([rings, rings[:, :1]], axis=1) # close the rings
+    polygons = shapely.polygons(np.round(rings, FULL_PRECISION)) if len(rings) else []
+    return geopandas.GeoDataFrame(result, geometry=polygons, crs=4326)
@@ -4,10 +4,26 @@ import pandas as pd
 import json
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
+from ECHO_modules.cache import cache_path, write_atomic
+from ECHO_modules.compliance import add_history_bitmasks
+from ECHO_modules.reference import add_county_canon
 
 
 DELTA_TABLES_DIR = os.environ.get('DELTA_TABLES_MOUNT_PATH')
+SCHEMA_DIR = os.environ.get('SCHEMA_HOST_PATH')
 API_SERVER = "https://portal.gss.stonybrook.edu/api"
+ARCGIS_MAX_WORKERS = 4 # Concurrent page requests to an ArcGIS REST service
+ARCGIS_TIMEOUT = 30
+SCHEMA_TIMEOUT = 30 # Seconds to wait for a table's schema from the API
+TRACT_URL = "https://www2.census.gov/geo/tiger/TIGER2010/TRACT/2010/tl_2010_{fips}_tract10.zip"
+# See the USGS REST Services page: https://apps.nationalmap.gov/services/
+WATERSHED_URL = "https://hydro.nationalmap.gov/arcgis/rest/services/wbd/MapServer/{layer}/query"
+WATERSHED_LAYERS = {8: 4, 10: 5, 12: 6} # HUC digits: WBD map service layer
+HUC8_IDS_PER_REQUEST = 100
+# TIGERweb current vintage block groups and congressional districts
+BLOCK_GROUP_URL = "https://tigerweb.geo.census.gov/arcgis/rest/services/TIGERweb/Tracts_Blocks/MapServer/1/query"
+CURRENT_CD_URL = "https://tigerweb.geo.census.gov/arcgis/rest/services/TIGERweb/Legislative/MapServer/0/query"
 
 
 def spatial_selector(units):
@@ -28,7 +44,7 @@ def spatial_selector(units):
 
 def get_huc8_by_states(state_codes):
     """
-    Returns a combined list of HUC8 codes for the given list of state codes from the JSON mapping file.
+    Returns a combined list of HUC8 codes for the given list of state codes from the packaged reference data.
     
     Parameters:
         state_codes (list): A list of state abbreviations (e.g., ['NY', 'NJ']).
@@ -37,25 +53,12 @@ def get_huc8_by_states(state_codes):
         list: A sorted list of unique HUC8 codes associated with the given state codes.
               Returns an empty list if none of the state codes are found.
     """
-    from ECHO_modules.geographies import huc8
-    try:
-        state_huc8_map = huc8
-    except:
-        print(f"Error: HUC8 lookup not found.")
-        return []
-    
-    # Use a set to avoid duplicate HUC8 codes.
-    combined_huc8 = set()
-    for state in state_codes:
-        # Retrieve HUC8 codes for this state, if present.
-        codes = state_huc8_map.get(state, [])
-        combined_huc8.update(codes)
-    
-    # Return a sorted list of HUC8 codes.
-    return sorted(list(combined_huc8))
+    from ECHO_modules.reference import state_huc8s
+    return state_huc8s(state_codes)
 
 def state_abbr_to_fips(state_abbrs):
-    from ECHO_modules.geographies import fips
+    from ECHO_modules.reference import fips_map
+    fips = fips_map()
     fips_codes = []
     for abbr in state_abbrs:
         # Check if the abbreviation is in the data dictionary's keys
@@ -65,7 +68,299 @@ def state_abbr_to_fips(state_abbrs):
             return None  # State abbreviation not found
     return fips_codes
 
-def get_spatial_data(region_type, states, fips=None, region_filter=None):
+def _arcgis_post(url, params, timeout=ARCGIS_TIMEOUT):
+    '''
+    helper function for `get_arcgis_features`
+    POSTs a request to an ArcGIS REST endpoint and returns the decoded JSON.
+    ArcGIS reports most errors with a 200 status and an "error" member,
+    so those are raised here too.
+    '''
+    response = requests.post(url, data=params, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
+    if "error" in result:
+        raise requests.exceptions.RequestException(
+            f"{url}: {result['error'].get('message', result['error'])}")
+    return result
+
+def get_arcgis_features(url, where="1=1", out_fields="*", params=None,
+                        page_size=None, max_workers=ARCGIS_MAX_WORKERS,
+                        timeout=ARCGIS_TIMEOUT):
+    '''
+    Retrieve every feature matching a query from an ArcGIS REST map or
+    feature service layer.
+
+    A single query is cut off at the layer's maxRecordCount, so this first
+    asks the service how many features match, then requests the pages with
+    resultOffset/resultRecordCount in parallel and stitches them together.
+    Queries are POSTed so that long where clauses don't hit URL limits.
+
+    Parameters
+    ----------
+    url : str
+        The layer URL, with or without the trailing /query
+    where : str
+        The SQL where clause, e.g. "STATE IN ('36')"
+    out_fields : str
+        The fields to return
+    params : dict
+        Optional extra query parameters, e.g. {"geometryPrecision": "4"}
+    page_size : int
+        Features per request. Defaults to the layer's maxRecordCount.
+    max_workers : int
+        The maximum number of requests in flight at once
+    timeout : int
+        Seconds to wait for each response
+
+    Returns
+    -------
+    GeoDataFrame or None
+        The features in EPSG:4326, empty if none matched the query, or None
+        if the request failed
+    '''
+    query_url = url.rstrip('/')
+    if not query_url.endswith('/query'):
+        query_url += '/query'
+    layer_url = query_url[:-len('/query')]
+    query = {"where": where, "outFields": out_fields}
+    if params is not None:
+        query.update(params)
+
+    try:
+        count = _arcgis_post(query_url, {**query, "returnCountOnly": "true", "f": "json"},
+                             timeout).get("count", 0)
+        if count == 0:
+            print("No features matched the query.")
+            return geopandas.GeoDataFrame(geometry=[], crs="EPSG:4326")
+
+        layer = _arcgis_post(layer_url, {"f": "json"}, timeout)
+        if page_size is None:
+            page_size = layer.get("maxRecordCount") or 1000
+        # Page in a stable order so no feature shows up on two pages
+        order_by = layer.get("objectIdField")
+        if order_by is None:
+            order_by = next((f["name"] for f in layer.get("fields", [])
+                             if f.get("type") == "esriFieldTypeOID"), None)
+        if order_by is not None:
+            query["orderByFields"] = order_by
+
+        def fetch_page(offset):
+            page = {**query, "resultOffset": offset, "resultRecordCount": page_size,
+                    "f": "geojson"}
+            return _arcgis_post(query_url, page, timeout).get("features", [])
+
+        offsets = range(0, count, page_size)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(offsets)))) as pool:
+            pages = list(pool.map(fetch_page, offsets))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Error retrieving data: {e}")
+        return None
+
+    features = [feature for page in pages for feature in page]
+    print(f"Success: retrieved {len(features)} features in {len(pages)} request(s)!")
+    return geopandas.GeoDataFrame.from_features(features, crs="EPSG:4326")
+
+def _tract_file(state_fips):
+    '''
+    helper function for `get_tract_boundaries`
+    Returns the path of the cached GeoParquet file of a state's 2010 Census
+    Tracts, downloading the TIGER shapefile and converting it the first time.
+    '''
+    path = cache_path('tracts', f'tl_2010_{state_fips}_tract10.parquet')
+    if os.path.exists(path):
+        return path
+
+    import tempfile, zipfile, io
+    print(f"Downloading Census Tracts for state FIPS {state_fips} ...")
+    response = requests.get(TRACT_URL.format(fips=state_fips), timeout=120)
+    response.raise_for_status()
+    with tempfile.TemporaryDirectory() as tmp:
+        zipfile.ZipFile(io.BytesIO(response.content)).extractall(tmp)
+        tracts = geopandas.read_file(os.path.join(tmp, f'tl_2010_{state_fips}_tract10.shp'))
+    tracts.columns = tracts.columns.str.lower() #convert columns to lowercase for consistency
+    tracts = tracts.set_geometry('geometry')
+
+    # A bbox column lets later reads skip row groups outside a bbox
+    write_atomic(path, lambda tmp_path: tracts.to_parquet(tmp_path, write_covering_bbox=True))
+    return path
+
+def _read_tracts(path, columns=None, bbox=None, region_filter=None):
+    '''
+    helper function for `get_tract_boundaries`
+    Reads only the requested columns, rows and area of one state's tracts.
+    '''
+    filters = None
+    if region_filter:
+        filters = [('geoid10', 'in', [str(r) for r in region_filter])]
+    return geopandas.read_parquet(path, columns=columns, bbox=bbox, filters=filters)
+
+def get_tract_boundaries(states, region_filter=None, columns=None, bbox=None,
+                         max_workers=ARCGIS_MAX_WORKERS):
+    '''
+    Returns 2010 Census Tract boundaries for one or more states.
+
+    Each state's tracts are downloaded once and kept in the cache as a
+    GeoParquet file. States are loaded in parallel and only the requested
+    columns, tracts and bounding box are read from those files.
+
+    Parameters
+    ----------
+    states : list
+        State abbreviations e.g. ["NY", "NJ"]
+    region_filter : list
+        Optional - tract GEOID10 values to return
+    columns : list
+        Optional - the (lowercase) columns to return e.g. ["geoid10", "namelsad10"]
+    bbox : tuple
+        Optional - minx, miny, maxx, maxy to clip the read to, in NAD83 degrees
+
+    Returns
+    -------
+    GeoDataFrame
+        The tracts, in EPSG:4269
+    '''
+    state_fips = state_abbr_to_fips(states)
+    if state_fips is None:
+        print("ERROR: Unknown state in", states)
+        return geopandas.GeoDataFrame(geometry=[], crs="EPSG:4269")
+    if columns is not None and 'geometry' not in columns:
+        columns = list(columns) + ['geometry']
+
+    def load(f):
+        try:
+            return _read_tracts(_tract_file(f), columns, bbox, region_filter)
+        except requests.exceptions.RequestException as e:
+            print(f"Error retrieving Census Tracts for state FIPS {f}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(state_fips)))) as pool:
+        tracts = [t for t in pool.map(load, sorted(set(state_fips))) if t is not None]
+    if not tracts:
+        return geopandas.GeoDataFrame(geometry=[], crs="EPSG:4269")
+    return geopandas.GeoDataFrame(pd.concat(tracts, ignore_index=True), crs=tracts[0].crs)
+
+def _huc8_cache_file(level=8):
+    return cache_path('watersheds', f'wbdhu{level}.parquet')
+
+def _normalize_huc8(codes):
+    # HUC8s are 8 digit strings, but may come in as ints that lost a leading 0
+    return sorted(set(str(code).strip().zfill(8) for code in codes))
+
+def get_huc8_index():
+    '''
+    Returns a local index of HUC8 watersheds built from the state to HUC8
+    reference table in ECHO_modules/data.
+
+    Returns
+    -------
+    DataFrame
+        Indexed by huc8, with the states each watershed is in and its
+        bounding box (minx, miny, maxx, maxy). The bounding box is NaN until
+        the watershed's geometry has been retrieved and cached.
+    '''
+    from ECHO_modules.reference import load_table
+    index = load_table('state_huc8').groupby('huc8')['FAC_STATE'].agg(tuple).to_frame('states')
+
+    path = _huc8_cache_file()
+    if os.path.exists(path):
+        bounds = geopandas.read_parquet(path, columns=['huc8', 'geometry'])
+        bounds = bounds.set_index('huc8').bounds
+        index = index.join(bounds)
+    else:
+        index[['minx', 'miny', 'maxx', 'maxy']] = float('nan')
+    return index
+
+def _cache_watersheds(fetched, level=8):
+    '''
+    helper function for `get_watersheds`
+    Adds newly retrieved watershed geometries to the geometry cache,
+    replacing any cached ones in the same HUC8s.
+    '''
+    path = _huc8_cache_file(level)
+    if os.path.exists(path):
+        cached = geopandas.read_parquet(path)
+        fetched = pd.concat([cached[~cached['huc8'].isin(fetched['huc8'])], fetched],
+                            ignore_index=True)
+    write_atomic(path, lambda tmp_path: fetched.to_parquet(tmp_path))
+
+def get_watersheds(states=None, huc8_codes=None, level=8, max_workers=ARCGIS_MAX_WORKERS):
+    '''
+    Returns HUC8 watershed boundaries, or the HUC10 or HUC12 watersheds
+    within them.
+
+    The HUC8s are looked up in the local index rather than sending the
+    service one huge "huc8 IN (...)" list. Watersheds already in the
+    geometry cache are read from it, and the rest are requested in chunks
+    of HUC8_IDS_PER_REQUEST codes, in parallel, and added to the cache.
+
+    Parameters
+    ----------
+    states : list
+        State abbreviations e.g. ["NY", "NJ"]. Used if huc8_codes is not given.
+    huc8_codes : list
+        Optional - the HUC8 codes to return
+    level : {8, 10, 12}
+        The HUC level of the watersheds to return
+
+    Returns
+    -------
+    GeoDataFrame
+        The watersheds, in EPSG:4326. HUC10 and HUC12 watersheds also have
+        the huc8 they are in.
+
+    Raises
+    ------
+    ValueError
+        If neither states nor huc8_codes are given, or level isn't 8, 10 or 12
+    '''
+    if level not in WATERSHED_LAYERS:
+        raise ValueError(f"level must be one of {sorted(WATERSHED_LAYERS)}, not {level!r}")
+    if huc8_codes:
+        codes = _normalize_huc8(huc8_codes)
+    elif not states:
+        raise ValueError("get_watersheds needs the states or the huc8_codes of the watersheds")
+    else:
+        if isinstance(states, str):
+            states = [states]
+        index = get_huc8_index()
+        codes = index[index['states'].apply(lambda s: not set(s).isdisjoint(states))].index
+        codes = _normalize_huc8(codes)
+
+    path = _huc8_cache_file(level)
+    cached = geopandas.GeoDataFrame(geometry=[], crs="EPSG:4326")
+    if os.path.exists(path):
+        cached = geopandas.read_parquet(path, filters=[('huc8', 'in', codes)])
+    missing = sorted(set(codes) - set(cached.get('huc8', [])))
+    print(f"{len(codes) - len(missing)} watersheds are cached, {len(missing)} to retrieve")
+    if not missing:
+        return cached
+
+    def fetch(chunk):
+        url = WATERSHED_URL.format(layer=WATERSHED_LAYERS[level])
+        if level == 8:
+            where = "huc8 IN " + spatial_selector(chunk)
+        else:
+            where = " OR ".join(f"huc{level} LIKE '{code}%'" for code in chunk)
+        # This helps to retrieve less amount of data
+        watersheds = get_arcgis_features(url, where, params={"geometryPrecision": "4"},
+                                         max_workers=1)
+        if level != 8 and watersheds is not None and not watersheds.empty:
+            watersheds['huc8'] = watersheds[f'huc{level}'].str[:8]
+        return watersheds
+
+    chunks = [missing[i:i + HUC8_IDS_PER_REQUEST]
+              for i in range(0, len(missing), HUC8_IDS_PER_REQUEST)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        fetched = [gdf for gdf in pool.map(fetch, chunks) if gdf is not None and not gdf.empty]
+    if not fetched:
+        return cached
+    fetched = geopandas.GeoDataFrame(pd.concat(fetched, ignore_index=True), crs="EPSG:4326")
+    _cache_watersheds(fetched, level)
+    if cached.empty:
+        return fetched
+    return geopandas.GeoDataFrame(pd.concat([cached, fetched], ignore_index=True), crs="EPSG:4326")
+
+def get_spatial_data(region_type, states, fips=None, region_filter=None, state_boundaries=True):
     '''
     Returns spatial data from the database utilizing an intersection query 
 
@@ -76,104 +371,47 @@ def get_spatial_data(region_type, states, fips=None, region_filter=None):
     states : list
         The extent across which to get the spatial data e.g. ["AL"]
     fips : dict
-        Optional - Import from ECHO_modules/geographies.py for Census Tracts
+        No longer used - Census Tracts are looked up from states
     region_filter : list
         Optional - specify whether to return specific units (e.g. a single county - ["Erie"]). region_filter should be based on the id_field specified in ECHO_modules/geographies.py spatial_tables
+    state_boundaries : bool
+        Optional - False to skip fetching the states' boundaries when only the units are needed
 
     Returns
     -------
     regions_gdf
         GeoDataFrame of the spatial units
     states_gdf
-        GeoDataFrame of the state(s) across which the units are selected
+        GeoDataFrame of the state(s) across which the units are selected, or None if state_boundaries is False
     
     '''
     def get_tiger_geojson(query_string, geography_flag):
         """
-        Retrieve GeoJSON data for counties in a given state using its FIPS code.
+        Retrieve TIGERweb features (states or counties) matching the query.
         
         Parameters:
-            state_fips (str): The FIPS code for the state (e.g., "06" for California)
-            geography (int): 0 for state, 1 for county 
+            query_string (str): The where clause, e.g. "STATE IN ('06')"
+            geography_flag (int): 0 for state, 1 for county 
         Returns:
-            dict: GeoJSON data as a Python dictionary, or None if the request fails.
+            GeoDataFrame or None: the features, or None if the request fails.
         """
-        import requests
         # See the TIGERweb REST Services page: https://tigerweb.geo.census.gov/tigerwebmain/TIGERweb_restmapservice.html
         # base_url[0]: States (or statistically equivalent entities); 2020 Census - January 1, 2020 vintage; Generalized; 500K
         # base_url[1]: Counties (or statistically equivalent entities); 2020 Census - January 1, 2020 vintage; Generalized; 500K
-        # base_url[1]: ZIP Code Tabulation Areas; 2020 Census - January 1, 2020 vintage; Generalized; 500K
         base_url = [
             "https://tigerweb.geo.census.gov/arcgis/rest/services/Generalized_TAB2020/State_County/MapServer/7/query",
             "https://tigerweb.geo.census.gov/arcgis/rest/services/Generalized_TAB2020/State_County/MapServer/11/query"
         ]
-        params = {
-            "where": f"{query_string}",  # Filter by state FIPS code
-            "outFields": "*",                  # Retrieve all available fields
-            "f": "geojson"                     # Return format as GeoJSON
-        }
-        # The timeout parameter may be necessary 
-        print(base_url[geography_flag], params)
-        response = requests.get(base_url[geography_flag], params=params, timeout=10)
-        if response.status_code == 200:
-            print("Success: retrieved the TIGER geojson!")
-            return response.json()
-        else:
-            print("Error retrieving data. Status code:", response.status_code)
-            return None
-
-    def get_watershed_geojson(query_string):
-        """
-        Returns:
-            dict: GeoJSON data as a Python dictionary, or None if the request fails.
-        """
-        import requests
-        # See the USGS REST Services page: https://apps.nationalmap.gov/services/
-        base_url = "https://hydro.nationalmap.gov/arcgis/rest/services/wbd/MapServer/4/query"
-        params = {
-            "where": f"{query_string}",  # Filter by state FIPS code
-            "outFields": "*",                  # Retrieve all available fields
-            "geometryPrecision": "4",          # This parameter helps to retrieve less amount of data
-            "f": "geojson"                     # Return format as GeoJSON
-        }
-        # somehow, the timeout parameter is necessary 
-        response = requests.get(base_url, params=params)
-        #print(response.url) # for debugging
-        if response.status_code == 200:
-            print("Success: retrieved the watershed geojson!")
-            return response.json()
-        else:
-            print("Error retrieving data. Status code:", response.status_code)
-            return None
+        return get_arcgis_features(base_url[geography_flag], query_string)
 
     def get_zipcode_geojson(query_string):
         """
         Returns:
-            dict: GeoJSON data as a Python dictionary, or None if the request fails.
+            GeoDataFrame or None: the ZIP code features, or None if the request fails.
         """
-        import requests
         # Esri Living Atlas US Zip Code Boundaries: https://www.arcgis.com/home/item.html?id=5f31109b46d541da86119bd4cf213848
         base_url = "https://services.arcgis.com/P3ePLMYs2RVChkJx/arcgis/rest/services/USA_Boundaries_2023/FeatureServer/3/query"
-        params = {
-            "where": f"{query_string}",  # Filter by state FIPS code
-            "outFields": "*",                  # Retrieve all available fields
-            #"geometryPrecision": "4",          # This parameter helps to retrieve less amount of data
-            "f": "geojson"                     # Return format as GeoJSON
-        }
-        # somehow, the timeout parameter is necessary 
-        response = requests.get(base_url, params=params, timeout=10)
-        if response.status_code == 200:
-            print("Success: retrieved the US Zip Code geojson!")
-            return response.json()
-        else:
-            print("Error retrieving data. Status code:", response.status_code)
-            return None
-
-    def retrieve(geojson_data):
-        result = geopandas.GeoDataFrame.from_features(geojson_data['features'])
-        # Set the CRS to EPSG:4326 (WGS 84) - a common standard for geographic coordinates
-        result = result.set_crs("EPSG:4326") # Add this line to set the CRS
-        return result
+        return get_arcgis_features(base_url, query_string)
 
     #print("region_type ==>", region_type)
     #print("states ==>", states)
@@ -185,18 +423,8 @@ def get_spatial_data(region_type, states, fips=None, region_filter=None):
 
     # Get the regions of interest (watersheds, zips, etc.) based on their intersection with the state(s)
     if (region_type == "Census Tract"):
-      # Get all census tracts for this state
-      # Which state is it? FIPS look up
-      f = fips[states[0]] #assuming just one state for the time being
-      #print(f) # Debugging
-      # Get tracts
-      import requests, zipfile, io
-      url = "https://www2.census.gov/geo/tiger/TIGER2010/TRACT/2010/tl_2010_"+f+"_tract10.zip"
-      r = requests.get(url)
-      z = zipfile.ZipFile(io.BytesIO(r.content))
-      z.extractall("/content")
-      regions_gdf = geopandas.read_file("/content/tl_2010_"+f+"_tract10.shp") # Mask for region_filter?
-      regions_gdf.columns = regions_gdf.columns.str.lower() #convert columns to lowercase for consistency
+      # Tracts are read from per-state files in the cache, filtered as they're read
+      regions_gdf = get_tract_boundaries(states, region_filter=region_filter)
 
     elif (region_type == "County"):
       query_string = "STATE IN " + states_tiger_str 
@@ -205,23 +433,17 @@ def get_spatial_data(region_type, states, fips=None, region_filter=None):
         query_string += " AND BASENAME IN " + region_filter
 
       #print("the query_string is:", query_string)
-      geojson_data = get_tiger_geojson(query_string, 1)
-      if geojson_data:
-          print("Creating a geopandas dataframe ...")
-          regions_gdf = retrieve(geojson_data)
+      regions_gdf = get_tiger_geojson(query_string, 1)
 
     elif (region_type == "Watershed"):
-      huc8_codes = get_huc8_by_states(states)
-      huc8_filter = spatial_selector(huc8_codes)
-      query_string = "huc8 IN " + huc8_filter 
-      if region_filter:
-        region_filter = spatial_selector(region_filter)
-        query_string = "huc8 IN " + region_filter
-      
-      geojson_data = get_watershed_geojson(query_string)
-      if geojson_data:
-          print("Creating a geopandas dataframe ...")
-          regions_gdf = retrieve(geojson_data)
+      # region_filter, if given, names the HUC8s; otherwise take those in the states
+      regions_gdf = get_watersheds(states, huc8_codes=region_filter)
+
+    elif (region_type in ("HUC10 Watersheds", "HUC12 Watersheds")):
+      level = 10 if region_type == "HUC10 Watersheds" else 12
+      regions_gdf = get_watersheds(states, level=level)
+      if region_filter and not regions_gdf.empty:
+        regions_gdf = regions_gdf[regions_gdf[f"huc{level}"].isin([str(r) for r in region_filter])]
 
     elif (region_type == "Zip Code"):
       query_string = "STATE IN " + states_str 
@@ -229,24 +451,33 @@ def get_spatial_data(region_type, states, fips=None, region_filter=None):
         region_filter = spatial_selector(region_filter)
         query_string += " AND ZIP_CODE IN " + region_filter
       print(query_string)
-      geojson_data = get_zipcode_geojson(query_string)
-      if geojson_data:
-          print("Creating a geopandas dataframe ...")
-          regions_gdf = retrieve(geojson_data)
+      regions_gdf = get_zipcode_geojson(query_string)
+
+    elif (region_type in ("Census Block Group", "Current Congressional District")):
+      url = BLOCK_GROUP_URL if region_type == "Census Block Group" else CURRENT_CD_URL
+      query_string = "STATE IN " + states_tiger_str
+      if region_filter:
+        query_string += " AND GEOID IN " + spatial_selector(region_filter)
+      regions_gdf = get_arcgis_features(url, query_string)
 
     else: 
       print("ERROR: No spatial data was retrieved!") # Debugging
       regions_gdf = geopandas.GeoDataFrame(crs="EPSG:4326") # creating an empty GeoDataFrame 
 
     # Get the intersecting geo (i.e. states)
-    if states == "":
+    if not state_boundaries:
+        states_gdf = None
+    elif states == "":
         states_gdf = geopandas.GeoDataFrame(crs="EPSG:4326") # creating an empty GeoDataFrame 
     else:
         query_string = "STUSAB IN " + states_str
-        geojson_data = get_tiger_geojson(query_string, 0)
-        print("Creating a geopandas dataframe ...")
-        states_gdf = retrieve(geojson_data) 
+        states_gdf = get_tiger_geojson(query_string, 0)
 
+    # A service that couldn't be reached leaves its GeoDataFrame empty
+    if regions_gdf is None:
+        regions_gdf = geopandas.GeoDataFrame(geometry=[], crs="EPSG:4326")
+    if state_boundaries and states_gdf is None:
+        states_gdf = geopandas.GeoDataFrame(geometry=[], crs="EPSG:4326")
     return regions_gdf, states_gdf
 
 # Read stored data from a file rather than go to the database.
@@ -294,6 +525,13 @@ def read_file( base, type, state, region ):
 
 
 
+def _add_facility_columns(pd_df, table_name):
+    # ECHO_EXPORTER facilities get their corrected county names and compliance
+    # history bitmasks; other tables are returned as they are
+    if table_name != 'ECHO_EXPORTER':
+        return pd_df
+    return add_history_bitmasks(add_county_canon(pd_df))
+
 def get_echo_data(sql, index_field=None, table_name=None, api=True, token=None):
     try:
         # Use the API if the api flag is set to True
@@ -337,7 +575,7 @@ def get_echo_data(sql, index_field=None, table_name=None, api=True, token=None):
         result_df = spark.sql(sql)
 
         # Convert spark dataframe to pandas dataframe
-        pd_df = result_df.toPandas()
+        pd_df = _add_facility_columns(result_df.toPandas(), table_name)
         
         if (index_field == "REGISTRY_ID"):
             # Set REGISTRY_ID as index
@@ -446,7 +684,7 @@ def get_echo_data_delta_api(sql, index_field=None, table_name=None, token=None,
         print(f"JSON decoding failed: {e}")
         return pd.DataFrame()
     
-    pd_df = pd.DataFrame(json_data)
+    pd_df = _add_facility_columns(pd.DataFrame(json_data), table_name)
      
     if (index_field == "REGISTRY_ID"):
         # Set REGISTRY_ID as index
@@ -459,6 +697,44 @@ def get_echo_data_delta_api(sql, index_field=None, table_name=None, token=None,
             pass
     return pd_df
 
+def get_last_modified(table_name, api=True, token=None, timeout=SCHEMA_TIMEOUT):
+    '''
+    When a database table was last updated, from its schema, e.g. to tell
+    whether a copy of it in the cache is out of date.
+
+    Parameters
+    ----------
+    table_name : str
+        The table, e.g. 'ECHO_EXPORTER'
+    api : bool
+        If True, use the API's schema. If False, use the schema file in SCHEMA_HOST_PATH
+    token : str
+        The authentication token for the api
+    timeout : int
+        Seconds to wait for the API's response
+
+    Returns
+    -------
+    str or None
+        e.g. 'Mon, 01 Jan 2024 00:00:00 ', or None if it isn't known
+    '''
+    try:
+        if api:
+            if token is None and os.path.exists('token.txt'):
+                with open('token.txt', 'r') as f:
+                    token = f.read().strip()
+            response = requests.get(f"{API_SERVER}/echo/schema/{table_name}",
+                                    headers={"Authorization": f"Bearer {token}"}, timeout=timeout)
+            response.raise_for_status()
+            schema = response.json()
+        else:
+            with open(os.path.join(SCHEMA_DIR or '', f"{table_name}_schema.json")) as f:
+                schema = json.load(f)
+    except (requests.exceptions.RequestException, OSError, ValueError) as e:
+        print(f"The last_modified date of {table_name} couldn't be read: {e}")
+        return None
+    return schema.get('last_modified')
+
 def get_echo_api_access_token():
     import time
     from IPython.display import display, HTML
@@ -0,0 +1,166 @@
+'''
+A local index between ECHO_EXPORTER REGISTRY_IDs and the program IDs
+(NPDES, RCRA, AIR and other IDs) in the EXP_PGM table, which is
+many-to-many: a facility can have several program IDs, and a program ID
+several facilities.
+
+build_program_index fetches REGISTRY_ID and PGM_ID from EXP_PGM once and
+stores them in the cache in two directions, each as a sorted array of keys,
+an array of offsets and the codes of the values for each key (so the
+values of key i are codes[offsets[i]:offsets[i + 1]]). Looking up the
+program IDs of many facilities, or the facilities of many program IDs, is
+then a binary search and a gather with numpy, without querying EXP_PGM.
+The index is rebuilt when EXP_PGM's last_modified date changes.
+'''
+
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from ECHO_modules.cache import cache_path, write_atomic
+from ECHO_modules.get_data import get_echo_data, get_last_modified
+
+
+def _index_file():
+    return cache_path('program_index', 'exp_pgm.npz')
+
+
+def _offsets(codes, n):
+    # Where each of the n keys' values start, for codes sorted by key
+    return np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=n))]).astype(np.int64)
+
+
+def build_program_index(last_modified=None, api=True, token=None):
+    '''
+    Store the REGISTRY_ID to PGM_ID pairs of EXP_PGM in the cache, unless
+    they have already been stored from the same last_modified date.
+
+    Parameters
+    ----------
+    last_modified : str
+        Optional - EXP_PGM's last_modified date. Looked up from its schema if
+        not given. If it isn't known, the index is rebuilt.
+    api : bool
+        If True, use the API to get the data. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Returns
+    -------
+    bool
+        True if the index was built, False if it was up to date or EXP_PGM
+        couldn't be read
+    '''
+    if last_modified is None:
+        last_modified = get_last_modified('EXP_PGM', api=api, token=token)
+    index = _load_index()
+    if index is not None and last_modified is not None and str(index['last_modified']) == last_modified:
+        return False
+    pairs = get_echo_data('select REGISTRY_ID, PGM_ID from EXP_PGM', table_name='EXP_PGM',
+                          api=api, token=token)
+    if pairs is None or pairs.empty:
+        print("EXP_PGM couldn't be read, so the program ID index wasn't built.")
+        return False
+    if 'REGISTRY_ID' not in pairs.columns:
+        pairs = pairs.reset_index()
+    registry_ids = pd.to_numeric(pairs['REGISTRY_ID'], errors='coerce')
+    keep = registry_ids.notna().to_numpy() & pairs['PGM_ID'].notna().to_numpy()
+    registry_codes, registry_keys = pd.factorize(registry_ids[keep].astype('int64'), sort=True)
+    program_codes, program_keys = pd.factorize(pairs['PGM_ID'][keep].astype(str).str.strip(), sort=True)
+    # Each pair once, ordered by REGISTRY_ID then PGM_ID
+    pairs = np.unique(np.stack([registry_codes, program_codes], axis=1), axis=0)
+    by_program = np.lexsort((pairs[:, 0], pairs[:, 1]))
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, last_modified=np.array('' if last_modified is None else last_modified),
+                     registry_ids=np.asarray(registry_keys, dtype=np.int64),
+                     registry_offsets=_offsets(pairs[:, 0], len(registry_keys)),
+                     registry_programs=pairs[:, 1].astype(np.int32),
+                     program_ids=np.asarray(program_keys, dtype=str),
+                     program_offsets=_offsets(pairs[by_program, 1], len(program_keys)),
+                     program_registries=pairs[by_program, 0].astype(np.int32))
+    write_atomic(_index_file(), write)
+    _load_index.cache_clear()
+    print(f"Stored {len(pairs)} program IDs of {len(registry_keys)} facilities.")
+    return True
+
+
+@lru_cache(maxsize=None)
+def _load_index():
+    path = _index_file()
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as index:
+        return {name: index[name] for name in index.files}
+
+
+def has_program_index():
+    '''
+    Whether build_program_index has stored the index in the cache.
+
+    Returns
+    -------
+    bool
+    '''
+    return _load_index() is not None
+
+
+def _gather(keys, offsets, codes, wanted):
+    # The positions in wanted of the keys found and the codes of their values
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=codes.dtype)
+    pos = np.searchsorted(keys, wanted).clip(0, len(keys) - 1)
+    found = np.flatnonzero(keys[pos] == wanted)
+    starts = offsets[pos[found]]
+    counts = offsets[pos[found] + 1] - starts
+    rows = np.repeat(found, counts)
+    # The offset of each value from the start of its key's values
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, codes[np.repeat(starts, counts) + within]
+
+
+def program_ids(registry_ids):
+    '''
+    The program IDs of the facilities.
+
+    Parameters
+    ----------
+    registry_ids : sequence
+        The REGISTRY_IDs
+
+    Returns
+    -------
+    DataFrame or None
+        REGISTRY_ID and PGM_ID, a row for each program ID of each facility
+        in the order of registry_ids, or None if the index hasn't been built
+    '''
+    index = _load_index()
+    if index is None:
+        return None
+    wanted = pd.to_numeric(pd.Series(registry_ids), errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+    rows, codes = _gather(index['registry_ids'], index['registry_offsets'], index['registry_programs'], wanted)
+    return pd.DataFrame({'REGISTRY_ID': wanted[rows], 'PGM_ID': index['program_ids'][codes].astype(object)})
+
+
+def registry_ids(pgm_ids):
+    '''
+    The facilities with the program IDs.
+
+    Parameters
+    ----------
+    pgm_ids : sequence
+        The program IDs, e.g. NPDES IDs
+
+    Returns
+    -------
+    DataFrame or None
+        PGM_ID and REGISTRY_ID, a row for each facility of each program ID
+        in the order of pgm_ids, or None if the index hasn't been built
+    '''
+    index = _load_index()
+    if index is None:
+        return None
+    wanted = pd.Series(pgm_ids).astype(str).str.strip().to_numpy(dtype=str)
+    rows, codes = _gather(index['program_ids'], index['program_offsets'], index['program_registries'], wanted)
+    return pd.DataFrame({'PGM_ID': wanted[rows].astype(object), 'REGISTRY_ID': index['registry_ids'][codes]})
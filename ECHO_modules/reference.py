@@ -0,0 +1,306 @@
+'''
+Reference tables that ship with ECHO_modules: the FAC_COUNTY names ECHO
+uses for each county, the congressional districts and HUC8 watersheds in
+each state, and state FIPS codes.
+
+The tables are stored as parquet files in ECHO_modules/data. Each one is
+read the first time it is needed and kept for the rest of the session, so
+nothing has to be downloaded and nothing is parsed at import.
+'''
+
+import json
+import os
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+# Table name: file in DATA_DIR
+REFERENCE_TABLES = {
+    'state_counties': 'state_counties.parquet', # FAC_STATE, FAC_COUNTY, County
+    'state_cd': 'state_cd.parquet', # FAC_STATE, FAC_DERIVED_CD113
+    'state_huc8': 'state_huc8.parquet', # FAC_STATE, huc8
+    'state_fips': 'state_fips.parquet', # FAC_STATE, fips
+}
+# Extra words ECHO has at the end of FAC_COUNTY names, in the order
+# correct_counties.py strips them
+COUNTY_SUFFIXES = [' COUNTY', ' BOROUGH', ' (CA)', '(CA)', ' (CITY)', ' CENSUS AREA',
+                   ' CITY AND BOROUGH', ' CITY AND', ' CITY', ' PARISH', ' COUNT',
+                   ' COUN', ' (B)', ' MUNICIPIO']
+# Each suffix is stripped at most once, in order, so a later one can only
+# come before an earlier one in the name
+COUNTY_SUFFIX_RE = ''.join(f'(?:{re.escape(x)})?' for x in reversed(COUNTY_SUFFIXES)) + '$'
+
+
+@lru_cache(maxsize=None)
+def load_table(name):
+    '''
+    Read one of the REFERENCE_TABLES. The same DataFrame is returned on
+    every call, so don't modify it.
+
+    Parameters
+    ----------
+    name : str
+        A key of REFERENCE_TABLES, e.g. 'state_counties'
+
+    Returns
+    -------
+    DataFrame
+    '''
+    return pd.read_parquet(os.path.join(DATA_DIR, REFERENCE_TABLES[name]))
+
+
+@lru_cache(maxsize=None)
+def _by_state(name):
+    # The rows of a table for each state
+    return {state: rows for state, rows in load_table(name).groupby('FAC_STATE', observed=True)}
+
+
+def _state_rows(name, state):
+    return _by_state(name).get(state, load_table(name).iloc[0:0])
+
+
+def state_counties(state):
+    '''
+    The (corrected) names of the counties in the state, e.g. for a widget.
+
+    Parameters
+    ----------
+    state : str
+        The state, e.g. 'TX'
+
+    Returns
+    -------
+    list
+    '''
+    return list(_state_rows('state_counties', state)['County'].unique())
+
+
+def county_variants(state, counties):
+    '''
+    All of the FAC_COUNTY names the ECHO data has for the counties, e.g.
+    "JEFFERSON" and "JEFFERSON COUNTY" for "JEFFERSON".
+
+    Parameters
+    ----------
+    state : str
+        The state, e.g. 'TX'. If None, the counties are matched in every state.
+    counties : list
+        Corrected county names
+
+    Returns
+    -------
+    list
+    '''
+    rows = load_table('state_counties') if state is None else _state_rows('state_counties', state)
+    return list(rows[rows['County'].isin(counties)]['FAC_COUNTY'].unique())
+
+
+def state_cds(state):
+    '''
+    The congressional districts (FAC_DERIVED_CD113) in the state.
+
+    Parameters
+    ----------
+    state : str
+        The state, e.g. 'NY'
+
+    Returns
+    -------
+    list
+    '''
+    return list(_state_rows('state_cd', state)['FAC_DERIVED_CD113'])
+
+
+@lru_cache(maxsize=None)
+def _corrected_counties():
+    # County for each (FAC_STATE, FAC_COUNTY) in the corrected table
+    table = load_table('state_counties').drop_duplicates(['FAC_STATE', 'FAC_COUNTY'])
+    return pd.Series(table['County'].to_numpy(),
+                     index=pd.MultiIndex.from_arrays([table['FAC_STATE'], table['FAC_COUNTY']]))
+
+
+def canonical_counties(fac_county, fac_state=None):
+    '''
+    The corrected county name for each FAC_COUNTY value, so that facilities
+    in "JEFFERSON", "JEFFERSON COUNTY" and "Jefferson County " can be
+    selected or grouped together. Names in the corrected county table are
+    looked up; others are trimmed, upper cased and have COUNTY_SUFFIXES
+    stripped. Each distinct name is only worked out once.
+
+    Parameters
+    ----------
+    fac_county : Series
+        FAC_COUNTY values
+    fac_state : Series
+        Optional - the FAC_STATE of each value, to look names up in the
+        corrected county table
+
+    Returns
+    -------
+    Categorical
+        Aligned with fac_county
+    '''
+    codes, names = pd.factorize(pd.Series(fac_county, copy=False))
+    if fac_state is not None:
+        # Distinct (state, name) pairs, from integer codes rather than strings
+        state_codes, state_names = pd.factorize(pd.Series(fac_state, copy=False))
+        # Missing values get the last code, None
+        state_names = np.append(np.asarray(state_names, dtype=object), None)
+        state_codes = np.where(state_codes < 0, len(state_names) - 1, state_codes)
+        names = np.append(np.asarray(names, dtype=object), None)
+        codes = np.where(codes < 0, len(names) - 1, codes)
+        codes, pairs = pd.factorize(state_codes * len(names) + codes)
+        uniques = pd.MultiIndex.from_arrays([state_names[pairs // len(names)], names[pairs % len(names)]])
+        names = names[pairs % len(names)]
+    names = pa.array(pd.Series(names, dtype=object), type=pa.string(), from_pandas=True)
+    names = pc.utf8_upper(pc.utf8_trim_whitespace(names))
+    canon = pc.replace_substring_regex(names, COUNTY_SUFFIX_RE, '', max_replacements=1)
+    canon = pd.Series(canon.to_pandas(), dtype=object)
+    if fac_state is not None:
+        corrected = _corrected_counties().reindex(uniques).to_numpy()
+        known = pd.notna(corrected)
+        canon[known] = corrected[known]
+    # Map the codes of the distinct names to the codes of their corrected names
+    canon_codes, categories = pd.factorize(canon)
+    codes = np.where(codes >= 0, canon_codes[codes], -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def county_canon(df):
+    '''
+    The corrected county name of each of df's records: its FAC_COUNTY_CANON
+    column if it has one, and worked out from FAC_COUNTY if not.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Records with FAC_COUNTY, and FAC_STATE if they have it
+
+    Returns
+    -------
+    Series
+        Categorical FAC_COUNTY_CANON, aligned with df
+    '''
+    if 'FAC_COUNTY_CANON' in df.columns:
+        return df['FAC_COUNTY_CANON']
+    return pd.Series(canonical_counties(df['FAC_COUNTY'], df.get('FAC_STATE')), index=df.index,
+                     name='FAC_COUNTY_CANON')
+
+
+def add_county_canon(df):
+    '''
+    Add a FAC_COUNTY_CANON column of corrected county names (see
+    canonical_counties) to data with a FAC_COUNTY column.
+
+    Parameters
+    ----------
+    df : DataFrame
+
+    Returns
+    -------
+    DataFrame
+        df, with FAC_COUNTY_CANON if it has FAC_COUNTY
+    '''
+    if df is not None and 'FAC_COUNTY' in df.columns:
+        df['FAC_COUNTY_CANON'] = canonical_counties(df['FAC_COUNTY'], df.get('FAC_STATE'))
+    return df
+
+
+@lru_cache(maxsize=None)
+def huc8_map():
+    '''
+    State abbreviation: list of the HUC8 watersheds in the state.
+    '''
+    return {state: list(rows['huc8']) for state, rows in _by_state('state_huc8').items()}
+
+
+def state_huc8s(states):
+    '''
+    The HUC8 watersheds in any of the states.
+
+    Parameters
+    ----------
+    states : list
+        State abbreviations e.g. ["NY", "NJ"]
+
+    Returns
+    -------
+    list
+        Sorted, unique HUC8 codes
+    '''
+    if isinstance(states, str):
+        states = [states]
+    table = load_table('state_huc8')
+    return sorted(table[table['FAC_STATE'].isin(states)]['huc8'].unique())
+
+
+@lru_cache(maxsize=None)
+def _huc8_states():
+    return load_table('state_huc8').groupby('huc8')['FAC_STATE'].agg(tuple)
+
+
+def huc8_states(huc8):
+    '''
+    The states a HUC8 watershed is in.
+
+    Parameters
+    ----------
+    huc8 : str
+        The HUC8 code
+
+    Returns
+    -------
+    tuple
+    '''
+    return _huc8_states().get(str(huc8).zfill(8), ())
+
+
+@lru_cache(maxsize=None)
+def fips_map():
+    '''
+    State abbreviation: two digit state FIPS code.
+    '''
+    table = load_table('state_fips')
+    return dict(zip(table['FAC_STATE'], table['fips']))
+
+
+def build_reference_tables(source_dir, data_dir=DATA_DIR):
+    '''
+    Convert the CSV and JSON files in the repository's data directory into
+    the parquet files shipped in ECHO_modules/data. Run this after any of
+    them is updated.
+
+    Parameters
+    ----------
+    source_dir : str
+        The directory with state_counties_corrected.csv, state_cd.csv,
+        state_huc8_map.json and state_postal_code_to_fips.json
+    data_dir : str
+        Where to write the parquet files
+    '''
+    counties = pd.read_csv(os.path.join(source_dir, 'state_counties_corrected.csv'),
+                           usecols=['FAC_STATE', 'FAC_COUNTY', 'County'], dtype=str)
+    cds = pd.read_csv(os.path.join(source_dir, 'state_cd.csv'), dtype={'FAC_STATE': str})
+    with open(os.path.join(source_dir, 'state_huc8_map.json')) as f:
+        huc8 = json.load(f)
+    huc8 = pd.DataFrame([(state, code) for state, codes in huc8.items() for code in codes],
+                        columns=['FAC_STATE', 'huc8'])
+    with open(os.path.join(source_dir, 'state_postal_code_to_fips.json')) as f:
+        fips = json.load(f)
+    fips = pd.DataFrame({'FAC_STATE': list(fips), 'fips': [str(v).zfill(2) for v in fips.values()]})
+    fips = fips.sort_values('FAC_STATE', ignore_index=True)
+
+    tables = {'state_counties': counties, 'state_cd': cds, 'state_huc8': huc8, 'state_fips': fips}
+    os.makedirs(data_dir, exist_ok=True)
+    for name, table in tables.items():
+        table.to_parquet(os.path.join(data_dir, REFERENCE_TABLES[name]), index=False, compression='zstd')
+    load_table.cache_clear()
+    _by_state.cache_clear()
+    huc8_map.cache_clear()
+    _huc8_states.cache_clear()
+    _corrected_counties.cache_clear()
+    fips_map.cache_clear()
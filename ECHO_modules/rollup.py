@@ -0,0 +1,263 @@
+'''
+A rollup of each program's records into counts and sums by year, for every
+facility and for the counties, congressional districts, ZIP codes, HUC8
+watersheds and states they are in.
+
+update_rollup reduces a DataSet's records to one row per facility and
+year, with the facility's region fields, and merges them into the
+program's rollup in the cache, replacing the rows of the facilities it
+has new records for. The region levels are then summed from the facility
+rows, which are few compared with the records, and stored with them in one
+parquet file. A chart or choropleth of any region reads these rows rather
+than the records. A region's totals are those of the facilities whose
+records have been added, so add the records of the whole region (e.g. the
+state) for complete totals.
+'''
+
+import os
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from ECHO_modules.aggregation import program_metric, record_dates, record_ids
+from ECHO_modules.cache import cache_path, write_atomic
+from ECHO_modules.reference import county_canon
+
+# Level: the field of the facilities' region at that level
+ROLLUP_LEVELS = {
+    'Facility': None,
+    'County': 'FAC_COUNTY_CANON',
+    'Congressional District': 'FAC_DERIVED_CD113',
+    'Zip Code': 'FAC_ZIP',
+    'Watershed': 'FAC_DERIVED_HUC',
+    'State': 'FAC_STATE',
+}
+REGION_FIELDS = [f for f in ROLLUP_LEVELS.values() if f is not None]
+ROLLUP_COLUMNS = ['level', 'FAC_STATE', 'region', 'year', 'count', 'sum', 'facilities']
+
+
+def _rollup_file(program):
+    return cache_path('rollup', re.sub(r'[^a-z0-9]+', '_', program.lower()) + '.parquet')
+
+
+def _region_values(records, field):
+    # The facilities' region field, as strings so regions of every level fit one column
+    if field == 'FAC_COUNTY_CANON' and 'FAC_COUNTY' in records.columns:
+        return county_canon(records).astype('string')
+    if field not in records.columns:
+        return pd.Series(None, index=records.index, dtype='string')
+    values = records[field]
+    if field == 'FAC_DERIVED_CD113':
+        values = pd.to_numeric(values, errors='coerce').astype('Int64')
+    elif field == 'FAC_ZIP':
+        values = values.astype('string').str[0:5]
+    elif field == 'FAC_DERIVED_HUC':
+        values = pd.to_numeric(values, errors='coerce').astype('Int64').astype('string').str.zfill(8)
+    return values.astype('string')
+
+
+def facility_years(df, dataset):
+    '''
+    Reduce a DataSet's records to one row per facility and year, with the
+    count of records and the sum of what the program measures (see
+    aggregation.program_metric) and the facility's region fields.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The DataSet's records, which are not changed
+    dataset : DataSet
+
+    Returns
+    -------
+    DataFrame
+        region (the facility ID), year, count, sum and the REGION_FIELDS
+    '''
+    metric = program_metric(df, dataset, all_years=True)
+    records = df[metric['rows']]
+    dates = record_dates(records[dataset.date_field], dataset.date_format)
+    dated = ~np.isnat(dates)
+    records = records[dated]
+    years = dates[dated].astype('datetime64[Y]').astype(np.int64) + 1970
+    values = None if metric['values'] is None else np.nan_to_num(
+        np.asarray(metric['values'], dtype=float)[metric['rows']][dated])
+
+    codes, ids = pd.factorize(record_ids(records, dataset.idx_field))
+    year_codes, year_values = pd.factorize(years, sort=True)
+    keep = codes >= 0
+    # One cell for each facility and year
+    cells, first, inverse = np.unique(codes[keep] * len(year_values) + year_codes[keep],
+                                      return_index=True, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(cells))
+    sums = counts.astype(float) if values is None else np.bincount(inverse, weights=values[keep],
+                                                                    minlength=len(cells))
+    rows = np.flatnonzero(keep)[first]
+    result = pd.DataFrame({'region': pd.Series(np.asarray(ids, dtype=object)[cells // len(year_values)],
+                                               dtype='string'),
+                           'year': year_values[cells % len(year_values)].astype(np.int16),
+                           'count': counts.astype(np.int64), 'sum': sums})
+    for field in REGION_FIELDS:
+        result[field] = _region_values(records, field).to_numpy()[rows]
+    # A facility's regions are those of its first record, so its rows agree
+    first_rows = result.groupby('region', sort=False)[REGION_FIELDS].transform('first')
+    result[REGION_FIELDS] = first_rows
+    return result
+
+
+def _roll_up(facilities):
+    # Sum the facility rows into every level
+    levels = [facilities.assign(level='Facility', facilities=1)]
+    for level, field in ROLLUP_LEVELS.items():
+        if field is None:
+            continue
+        keys = ['FAC_STATE', field, 'year'] if field != 'FAC_STATE' else ['FAC_STATE', 'year']
+        rolled = facilities.groupby(keys, observed=True, dropna=True).agg(
+            count=('count', 'sum'), sum=('sum', 'sum'), facilities=('region', 'size')).reset_index()
+        rolled['region'] = rolled[field]
+        levels.append(rolled.assign(level=level)[ROLLUP_COLUMNS])
+    cube = pd.concat(levels, ignore_index=True)
+    cube['level'] = pd.Categorical(cube['level'], categories=list(ROLLUP_LEVELS))
+    cube['FAC_STATE'] = cube['FAC_STATE'].astype('string').astype('category')
+    return cube[ROLLUP_COLUMNS + [f for f in REGION_FIELDS if f != 'FAC_STATE']]
+
+
+def update_rollup(records, dataset=None):
+    '''
+    Add a DataSet's records to its program's rollup in the cache. The rows
+    of the facilities in records replace any they had before.
+
+    Parameters
+    ----------
+    records : DataSetResults or DataFrame
+        The records, e.g. from DataSet.store_results
+    dataset : DataSet
+        The records' DataSet, if records is a DataFrame
+
+    Returns
+    -------
+    DataFrame
+        The program's rollup
+    '''
+    if dataset is None:
+        dataset = records.dataset
+        records = records.dataframe
+    if records is None or records.empty:
+        return load_rollup(dataset.name)
+    added = facility_years(records, dataset)
+    cube = load_rollup(dataset.name)
+    if cube is not None:
+        kept = cube[(cube['level'] == 'Facility') & ~cube['region'].isin(added['region'].unique())]
+        added = pd.concat([kept.drop(columns=['level', 'facilities']), added], ignore_index=True)
+    cube = _roll_up(added.astype({'FAC_STATE': 'string'}))
+    write_atomic(_rollup_file(dataset.name), lambda tmp_path: cube.to_parquet(tmp_path, index=False))
+    _read_rollup.cache_clear()
+    return cube
+
+
+@lru_cache(maxsize=None)
+def _read_rollup(path):
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def load_rollup(program, level=None, state=None, regions=None):
+    '''
+    Read a program's rollup. The file is read once, so don't modify the
+    DataFrame returned without filters.
+
+    Parameters
+    ----------
+    program : str
+        The DataSet name, e.g. 'CWA Inspections'
+    level : str
+        Optional - one of ROLLUP_LEVELS, e.g. 'County'
+    state : str
+        Optional - only the rows of this state
+    regions : list
+        Optional - only the rows of these regions, e.g. county names,
+        districts, ZIP codes, HUC8s or facility IDs
+
+    Returns
+    -------
+    DataFrame or None
+        level, FAC_STATE, region, year, count, sum and facilities, or None
+        if no records of the program have been added
+    '''
+    cube = _read_rollup(_rollup_file(program))
+    if cube is None:
+        return None
+    keep = np.ones(len(cube), dtype=bool)
+    if level is not None:
+        keep &= (cube['level'] == level).to_numpy()
+    if state is not None:
+        keep &= (cube['FAC_STATE'] == state).to_numpy(dtype=bool, na_value=False)
+    if regions is not None:
+        if isinstance(regions, (str, int)):
+            regions = [regions]
+        keep &= cube['region'].isin([str(r) for r in regions]).to_numpy(dtype=bool, na_value=False)
+    return cube if keep.all() else cube[keep]
+
+
+def yearly_totals(program, level='State', state=None, regions=None, first_year=2001):
+    '''
+    A program's count of records and sum for each year, over the regions,
+    e.g. for a chart.
+
+    Parameters
+    ----------
+    program : str
+        The DataSet name, e.g. 'CWA Inspections'
+    level : str
+        One of ROLLUP_LEVELS
+    state : str
+        Optional - the state of the regions
+    regions : list
+        Optional - the regions. Defaults to all of them at the level.
+    first_year : int
+        The first year to include
+
+    Returns
+    -------
+    DataFrame or None
+        count, sum and facilities, indexed by year
+    '''
+    rows = load_rollup(program, level, state, regions)
+    if rows is None:
+        return None
+    rows = rows[rows['year'] >= first_year]
+    return rows.groupby('year')[['count', 'sum', 'facilities']].sum()
+
+
+def region_totals(program, level, state=None, years=None):
+    '''
+    A program's count of records and sum for each region at a level, e.g.
+    for a choropleth.
+
+    Parameters
+    ----------
+    program : str
+        The DataSet name, e.g. 'CWA Inspections'
+    level : str
+        One of ROLLUP_LEVELS
+    state : str
+        Optional - only this state's regions
+    years : list
+        Optional - a two-element list of the year range
+
+    Returns
+    -------
+    DataFrame or None
+        count, sum and facilities, indexed by FAC_STATE and region
+    '''
+    rows = load_rollup(program, 'Facility', state)
+    if rows is None:
+        return None
+    if years is not None:
+        rows = rows[(rows['year'] >= years[0]) & (rows['year'] <= years[1])]
+    # Summed from the facility rows, so each facility is counted once
+    keys = ['FAC_STATE', 'region' if level == 'Facility' else ROLLUP_LEVELS[level]]
+    totals = rows.groupby(keys, observed=True).agg(count=('count', 'sum'), sum=('sum', 'sum'),
+                                                  facilities=('region', 'nunique'))
+    totals.index.names = ['FAC_STATE', 'region']
+    return totals
@@ -5,6 +5,7 @@ from folium.plugins import FastMarkerCluster
 from itertools import islice
 from ipywidgets import widgets, Layout
 from ECHO_modules.get_data import get_echo_data
+from ECHO_modules.dimension import DIMENSION_FIELDS, lookup_facilities
 from ECHO_modules.utilities import check_bounds, marker_text
 from IPython.display import display
 import time
@@ -185,6 +186,25 @@ def get_rsei_facilities(state, region_type, regions_selected, rsei_type, columns
 
     return df_active
 
+def _local_echo_exporter(this_name, that_series, this_key, this_columns, years, filter, limit):
+    '''
+    helper function for `get_this_by_that`
+    The ECHO_EXPORTER facilities with the REGISTRY_IDs from the local facility
+    dimension, if it has all of them and the columns asked for.
+    '''
+    if this_name != 'ECHO_EXPORTER' or this_key != 'REGISTRY_ID' or that_series is None \
+            or this_columns == '*' or years is not None or filter is not None or limit is not None:
+        return None
+    columns = [c.strip() for c in this_columns.split(',')]
+    if not all(c in DIMENSION_FIELDS for c in columns):
+        return None
+    registry_ids = pd.unique(that_series.astype(int))
+    df = lookup_facilities(registry_ids, [c for c in columns if c != 'REGISTRY_ID'])
+    if df is None or len(df) < len(registry_ids):
+        return None
+    return df.reset_index()[columns]
+
+
 def get_this_by_that(this_name, that_series, this_key, int_flag=True, this_columns='*', 
                      years=None, year_field=None, filter=None, limit=None, token=None):
     ids_per_request = 250
@@ -225,6 +245,10 @@ def get_this_by_that(this_name, that_series, this_key, int_flag=True, this_colum
         The 'this' records returned from the database query
     '''
 
+    local = _local_echo_exporter(this_name, that_series, this_key, this_columns, years, filter, limit)
+    if local is not None:
+        return local
+
     table = this_name
     if table != 'ECHO_EXPORTER':
         table = f"{table}_data_rsei_v2312"
@@ -0,0 +1,634 @@
+'''
+Build Mapbox Vector Tiles of ECHO facilities and region boundaries, so
+dashboards can draw them from a tile source instead of embedding GeoJSON
+in every map.
+
+The tiles are kept in one MBTiles (sqlite) file. Each layer is stored
+with the last_modified date of the data it was built from, and a rebuild
+only re-encodes the layers whose data has changed. serve_tiles serves the
+file over http for mapper and choropleth (see their tile_url parameter).
+'''
+
+import gzip
+import hashlib
+import json
+import math
+import sqlite3
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import shapely
+from ECHO_modules.geometry import MERCATOR_RADIUS, _simplify_coverage, _to_mercator
+
+# Tile coordinates run from 0 to TILE_EXTENT across a tile
+TILE_EXTENT = 4096
+# Geometries are clipped this far (in tile coordinates) outside each tile,
+# so lines and polygon edges don't show at tile boundaries
+TILE_BUFFER = 64
+MAX_ZOOM = 18
+# The fields of the facilities layer build_echo_tiles builds
+FACILITY_FIELDS = ['REGISTRY_ID', 'FAC_NAME', 'FAC_STATE', 'FAC_LAT', 'FAC_LONG', 'DFR_URL']
+WORLD_SIZE = 2 * math.pi * MERCATOR_RADIUS
+_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,
+                                      tile_data BLOB, PRIMARY KEY (zoom_level, tile_column, tile_row));
+    CREATE TABLE IF NOT EXISTS layer_tiles (layer TEXT, zoom_level INTEGER, tile_column INTEGER,
+                                            tile_row INTEGER, tile_data BLOB,
+                                            PRIMARY KEY (layer, zoom_level, tile_column, tile_row));
+    CREATE TABLE IF NOT EXISTS layers (layer TEXT PRIMARY KEY, last_modified TEXT, minzoom INTEGER,
+                                       maxzoom INTEGER, fields TEXT, bounds TEXT);
+'''
+
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _key(number, wire_type):
+    return _varint(number << 3 | wire_type)
+
+
+def _message(number, payload):
+    # A length delimited protobuf field
+    return _key(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number, ints):
+    return _message(number, b''.join(_varint(int(i)) for i in ints))
+
+
+def _zigzag(a):
+    a = np.asarray(a, dtype=np.int64)
+    return (a << 1) ^ (a >> 63)
+
+
+def _value(v):
+    # A vector tile Value message
+    if isinstance(v, (bool, np.bool_)):
+        return _key(7, 0) + _varint(int(v))
+    if isinstance(v, (int, np.integer)):
+        return _key(6, 0) + _varint(int(_zigzag(int(v))))
+    if isinstance(v, (float, np.floating)):
+        return _key(3, 1) + struct.pack('<d', float(v))
+    return _message(1, str(v).encode())
+
+
+def _command(command, count):
+    return command | (count << 3)
+
+
+def _moves(points, cursor):
+    # Zigzagged deltas from the cursor through the points, interleaved x, y
+    deltas = np.diff(np.vstack([cursor, points]), axis=0)
+    return _zigzag(deltas).ravel().tolist(), points[-1]
+
+
+def _drop_repeats(points):
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    return points[keep]
+
+
+def _ring_area(points):
+    x, y = points[:, 0], points[:, 1]
+    return (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def _encode_geometry(geom, origin, scale):
+    '''
+    helper function for `_encode_layer`
+    The vector tile type and commands for a geometry (in Web Mercator),
+    in the coordinates of the tile whose top left corner is origin. Returns
+    None if nothing is left once the coordinates are rounded.
+    '''
+    cursor = np.zeros(2, dtype=np.int64)
+    commands = []
+    parts = shapely.get_parts(geom)
+    kind = shapely.get_type_id(parts[0]) if len(parts) else -1
+
+    def tile_coords(coords):
+        points = np.empty((len(coords), 2), dtype=np.int64)
+        points[:, 0] = np.round((coords[:, 0] - origin[0]) * scale)
+        points[:, 1] = np.round((origin[1] - coords[:, 1]) * scale)
+        return points
+
+    if kind == 0: # Points
+        points = tile_coords(shapely.get_coordinates(parts))
+        moves, cursor = _moves(points, cursor)
+        return 1, [_command(1, len(points))] + moves
+    if kind == 1: # LineStrings
+        for part in parts:
+            points = _drop_repeats(tile_coords(shapely.get_coordinates(part)))
+            if len(points) < 2:
+                continue
+            moves, cursor = _moves(points, cursor)
+            commands += [_command(1, 1)] + moves[:2] + [_command(2, len(points) - 1)] + moves[2:]
+        return (2, commands) if commands else None
+    if kind == 3: # Polygons
+        for part in parts:
+            rings = [part.exterior] + list(part.interiors)
+            for i, ring in enumerate(rings):
+                points = _drop_repeats(tile_coords(shapely.get_coordinates(ring)))[:-1]
+                area = _ring_area(points) if len(points) >= 3 else 0
+                if area == 0:
+                    if i == 0:
+                        break # The polygon has collapsed, so skip its holes too
+                    continue
+                # Outer rings are clockwise on screen (positive area with y
+                # down) and holes anticlockwise
+                if (area > 0) != (i == 0):
+                    points = points[::-1]
+                moves, cursor = _moves(points, cursor)
+                commands += ([_command(1, 1)] + moves[:2] + [_command(2, len(points) - 1)]
+                             + moves[2:] + [_command(7, 1)])
+        return (3, commands) if commands else None
+    return None
+
+
+def _varint_lengths(a):
+    a = np.asarray(a, dtype=np.uint64)
+    return 1 + sum((a >= np.uint64(1 << (7 * i))).astype(np.int64) for i in range(1, 10))
+
+
+def _varints(tokens, mask):
+    '''
+    helper function for `_encode_points`
+    The varints of the tokens where mask is True, in row order, as bytes.
+    '''
+    flat = np.asarray(tokens, dtype=np.uint64)[mask]
+    lengths = _varint_lengths(flat)
+    place = np.arange(lengths.max() if len(lengths) else 1)
+    groups = (flat[:, None] >> (np.uint64(7) * place.astype(np.uint64))[None, :]) & np.uint64(0x7f)
+    groups |= np.where(place[None, :] < (lengths - 1)[:, None], np.uint64(0x80), np.uint64(0))
+    return groups[place[None, :] < lengths[:, None]].astype(np.uint8).tobytes()
+
+
+def _encode_points(points, ids, tags):
+    '''
+    helper function for `_encode_layer`
+    The Feature fields for single points, built with numpy rather than one
+    feature at a time since facility layers have so many.
+    '''
+    n = len(points)
+    zigzags = _zigzag(points).astype(np.uint64)
+    tag_tokens = np.empty((n, 2 * tags.shape[1]), dtype=np.int64)
+    tag_tokens[:, 0::2] = np.arange(tags.shape[1])[None, :]
+    tag_tokens[:, 1::2] = tags
+    tag_mask = np.repeat(tags >= 0, 2, axis=1)
+    tag_length = np.where(tag_mask, _varint_lengths(tag_tokens.clip(0)), 0).sum(axis=1)
+    geometry_length = 1 + _varint_lengths(zigzags).sum(axis=1)
+    columns = []
+    if ids is not None:
+        columns += [np.full(n, 0x08), ids]
+    columns += [np.full(n, 0x12), tag_length]
+    head = np.column_stack(columns).astype(np.uint64)
+    tail = np.column_stack([np.full(n, 0x18), np.ones(n), np.full(n, 0x22), geometry_length,
+                            np.full(n, _command(1, 1)), zigzags]).astype(np.uint64)
+    feature_length = (_varint_lengths(head).sum(axis=1) + tag_length
+                      + _varint_lengths(tail).sum(axis=1))
+    tokens = np.column_stack([np.full(n, 0x12), feature_length, head,
+                              tag_tokens.clip(0).astype(np.uint64), tail]).astype(np.uint64)
+    mask = np.column_stack([np.ones((n, 2 + head.shape[1]), dtype=bool), tag_mask,
+                            np.ones(tail.shape, dtype=bool)])
+    return _varints(tokens, mask)
+
+
+def _encode_layer(name, geoms, origin, scale, ids, columns, codes, values_encoded):
+    '''
+    helper function for `_tile_layer`
+    A vector tile Layer, wrapped as a Tile's layers field so the layers of
+    a tile can be joined by concatenating them.
+    '''
+    # The keys are the columns, and the values those the features use
+    values, tags = [], []
+    for k, column in enumerate(columns):
+        used, local = np.unique(codes[k], return_inverse=True)
+        local = local + len(values) - (1 if len(used) and used[0] < 0 else 0)
+        values += values_encoded[k][used[used >= 0]].tolist()
+        tags.append(np.where(codes[k] >= 0, local, -1))
+    tags = np.array(tags, dtype=np.int64).T if columns else np.empty((len(geoms), 0), dtype=np.int64)
+
+    if (shapely.get_type_id(geoms) == 0).all():
+        coords = shapely.get_coordinates(geoms)
+        points = np.empty((len(coords), 2), dtype=np.int64)
+        points[:, 0] = np.round((coords[:, 0] - origin[0]) * scale)
+        points[:, 1] = np.round((origin[1] - coords[:, 1]) * scale)
+        features = [_encode_points(points, ids, tags)]
+    else:
+        features = []
+        for f, geom in enumerate(geoms):
+            encoded = _encode_geometry(geom, origin, scale)
+            if encoded is None:
+                continue
+            kind, commands = encoded
+            feature = b'' if ids is None else _key(1, 0) + _varint(int(ids[f]))
+            keys = np.flatnonzero(tags[f] >= 0)
+            if len(keys):
+                feature += _packed(2, np.column_stack([keys, tags[f][keys]]).ravel())
+            feature += _key(3, 0) + _varint(kind) + _packed(4, commands)
+            features.append(_message(2, feature))
+    if not features:
+        return None
+    layer = (_key(15, 0) + _varint(2) + _message(1, name.encode()) + b''.join(features)
+             + b''.join(_message(3, c.encode()) for c in columns)
+             + b''.join(values)
+             + _key(5, 0) + _varint(TILE_EXTENT))
+    return _message(3, layer)
+
+
+def _tile_layer(name, frame, min_zoom, max_zoom, lat_field='FAC_LAT', long_field='FAC_LONG'):
+    '''
+    helper function for `build_tiles`
+    Yield (zoom, x, y, encoded layer) for each tile the layer has features in.
+    '''
+    if 'geometry' in frame.columns and frame.geometry.notna().any():
+        frame = frame[frame.geometry.notna() & ~frame.geometry.is_empty]
+        if frame.crs is not None and not frame.crs.equals('EPSG:4326'):
+            frame = frame.to_crs(4326)
+        geoms = shapely.transform(frame.geometry.values,
+                                  lambda c: np.column_stack(_to_mercator(c[:, 1], c[:, 0])))
+        columns = [c for c in frame.columns if c != frame.geometry.name]
+    else:
+        lats = pd.to_numeric(frame[lat_field], errors='coerce').to_numpy(dtype=float)
+        longs = pd.to_numeric(frame[long_field], errors='coerce').to_numpy(dtype=float)
+        located = ~(np.isnan(lats) | np.isnan(longs))
+        frame = frame[located]
+        geoms = shapely.points(np.column_stack(_to_mercator(lats[located], longs[located])))
+        columns = [c for c in frame.columns if c not in ('geometry', lat_field, long_field)]
+    if len(frame) == 0:
+        return
+
+    ids = None
+    if pd.api.types.is_integer_dtype(frame.index) and len(frame) and frame.index.min() >= 0:
+        ids = frame.index.to_numpy()
+    # Each column's values are factorized and encoded once for the whole layer
+    codes, values_encoded = [], []
+    for column in columns:
+        c, u = pd.factorize(frame[column])
+        codes.append(c)
+        encoded = np.empty(len(u), dtype=object)
+        encoded[:] = [_message(4, _value(v.item() if isinstance(v, np.generic) else v))
+                      for v in np.asarray(u, dtype=object)]
+        values_encoded.append(encoded)
+    codes = np.array(codes).reshape(len(columns), len(frame))
+    points_only = bool((shapely.get_type_id(geoms) == 0).all())
+    polygonal = bool(np.isin(shapely.get_type_id(geoms), [3, 6]).all())
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        n = 2 ** zoom
+        size = WORLD_SIZE / n
+        scale = TILE_EXTENT / size
+        if points_only:
+            # Points are in the one tile they fall in. Below max_zoom, only
+            # the first of the points at the same spot in a tile is kept.
+            coords = shapely.get_coordinates(geoms)
+            px = (coords[:, 0] + WORLD_SIZE / 2) / size
+            py = (WORLD_SIZE / 2 - coords[:, 1]) / size
+            tx = np.floor(px).astype(np.int64).clip(0, n - 1)
+            ty = np.floor(py).astype(np.int64).clip(0, n - 1)
+            tile = tx * n + ty
+            if zoom < max_zoom:
+                spot = (tile * (TILE_EXTENT + 1) + np.round((px - tx) * TILE_EXTENT).astype(np.int64)) \
+                    * (TILE_EXTENT + 1) + np.round((py - ty) * TILE_EXTENT).astype(np.int64)
+                _, keep = np.unique(spot, return_index=True)
+            else:
+                keep = np.arange(len(tile))
+            keep = keep[np.argsort(tile[keep], kind='stable')]
+            feature_idx, tile = keep, tile[keep]
+            zoom_geoms = geoms
+        else:
+            # Simplify to about a tile coordinate, then clip to each tile the
+            # geometry's bounds overlap
+            tolerance = size / TILE_EXTENT
+            zoom_geoms = (_simplify_coverage(geoms, tolerance) if polygonal
+                          else shapely.simplify(geoms, tolerance))
+            bounds = shapely.bounds(zoom_geoms)
+            pad = TILE_BUFFER / scale
+            x0 = np.floor((bounds[:, 0] - pad + WORLD_SIZE / 2) / size).astype(np.int64).clip(0, n - 1)
+            x1 = np.floor((bounds[:, 2] + pad + WORLD_SIZE / 2) / size).astype(np.int64).clip(0, n - 1)
+            y0 = np.floor((WORLD_SIZE / 2 - bounds[:, 3] - pad) / size).astype(np.int64).clip(0, n - 1)
+            y1 = np.floor((WORLD_SIZE / 2 - bounds[:, 1] + pad) / size).astype(np.int64).clip(0, n - 1)
+            width, height = x1 - x0 + 1, y1 - y0 + 1
+            counts = width * height
+            feature_idx = np.repeat(np.arange(len(zoom_geoms)), counts)
+            offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            tile = ((x0[feature_idx] + offset // height[feature_idx]) * n
+                    + y0[feature_idx] + offset % height[feature_idx])
+            order = np.argsort(tile, kind='stable')
+            feature_idx, tile = feature_idx[order], tile[order]
+
+        starts = np.flatnonzero(np.r_[True, tile[1:] != tile[:-1]]) if len(tile) else []
+        for start, end in zip(starts, list(starts[1:]) + [len(tile)]):
+            x, y = divmod(int(tile[start]), n)
+            idx = feature_idx[start:end]
+            origin = (x * size - WORLD_SIZE / 2, WORLD_SIZE / 2 - y * size)
+            tile_geoms = zoom_geoms[idx]
+            if not points_only:
+                pad = TILE_BUFFER / scale
+                tile_geoms = shapely.clip_by_rect(tile_geoms, origin[0] - pad, origin[1] - size - pad,
+                                                  origin[0] + size + pad, origin[1] + pad)
+                kept = ~shapely.is_empty(tile_geoms)
+                idx, tile_geoms = idx[kept], tile_geoms[kept]
+                if not len(idx):
+                    continue
+            encoded = _encode_layer(name, tile_geoms, origin, scale, None if ids is None else ids[idx],
+                                    columns, codes[:, idx], values_encoded)
+            if encoded is not None:
+                yield zoom, x, y, encoded
+
+
+def _fingerprint(frame):
+    # Stands in for last_modified when none is given
+    digest = hashlib.sha1()
+    attributes = frame.drop(columns='geometry', errors='ignore')
+    digest.update(pd.util.hash_pandas_object(attributes, index=True).to_numpy().tobytes())
+    digest.update(','.join(map(str, attributes.columns)).encode())
+    if 'geometry' in frame.columns:
+        digest.update(b''.join(shapely.to_wkb(frame.geometry.values[frame.geometry.notna()])))
+    return digest.hexdigest()
+
+
+def _field_type(series):
+    if pd.api.types.is_bool_dtype(series):
+        return 'Boolean'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'Number'
+    return 'String'
+
+
+def build_tiles(path, layers, min_zoom=0, max_zoom=12, last_modified=None,
+                lat_field='FAC_LAT', long_field='FAC_LONG'):
+    '''
+    Write vector tiles of the layers for a range of zooms to an MBTiles
+    file. Layers already in the file whose last_modified (and zooms) match
+    are left as they are; the others are rebuilt, and layers not passed in
+    are kept.
+
+    Parameters
+    ----------
+    path : str
+        The .mbtiles file, created if needed
+    layers : dict
+        Layer name: GeoDataFrame of boundaries, or DataFrame of facilities
+        with latitude and longitude columns. The other columns become
+        feature properties, and an integer index (e.g. REGISTRY_ID) becomes
+        the feature ids.
+    min_zoom, max_zoom : int
+        The zooms to build tiles for
+    last_modified : str or dict
+        Optional - when the data was last modified, for all layers or as
+        a dict by layer name. Layers without one are compared by content.
+    lat_field : str
+        The latitude column of facility layers
+    long_field : str
+        The longitude column of facility layers
+
+    Returns
+    -------
+    list
+        The names of the layers that were (re)built
+    '''
+    if not 0 <= min_zoom <= max_zoom <= MAX_ZOOM:
+        raise ValueError(f"Zooms must be between 0 and {MAX_ZOOM}, with min_zoom <= max_zoom")
+    if not isinstance(last_modified, dict):
+        last_modified = {name: last_modified for name in layers}
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(_SCHEMA)
+        state = {row[0]: row[1:] for row in connection.execute(
+            'SELECT layer, last_modified, minzoom, maxzoom FROM layers')}
+        built, dirty = [], set()
+        for name, frame in layers.items():
+            stamp = last_modified.get(name)
+            stamp = _fingerprint(frame) if stamp is None else str(stamp)
+            if state.get(name) == (stamp, min_zoom, max_zoom):
+                continue
+            with connection:
+                dirty.update(connection.execute(
+                    'SELECT zoom_level, tile_column, tile_row FROM layer_tiles WHERE layer = ?', (name,)))
+                connection.execute('DELETE FROM layer_tiles WHERE layer = ?', (name,))
+                rows = ((name, z, x, (1 << z) - 1 - y, blob) # MBTiles rows count up from the south
+                        for z, x, y, blob in _tile_layer(name, frame, min_zoom, max_zoom,
+                                                         lat_field, long_field))
+                connection.executemany('INSERT INTO layer_tiles VALUES (?, ?, ?, ?, ?)', rows)
+                dirty.update(connection.execute(
+                    'SELECT zoom_level, tile_column, tile_row FROM layer_tiles WHERE layer = ?', (name,)))
+                if 'geometry' in frame.columns and frame.geometry.notna().any():
+                    fields = {c: _field_type(frame[c]) for c in frame.columns if c != frame.geometry.name}
+                    bounds = frame.to_crs(4326).total_bounds if frame.crs is not None else frame.total_bounds
+                else:
+                    fields = {c: _field_type(frame[c]) for c in frame.columns
+                              if c not in ('geometry', lat_field, long_field)}
+                    lats = pd.to_numeric(frame[lat_field], errors='coerce')
+                    longs = pd.to_numeric(frame[long_field], errors='coerce')
+                    bounds = [longs.min(), lats.min(), longs.max(), lats.max()]
+                connection.execute('INSERT OR REPLACE INTO layers VALUES (?, ?, ?, ?, ?, ?)',
+                                   (name, stamp, min_zoom, max_zoom, json.dumps(fields),
+                                    json.dumps([float(b) for b in bounds])))
+            built.append(name)
+        with connection:
+            _write_tiles(connection, dirty)
+            _write_metadata(connection)
+    finally:
+        connection.close()
+    return built
+
+
+def _write_tiles(connection, dirty):
+    '''
+    helper function for `build_tiles`
+    Join the layers of each changed tile into the tiles table.
+    '''
+    connection.execute('CREATE TEMP TABLE IF NOT EXISTS dirty (zoom_level, tile_column, tile_row)')
+    connection.execute('DELETE FROM dirty')
+    connection.executemany('INSERT INTO dirty VALUES (?, ?, ?)', dirty)
+    connection.execute('''DELETE FROM tiles WHERE (zoom_level, tile_column, tile_row)
+                          IN (SELECT zoom_level, tile_column, tile_row FROM dirty)''')
+    rows = connection.execute('''
+        SELECT l.zoom_level, l.tile_column, l.tile_row, l.tile_data
+        FROM layer_tiles l JOIN (SELECT DISTINCT * FROM dirty) d
+        USING (zoom_level, tile_column, tile_row)
+        ORDER BY l.zoom_level, l.tile_column, l.tile_row, l.layer''').fetchall()
+    tiles = {}
+    for z, x, y, blob in rows:
+        tiles.setdefault((z, x, y), []).append(blob)
+    connection.executemany('INSERT INTO tiles VALUES (?, ?, ?, ?)',
+                           ((z, x, y, gzip.compress(b''.join(blobs), compresslevel=6, mtime=0))
+                            for (z, x, y), blobs in tiles.items()))
+
+
+def _write_metadata(connection):
+    # The MBTiles metadata, describing every layer in the file
+    layers = connection.execute('SELECT layer, minzoom, maxzoom, fields, bounds FROM layers').fetchall()
+    vector_layers = [{'id': name, 'fields': json.loads(fields), 'minzoom': lo, 'maxzoom': hi}
+                     for name, lo, hi, fields, _ in layers]
+    bounds = np.array([json.loads(b) for *_, b in layers], dtype=float).reshape(-1, 4)
+    metadata = {'name': 'ECHO_modules', 'format': 'pbf', 'type': 'overlay',
+                'minzoom': str(min((l[1] for l in layers), default=0)),
+                'maxzoom': str(max((l[2] for l in layers), default=0)),
+                'json': json.dumps({'vector_layers': vector_layers})}
+    if len(bounds):
+        metadata['bounds'] = ','.join(str(round(float(b), 6)) for b in
+                                      (np.nanmin(bounds[:, 0]), np.nanmin(bounds[:, 1]),
+                                       np.nanmax(bounds[:, 2]), np.nanmax(bounds[:, 3])))
+    connection.executemany('INSERT OR REPLACE INTO metadata VALUES (?, ?)', metadata.items())
+
+
+def read_tile(path, z, x, y):
+    '''
+    Return a tile from an MBTiles file.
+
+    Parameters
+    ----------
+    path : str
+        The .mbtiles file
+    z, x, y : int
+        The zoom and the column and row of the tile, counting rows from the
+        north as web maps do
+
+    Returns
+    -------
+    bytes or None
+        The gzipped vector tile, or None if the tile has no features
+    '''
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        row = connection.execute('''SELECT tile_data FROM tiles
+                                    WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?''',
+                                 (z, x, (1 << z) - 1 - y)).fetchone()
+    finally:
+        connection.close()
+    return None if row is None else row[0]
+
+
+def serve_tiles(path, host='127.0.0.1', port=0):
+    '''
+    Serve the tiles in an MBTiles file over http, in a background thread,
+    e.g. for mapper(df, tile_url=...) in a notebook.
+
+    Parameters
+    ----------
+    path : str
+        The .mbtiles file
+    host : str
+        The address to listen on
+    port : int
+        The port to listen on. 0 picks a free one.
+
+    Returns
+    -------
+    str
+        The URL template of the tiles, e.g. http://127.0.0.1:8000/{z}/{x}/{y}.pbf
+    ThreadingHTTPServer
+        The server; call its shutdown() to stop it
+    '''
+    class TileHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            try:
+                z, x, y = (int(p) for p in self.path.split('?')[0].strip('/').removesuffix('.pbf').split('/'))
+            except ValueError:
+                self.send_error(404)
+                return
+            tile = read_tile(path, z, x, y)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-protobuf')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            if tile is not None:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(tile or b'')))
+            self.end_headers()
+            self.wfile.write(tile or b'')
+
+    server = ThreadingHTTPServer((host, port), TileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://{host}:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.pbf', server
+
+
+def tile_layer_name(region_type):
+    '''
+    The name build_echo_tiles gives a region type's layer, e.g.
+    'huc12_watersheds' for 'HUC12 Watersheds'.
+    '''
+    return region_type.lower().replace(' ', '_')
+
+
+def build_echo_tiles(path, states, region_types=('County',), min_zoom=0, max_zoom=12,
+                     last_modified=None, api=True, token=None):
+    '''
+    Build a 'facilities' layer of the ECHO_EXPORTER facilities in the
+    states, and a layer of the boundaries of each region type (see
+    tile_layer_name), into an MBTiles file. The facilities are read from
+    the local facility dimension (see dimension.build_facility_dimension)
+    if it has the states, and queried from ECHO_EXPORTER if not.
+
+    Parameters
+    ----------
+    path : str
+        The .mbtiles file
+    states : list
+        State abbreviations e.g. ["NY", "NJ"]
+    region_types : list
+        Region types in geographies.spatial_tables, e.g. ["County", "Zip Code"]
+    min_zoom, max_zoom : int
+        The zooms to build tiles for
+    last_modified : str
+        Optional - when ECHO_EXPORTER was last modified (e.g. a DataSet's
+        last_modified), so the facilities are only rebuilt after an update.
+        Defaults to the date the facility dimension was stored from.
+    api : bool
+        If True, use the API to get the facilities. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Returns
+    -------
+    list
+        The names of the layers that were (re)built
+    '''
+    from ECHO_modules.dimension import dimension_last_modified, has_facility_dimension, load_facility_dimension
+    from ECHO_modules.geographies import spatial_tables
+    from ECHO_modules.get_data import get_echo_data, get_spatial_data
+
+    if isinstance(states, str):
+        states = [states]
+    if has_facility_dimension(states):
+        facilities = load_facility_dimension(states, columns=FACILITY_FIELDS)
+        if last_modified is None:
+            last_modified = dimension_last_modified(states)
+    else:
+        state_list = ', '.join(f"'{s}'" for s in states)
+        sql = f"select {', '.join(FACILITY_FIELDS)} from ECHO_EXPORTER where FAC_STATE in ({state_list})"
+        facilities = get_echo_data(sql, api=api, token=token)
+    layers = {}
+    if facilities is None or facilities.empty:
+        print("No facilities were found for the states.")
+    else:
+        if 'REGISTRY_ID' not in facilities.columns:
+            facilities = facilities.reset_index()
+        facilities = facilities.set_index(pd.to_numeric(facilities['REGISTRY_ID']).astype('int64').rename(None))
+        layers['facilities'] = facilities
+    for region_type in region_types:
+        regions, _ = get_spatial_data(region_type, states)
+        if regions.empty:
+            print(f"No {region_type} boundaries were found for the states.")
+            continue
+        # Keep the fields used to join and label the regions
+        wanted = {spatial_tables[region_type].get(k, '').lower() for k in ('id_field', 'pretty_field')}
+        keep = [c for c in regions.columns if c.lower() in wanted]
+        layers[tile_layer_name(region_type)] = regions[keep + [regions.geometry.name]].reset_index(drop=True)
+    if not layers:
+        return []
+    return build_tiles(path, layers, min_zoom, max_zoom,
+                       last_modified={'facilities': last_modified} if last_modified is not None else None)
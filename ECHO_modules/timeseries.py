@@ -0,0 +1,109 @@
+'''
+Yearly time series of a DataSet's records, for charts and export.
+
+program_series turns a program's records into one row per year and a
+column for each of its measures: the CWA quarterly violation counts, the
+SDWA water systems by fiscal year, emissions by reporting year, penalty
+amounts, or for other programs the number of records. The dates are parsed
+once per distinct value and the years totalled with numpy, and the records
+are not changed. DataSetResults keeps the series, so charting or exporting
+the same results again doesn't recompute it.
+'''
+
+import numpy as np
+import pandas as pd
+from ECHO_modules.aggregation import PENALTY_PROGRAMS, record_dates
+
+SDWA_PROGRAMS = ('SDWA Public Water Systems', 'SDWA Violations', 'SDWA Serious Violators',
+                 'SDWA Return to Compliance', 'SDWA Enforcements')
+REPORTING_YEAR_PROGRAMS = ('Combined Air Emissions', 'Greenhouse Gas Emissions', 'Toxic Releases')
+# The quarterly counts summed for CWA Violations
+CWA_VIOLATION_FIELDS = ['NUME90Q', 'NUMCVDT', 'NUMSVCD', 'NUMPSCH']
+# The first year charted
+FIRST_YEAR = 2001
+
+
+def _totals(years, columns, fill=False):
+    # Sum each column (a count where it's None) by year
+    dated = years >= 0
+    year_codes, year_values = pd.factorize(years[dated], sort=True)
+    series = pd.DataFrame(index=pd.Index(year_values.astype(int), name='year'))
+    for name, values in columns.items():
+        weights = None if values is None else np.nan_to_num(np.asarray(values, dtype=float)[dated])
+        totals = np.bincount(year_codes, weights=weights, minlength=len(year_values))
+        series[name] = totals if values is not None else totals.astype(np.int64)
+    if fill and len(series):
+        # Include the years in between without any records
+        series = series.reindex(pd.RangeIndex(series.index.min(), series.index.max() + 1, name='year'),
+                                fill_value=0)
+    return series
+
+
+def _years(values, date_format):
+    dates = record_dates(values, date_format)
+    years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    return np.where(np.isnat(dates), -1, years)
+
+
+def program_series(df, dataset):
+    '''
+    The yearly totals of a DataSet's records.
+
+    Parameters
+    ----------
+    df : DataFrame
+        The records, which are not changed
+    dataset : DataSet
+
+    Returns
+    -------
+    DataFrame
+        A row for each year, indexed by year, and a column for each measure
+    '''
+    program = dataset.name
+    if program == 'CWA Violations':
+        years = _years(df['YEARQTR'], '%Y')
+        columns = {f: pd.to_numeric(df[f], errors='coerce') for f in CWA_VIOLATION_FIELDS if f in df.columns}
+        series = _totals(years, columns)
+    elif program in SDWA_PROGRAMS:
+        # Count the water systems, as PWS_NAME, by fiscal year
+        years = _years(df['FISCAL_YEAR'], '%Y')
+        series = _totals(np.where(df['PWS_NAME'].notna().to_numpy(), years, -1), {'PWS_NAME': None})
+    elif program in REPORTING_YEAR_PROGRAMS:
+        years = pd.to_numeric(df['REPORTING_YEAR'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+        series = _totals(years, {'ANNUAL_EMISSION': pd.to_numeric(df['ANNUAL_EMISSION'], errors='coerce')})
+    elif program in PENALTY_PROGRAMS:
+        amount = pd.to_numeric(df[dataset.agg_col], errors='coerce').fillna(0)
+        if program == 'CWA Penalties':
+            amount = amount + pd.to_numeric(df['STATE_LOCAL_PENALTY_AMT'], errors='coerce').fillna(0)
+        series = _totals(_years(df[dataset.date_field], '%m/%d/%Y'), {'Amount': amount}, fill=True)
+    else:
+        years = _years(df[dataset.date_field], dataset.date_format)
+        series = _totals(years, {dataset.date_field: None}, fill=True)
+    if program not in REPORTING_YEAR_PROGRAMS:
+        # Emissions are charted for every reporting year
+        series = series[series.index >= FIRST_YEAR]
+    return series
+
+
+def chart_labels(dataset):
+    '''
+    The axis labels and legend of a DataSet's yearly chart.
+
+    Parameters
+    ----------
+    dataset : DataSet
+
+    Returns
+    -------
+    dict
+        xlabel, ylabel (None to leave it unlabelled) and legend
+    '''
+    program = dataset.name
+    if program in REPORTING_YEAR_PROGRAMS:
+        return dict(xlabel='Reporting Year', ylabel=dataset.unit, legend=True)
+    if program in PENALTY_PROGRAMS:
+        return dict(xlabel='Reporting Year', ylabel='Total penalties ($)', legend=True)
+    if program == 'CWA Violations' or program in SDWA_PROGRAMS:
+        return dict(xlabel=None, ylabel=None, legend=True)
+    return dict(xlabel='Reporting Year', ylabel='Count', legend=False)
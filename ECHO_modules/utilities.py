@@ -12,15 +12,34 @@ import matplotlib.pyplot as plt
 import geopandas
 import folium
 import urllib
+import json
+from branca.colormap import StepColormap
+from branca.element import Element, MacroElement
+from branca.utilities import color_brewer
+try:
+    from folium.template import Template
+except ImportError: # folium < 0.18
+    from jinja2 import Template
 import seaborn as sns
-from folium.plugins import FastMarkerCluster
+from folium.elements import JSCSSMixin
+from folium.plugins import FastMarkerCluster, MarkerCluster as FoliumMarkerCluster
 import ipywidgets as widgets
-from ipyleaflet import Map, basemaps, basemap_to_tiles, GeomanDrawControl, Marker, MarkerCluster
+from ipyleaflet import (Map, basemaps, basemap_to_tiles, GeomanDrawControl, Marker, MarkerCluster,
+                        GeoJSON, WidgetControl)
 from ipywidgets import interact, interactive, fixed, interact_manual, Layout
 from IPython.display import display
 from ECHO_modules.get_data import get_echo_data
 from ECHO_modules.geographies import region_field, states
-from shapely.geometry import Polygon, Point
+from ECHO_modules.reference import county_canon, state_cds, state_counties
+from ECHO_modules.geometry import bin_points, map_regions, points_to_regions
+from ECHO_modules.crosswalk import LOOKUP_REGION_TYPES, crosswalk_codes
+from ECHO_modules.aggregation import aggregate_program
+from ECHO_modules.compliance import facility_noncompliance
+from ECHO_modules.rollup import yearly_totals
+from ECHO_modules.facilities import (get_county_variants, county_filter, get_facs_in_counties,
+                                     get_active_facilities, active_universe, clear_active_universe,
+                                     facilities_without, filter_by_geometry,
+                                     get_min_max_coord, get_facs_in_rect)
 
 # Set up some default parameters for graphing
 from matplotlib import cycler
@@ -235,20 +254,13 @@ def show_pick_region_widget( type, state_widget=None, multi=True ):
     elif type == 'FRSID List':
         widget_parms = {'type' : 'text', 'default' : '', 'description' : 'FRSID filename:'}
     elif type == 'County':
-        url = "https://raw.githubusercontent.com/edgi-govdata-archiving/"
-        url += "ECHO_modules/main/data/state_counties_corrected.csv"
-        df = pd.read_csv( url )
-        counties = df[df['FAC_STATE'] == my_state]['County']
-        counties = counties.unique()
+        counties = state_counties( my_state )
         if ( multi ):
             widget_parms = {'type' : 'multi', 'default' :counties, 'description' : 'Select counties:'}
         else:
             widget_parms = {'dropdown' : 'multi', 'default' : counties, 'description' : 'Select county:'}
     elif type == 'Congressional District':
-        url = "https://raw.githubusercontent.com/edgi-govdata-archiving/"
-        url += "ECHO_modules/main/data/state_cd.csv"
-        df = pd.read_csv( url )
-        cds = df[df['FAC_STATE'] == my_state]['FAC_DERIVED_CD113']
+        cds = state_cds( my_state )
         if ( multi ):
             widget_parms = {'type' : 'multi', 'default' : cds, 'description' : 'Select districts:'}
         else:
@@ -367,138 +379,6 @@ def show_fac_widget( fac_series, top_violators=None ):
     display(widget)
     return widget
 
-def get_facs_in_counties( df, selected ):
-    '''
-    The dataframe df that is passed in will have all facilities for the state.
-    The list selected passed in will have the corrected names of the counties
-    we are interested in.
-    We must accumulate facilities in all the alternative county names that the
-    ECHO data has for facilities.  E.g., "Jefferson" and "Jefferson County"
-    may both be in the ECHO data, but we want to consolidate them into
-    "Jefferson".
-
-    Parameters
-    ----------
-    df - DataFrame with facilities for the entire state.
-    selected - List of selected counties.
-
-    Returns
-    -------
-    Dataframe with all facilities in the selected counties.
-
-    '''
-
-    if df.empty:
-        return None
-    url = "https://raw.githubusercontent.com/edgi-govdata-archiving/"
-    url += "ECHO_modules/main/data/state_counties_corrected.csv"
-    state_counties = pd.read_csv(url)
-    # Get all of the different ECHO names for the selected counties.
-    selected_counties = state_counties[state_counties['County'].isin(selected)]['FAC_COUNTY']
-    return df[df['FAC_COUNTY'].isin(selected_counties)]
-
-
-def get_active_facilities( state, region_type, regions_selected, api=True, token=None):
-    '''
-    Get a Dataframe with the ECHO_EXPORTER facilities with FAC_ACTIVE_FLAG
-    set to 'Y' for the region selected.
-
-    Parameters
-    ----------
-    state : str
-        The state, which could be None
-    region_type : str
-        The type of region:  'State', 'Congressional District', etc.
-    regions_selected : list
-        The selected regions of the specified region_type
-    api : bool
-        If True, use the API to get the data.  If False, use the local delta lake connection
-
-    Returns
-    -------
-    Dataframe
-        The active facilities returned from the database query
-    '''
-
-    try:
-        if ( region_type == 'Nationwide' ):
-            sql = 'select * from ECHO_EXPORTER where FAC_ACTIVE_FLAG = \'Y\''
-            sql = sql.format( state )
-            df_active = get_echo_data( sql, 'REGISTRY_ID', api=api, token=token)
-        elif region_type == 'State' or region_type == 'County':
-            sql = 'select * from ECHO_EXPORTER where FAC_STATE = \'{}\''
-            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
-            sql = sql.format( state )
-            df_active = get_echo_data( sql, 'REGISTRY_ID', api=api, token=token)
-        elif ( region_type == 'Congressional District'):
-            cd_str = ",".join( map( lambda x: str(x), regions_selected ))
-            sql = 'select * from ECHO_EXPORTER where FAC_STATE = \'{}\''
-            sql += ' and FAC_DERIVED_CD113 in ({})'
-            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
-            sql = sql.format( state, cd_str )
-            df_active = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
-        elif ( region_type == 'Zip Code' ):
-            regions_selected = ''.join(regions_selected.split())
-            zc_str = ",".join( map( lambda x: "\'"+str(x)+"\'", regions_selected.split(',') ))
-            sql = 'select * from ECHO_EXPORTER where FAC_ZIP in ({})'
-            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
-            sql = sql.format( zc_str )
-            df_active = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
-        elif region_type == 'Watershed':
-            regions_selected = ''.join(regions_selected.split())
-            ws_str = ",".join( map( lambda x: "\'"+str(x)+"\'", regions_selected.split(',') ))
-            sql = 'select * from ECHO_EXPORTER where FAC_DERIVED_HUC in ({})'
-            sql += ' and FAC_ACTIVE_FLAG = \'Y\''
-            sql = sql.format( ws_str )
-            df_active = get_echo_data(sql, 'REGISTRY_ID', api=api, token=token)
-        elif region_type == 'Neighborhood':
-            #poly_str = ''
-            points = regions_selected
-            
-            min_lon = min(p[0] for p in points)
-            max_lon = max(p[0] for p in points)
-            min_lat = min(p[1] for p in points)
-            max_lat = max(p[1] for p in points)
-
-            sql = f"SELECT * FROM ECHO_EXPORTER WHERE FAC_ACTIVE_FLAG = 'Y' AND (FAC_LAT >= {min_lat} AND FAC_LAT <= {max_lat}) AND (FAC_LONG >= NEGATIVE({abs(min_lon)}) AND FAC_LONG <= NEGATIVE({abs(max_lon)}));"
-            # display(sql)
-            df_active = get_echo_data( sql, "REGISTRY_ID", api=api, token=token) # Get all facs within a bbox
-            df_active = filter_by_geometry(points, df_active) # Clip facs to just those in actual shape  
-            
-        else:
-            df_active = None
-        if region_type == 'County':
-            # df_active is currently all active facilities in the state.
-            # Get only those in the selected counties.
-            df_active = get_facs_in_counties(df_active, regions_selected)
-    except pd.errors.EmptyDataError:
-        df_active = None
-
-    return df_active
-
-def filter_by_geometry(points, df): 
-    # Bounding Box
-    min_lon = min(p[0] for p in points)
-    max_lon = max(p[0] for p in points)
-    min_lat = min(p[1] for p in points)
-    max_lat = max(p[1] for p in points)
-    
-    # Make a geopandas dataframe of all facilities
-    facs_gdf = geopandas.GeoDataFrame(df, geometry=geopandas.points_from_xy(df['FAC_LONG'], df['FAC_LAT']), crs="EPSG:4269")
-    
-    filtered_facs = facs_gdf[
-        (facs_gdf.geometry.x >= min_lon) & 
-        (facs_gdf.geometry.x <= max_lon) & 
-        (facs_gdf.geometry.y >= min_lat) & 
-        (facs_gdf.geometry.y <= max_lat)
-    ]
-    
-    # Filter more by creating a polygon using the points to get the facilities inside the polygon
-    polygon = Polygon(points)
-    filtered_facs = filtered_facs[filtered_facs.geometry.intersects(polygon)]
-    
-    return filtered_facs
-
 def aggregate_by_facility(records, program, other_records = False, api=True, token=None):
   '''
   Aggregate a set of records by facility IDs, using sum or count operations. 
@@ -536,63 +416,15 @@ def aggregate_by_facility(records, program, other_records = False, api=True, tok
     '''
     Helper function to sort facilities in this program (input) from the full list of faciliities regulated under the program (active)
     '''
-    active = get_active_facilities(records.state, records.region_type, records.region_value, api=api, token=token)
-
-    diff = list(
-        set(active[records.dataset.echo_type + "_IDS"]) - set(input[records.dataset.idx_field])
-        ) 
-    
-    # get rid of NaNs - probably no program IDs
-    diff = [x for x in diff if str(x) != 'nan']
-    
     # ^ Not perfect given that some facilities have multiple NPDES_IDs
     # Below return the full ECHO_EXPORTER details for facilities without violations, penalties, or inspections
-    diff = active.loc[active[records.dataset.echo_type + "_IDS"].isin(diff)] 
-    return diff
-
-  # CWA Violations
-  if (program == "CWA Violations"): 
-    year = data["YEARQTR"].astype("str").str[0:4:1]
-    data["YEARQTR"] = year
-    data["sum"] = data["NUME90Q"] + data["NUMCVDT"] + data['NUMSVCD'] + data["NUMPSCH"]
-    data = data.groupby([records.dataset.idx_field, "FAC_NAME", "FAC_LAT", "FAC_LONG"]).sum()
-    data = data.reset_index()
-    data = data.loc[data["sum"] > 0] # only symbolize facilities with violations
-    aggregator = "sum" # keep track of which field we use to aggregate data, which may differ from the preset
-
-  # Penalties
-  elif (program == "CAA Penalties" or program == "RCRA Penalties" or program == "CWA Penalties" ):
-    data.rename( columns={ records.dataset.date_field: 'Date', records.dataset.agg_col: 'Amount'}, inplace=True )
-    if ( program == "CWA Penalties" ):
-      data['Amount'] = data['Amount'].fillna(0) + data['STATE_LOCAL_PENALTY_AMT'].fillna(0)
-    data = data.groupby([records.dataset.idx_field, "FAC_NAME", "FAC_LAT", "FAC_LONG"]).agg({'Amount':'sum'})
-    data = data.reset_index()
-    data = data.loc[data["Amount"] > 0] # only symbolize facilities with penalties
-    aggregator = "Amount" # keep track of which field we use to aggregate data, which may differ from the preset
-
-  # Air emissions
-  elif (program == "Greenhouse Gas Emissions" or program == "Toxic Releases"):
-    data = data.groupby([records.dataset.idx_field, "FAC_NAME", "FAC_LAT", "FAC_LONG"]).agg({records.dataset.agg_col:'sum'})
-    data['sum'] = data[records.dataset.agg_col]
-    data = data.reset_index()
-    aggregator = "sum" # keep track of which field we use to aggregate data, which may differ from the preset
-	  
-  # SDWA population served
-  elif (program == "SDWA Public Water Systems" or program == "SDWA Serious Violators"):
-    # filter to latest fiscal year
-    data = data.loc[data[records.dataset.date_field] == 2021]
-    data = data.groupby([records.dataset.idx_field, "FAC_NAME", "FAC_LAT", "FAC_LONG"]).agg({records.dataset.agg_col:'sum'})
-    data['sum'] = data[records.dataset.agg_col]
-    data = data.reset_index()
-    aggregator = "sum" # keep track of which field we use to aggregate data, which may differ from the preset
-
-  # Count of inspections, violations
-  else: 
-    data = data.groupby([records.dataset.idx_field, "FAC_NAME", "FAC_LAT", "FAC_LONG"]).agg({records.dataset.date_field: 'count'})
-    data['count'] = data[records.dataset.date_field]
-    data = data.reset_index()
-    data = data.loc[data["count"] > 0] # only symbolize facilities with X
-    aggregator = "count" # keep track of which field we use to aggregate data, which may differ from the preset
+    return facilities_without(records.state, records.region_type, records.region_value,
+                              records.dataset.echo_type, input[records.dataset.idx_field], api=api, token=token)
+
+  # Group on the program ID alone, leaving records.dataframe as it is, and
+  # only symbolize facilities with a location
+  data, aggregator = aggregate_program(data, records.dataset, program)
+  data = data.dropna(subset=["FAC_LAT", "FAC_LONG"]).reset_index(drop=True)
 
   if other_records:
     diff = _differ(data, program, api=api, token=token)
@@ -603,10 +435,17 @@ def aggregate_by_facility(records, program, other_records = False, api=True, tok
   else:
     print( "There is no data for this program and region after 2000." )
 
-def aggregate_by_geography(dsr, agg_type, spatial_tables, region_filter=None):
+def aggregate_by_geography(dsr, agg_type, spatial_tables, region_filter=None,
+                           region_type=None, regions=None):
     '''
     Aggregate attribute data by a spatial unit, such as zip codes
 
+    Region types with a matching ECHO field in region_field (e.g. Zip Code,
+    FAC_ZIP) are grouped by that field. Others, such as HUC12 Watersheds or
+    Ecoregions, are aggregated by looking up each record's facility in the
+    crosswalk (see crosswalk.build_crosswalk) or, if that hasn't been built,
+    by finding which of the regions the facility falls in.
+
     Parameters
     ----------
     dsr : DataSetResults object
@@ -617,6 +456,11 @@ def aggregate_by_geography(dsr, agg_type, spatial_tables, region_filter=None):
         Import from ECHO_modules/geographies.py
     region_filter : list
         Optional list of regions (zips, counties, etc.) to focus on. Same as region_value from ds.store_results
+    region_type : str
+        Optional spatial unit to aggregate by, e.g. "HUC12 Watersheds". Defaults to dsr.region_type
+    regions : GeoDataFrame
+        Optional polygons of the region_type, for region types that get_spatial_data
+        can't retrieve (e.g. Ecoregions, EPA Region)
 
     Returns
     -------
@@ -627,18 +471,57 @@ def aggregate_by_geography(dsr, agg_type, spatial_tables, region_filter=None):
     '''
     from ECHO_modules.get_data import get_spatial_data
 
+    if region_type is None:
+        region_type = dsr.region_type
+    state = [dsr.state] if isinstance(dsr.state, str) else dsr.state
+    agg_col = dsr.dataset.agg_col
+    field = region_field.get(region_type, {"field": 'None'})["field"]
+
+    if field == 'None' or regions is not None:
+        # No ECHO field for these regions. Look the facilities up in the
+        # crosswalk if it has been built, otherwise match them to the regions.
+        codes = None
+        df = dsr.dataframe
+        registry_ids = df.index if df.index.name == 'REGISTRY_ID' else df.get('REGISTRY_ID')
+        if regions is None and region_type in LOOKUP_REGION_TYPES and registry_ids is not None:
+            codes = crosswalk_codes(registry_ids, LOOKUP_REGION_TYPES[region_type], state)
+            if codes is not None and not region_filter:
+                # Only fetch the boundaries of regions with records
+                region_filter = sorted(set(codes[pd.notna(codes)]))
+        if regions is None:
+            regions, states = get_spatial_data(region_type, state, region_filter=region_filter)
+        if regions.empty:
+            print(f"No {region_type} boundaries were found. They can be passed in as regions.")
+            return None
+        id_field = spatial_tables[region_type]['id_field']
+        # Services differ in the case of their field names
+        id_field = next((c for c in regions.columns if c.lower() == id_field.lower()), id_field)
+        if codes is None:
+            codes = points_to_regions(df, regions, id_field).to_numpy()
+        aggregated = df.groupby(codes)[[agg_col]].agg({agg_col: agg_type})
+        aggregated.index.name = id_field
+        regions = regions[[id_field, "geometry"]].set_index(id_field)
+        return geopandas.GeoDataFrame(aggregated.join(regions), geometry="geometry", crs=regions.crs)
+
+    groups = field
+    if field == 'FAC_COUNTY':
+        # Group the variant spellings of each county together
+        groups = county_canon(dsr.dataframe)
     # Aggregate attribute data
-    aggregated = dsr.dataframe.groupby(by=region_field[dsr.region_type]["field"])[[dsr.dataset.agg_col]].agg({dsr.dataset.agg_col:agg_type}) 
+    aggregated = dsr.dataframe.groupby(by=groups, observed=True)[[agg_col]].agg({agg_col:agg_type}) 
     # Join aggregated data with spatial dataset
     ## Get spatial data
-    if region_filter and dsr.region_type == "County":
+    if region_filter and region_type == "County":
         region_filter = [c.title() for c in region_filter]
-    regions, states = get_spatial_data(dsr.region_type, dsr.state, region_filter=region_filter)
+    regions, states = get_spatial_data(region_type, state, region_filter=region_filter)
+    if regions.empty:
+        print(f"No {region_type} boundaries were found.")
+        return None
     ## Join
-    if dsr.region_type == "County":
-        idx = regions[spatial_tables[dsr.region_type]['match_field']].str.upper()
+    if region_type == "County":
+        idx = regions[spatial_tables[region_type]['match_field']].str.upper()
     else:
-        idx = regions[spatial_tables[dsr.region_type]['match_field']]
+        idx = regions[spatial_tables[region_type]['match_field']]
     
     results = geopandas.GeoDataFrame(aggregated.join(regions[["geometry"]].set_index(idx)), geometry="geometry", crs=4269)
     return results 
@@ -678,34 +561,323 @@ def marker_text( row, no_text, name_field="FAC_NAME", url_field="DFR_URL"):
     return text
 
 
-def check_bounds( row, bounds ):
+def marker_texts( df, no_text, name_field="FAC_NAME", url_field="DFR_URL" ):
+    '''
+    Create the marker_text for every row of df at once.
+
+    Parameters
+    ----------
+    df : Dataframe
+        Expected to contain FAC_NAME and DFR_URL fields from ECHO_EXPORTER
+    no_text : Boolean
+        If True, don't put any text with the markers
+    name_field : string
+        The field to use for the name in the marker
+    url_field : string
+        The field to use for the marker's URL
+
+    Returns
+    -------
+    Series
+        The text to attach to each marker
+    '''
+
+    text = pd.Series("", index=df.index, dtype=object)
+    if ( no_text ):
+        return text
+    names = df[name_field].astype("string")
+    text = (names + " - ").fillna("")
+    if url_field in df.columns:
+        text += " - <p><a href='" + df[url_field].astype("string").fillna("")
+        text += "' target='_blank'>Link to ECHO detailed report</a></p>"
+    return text.astype(object)
+
+
+def check_bounds( row, bounds, lat_field="FAC_LAT", long_field="FAC_LONG" ):
     '''
-    See if the FAC_LAT and FAC_LONG of the row are interior to
+    See if the latitude and longitude of the row are interior to
     the minx, miny, maxx, maxy of the bounds.
 
     Parameters
     ----------
     row : Series
-	Must contain FAC_LAT and FAC_LONG
+        Must contain lat_field and long_field
     bounds : Dataframe
-	Bounding rectangle--minx,miny,maxx,maxy
+        Bounding rectangle--minx,miny,maxx,maxy
+    lat_field : string
+        The latitude field
+    long_field : string
+        The longitude field
 
     Returns
     -------
     True if the row's point is in the bounds
     '''
 
-    if ( row['FAC_LONG'] < bounds.minx[0] or row['FAC_LAT'] < bounds.miny[0] \
-         or row['FAC_LONG'] > bounds.maxx[0] or row['FAC_LAT'] > bounds.maxy[0]):
+    if ( row[long_field] < bounds.minx[0] or row[lat_field] < bounds.miny[0] \
+         or row[long_field] > bounds.maxx[0] or row[lat_field] > bounds.maxy[0]):
         return False
     return True
 
 
+def bounds_mask( df, bounds, lat_field="FAC_LAT", long_field="FAC_LONG" ):
+    '''
+    check_bounds for every row of df at once.
+
+    Parameters
+    ----------
+    df : Dataframe
+        Must contain lat_field and long_field
+    bounds : Dataframe
+        Bounding rectangle--minx,miny,maxx,maxy
+    lat_field : string
+        The latitude field
+    long_field : string
+        The longitude field
+
+    Returns
+    -------
+    ndarray
+        True for the rows whose points are in the bounds
+    '''
+
+    lats = pd.to_numeric(df[lat_field], errors="coerce").to_numpy(dtype=float)
+    longs = pd.to_numeric(df[long_field], errors="coerce").to_numpy(dtype=float)
+    minx, miny, maxx, maxy = (bounds[c].iloc[0] for c in ("minx", "miny", "maxx", "maxy"))
+    return (longs >= minx) & (lats >= miny) & (longs <= maxx) & (lats <= maxy)
+
+
+class _ColumnarData:
+    '''
+    helper class for `ColumnarMarkerCluster` and `ColumnarCircleLayer`
+    Adds the element's data to the figure as the javascript variable
+    <name>_data. It is added as it is rather than through the template
+    because folium compiles each rendered script as a template again, which
+    is slow when it holds 100,000s of values.
+    '''
+    def render(self, **kwargs):
+        data = json.dumps(self.data, separators=(",", ":"))
+        # Escape anything that could end the script tag
+        data = data.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+        self.get_root().script.add_child(_RawScript(f"var {self.get_name()}_data = {data};"),
+                                         name=self.get_name() + "_data")
+        super().render(**kwargs)
+
+
+class ColumnarMarkerCluster(_ColumnarData, FoliumMarkerCluster):
+    '''
+    A marker cluster whose markers are made in the browser, like
+    folium's FastMarkerCluster, but from columns of latitudes, longitudes
+    and popup texts rather than a list of rows, and added to the cluster
+    in one go. This keeps maps of 100,000+ facilities small and quick.
+
+    Parameters
+    ----------
+    lats, longs : sequence
+        The coordinates of the markers
+    texts : sequence
+        Optional popup HTML for each marker. Empty texts get no popup.
+    callback : str
+        Optional javascript function(lat, long, text) returning a marker
+    kwargs
+        Options for Leaflet.markercluster
+    '''
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var callback = {{ this.callback }};
+                var data = {{ this.get_name() }}_data;
+                var cluster = L.markerClusterGroup({{ this.options|tojson }});
+                var markers = new Array(data.lat.length);
+                for (var i = 0; i < data.lat.length; i++) {
+                    markers[i] = callback(data.lat[i], data.long[i], data.text ? data.text[i] : "");
+                }
+                cluster.addLayers(markers);
+                cluster.addTo({{ this._parent.get_name() }});
+                return cluster;
+            })();
+        {% endmacro %}"""
+    )
+
+    circle_callback = """function (lat, long, text) {
+        var marker = L.circleMarker([lat, long], {radius: 8, color: "black", weight: 1,
+                                                  fillColor: "orange", fillOpacity: 0.4});
+        if (text) { marker.bindPopup(text); }
+        return marker;
+    }"""
+
+    def __init__(self, lats, longs, texts=None, callback=None, **kwargs):
+        super().__init__(**kwargs)
+        self._name = "ColumnarMarkerCluster"
+        self.data = {"lat": np.round(np.asarray(lats, dtype=float), 6).tolist(),
+                     "long": np.round(np.asarray(longs, dtype=float), 6).tolist(),
+                     "text": None if texts is None else list(texts)}
+        self.callback = self.circle_callback if callback is None else callback
+
+
+class ColumnarCircleLayer(_ColumnarData, MacroElement):
+    '''
+    Circle markers sized and styled by the data, drawn as one GeoJSON layer
+    on a canvas. The features are made in the browser from columns of
+    coordinates, radii, style numbers and popup texts, so the size of the
+    map grows with the data rather than with a Python object per point.
+
+    Parameters
+    ----------
+    lats, longs : sequence
+        The coordinates of the circles
+    radii : sequence
+        The radius of each circle in pixels
+    styles : list
+        Leaflet path options (color, fillColor, etc.) for the circles
+    style_ids : sequence
+        Optional index into styles for each circle. Defaults to the first style.
+    popups : sequence
+        Optional popup HTML for each circle. Empty texts get no popup.
+    '''
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var data = {{ this.get_name() }}_data;
+                var renderer = L.canvas();
+                var features = new Array(data.lat.length);
+                for (var i = 0; i < data.lat.length; i++) {
+                    features[i] = {type: "Feature",
+                                   geometry: {type: "Point", coordinates: [data.long[i], data.lat[i]]},
+                                   properties: {radius: data.radius[i],
+                                                style: data.style ? data.style[i] : 0,
+                                                popup: data.popup ? data.popup[i] : ""}};
+                }
+                return L.geoJSON({type: "FeatureCollection", features: features}, {
+                    pointToLayer: function (feature, latlng) {
+                        var p = feature.properties;
+                        return L.circleMarker(latlng, Object.assign({radius: p.radius, renderer: renderer},
+                                                                    data.styles[p.style]));
+                    },
+                    onEachFeature: function (feature, layer) {
+                        if (feature.properties.popup) { layer.bindPopup(feature.properties.popup); }
+                    }
+                }).addTo({{ this._parent.get_name() }});
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, lats, longs, radii, styles, style_ids=None, popups=None):
+        super().__init__()
+        self._name = "ColumnarCircleLayer"
+        self.data = {"lat": np.round(np.asarray(lats, dtype=float), 6).tolist(),
+                     "long": np.round(np.asarray(longs, dtype=float), 6).tolist(),
+                     "radius": np.round(np.asarray(radii, dtype=float), 2).tolist(),
+                     "style": None if style_ids is None else np.asarray(style_ids, dtype=int).tolist(),
+                     "popup": None if popups is None else list(popups),
+                     "styles": list(styles)}
+
+
+class VectorTileLayer(JSCSSMixin, MacroElement):
+    '''
+    One layer of a vector tile source, such as tiles.serve_tiles, drawn
+    with Leaflet.VectorGrid. Only the style, and the colors or ids picked
+    out of the layer, are put in the map; the features come from the tiles.
+
+    Parameters
+    ----------
+    url : str
+        The URL template of the tiles, e.g. http://127.0.0.1:8000/{z}/{x}/{y}.pbf
+    layer : str
+        The name of the layer in the tiles, e.g. 'facilities' or 'county'
+    key_field : str
+        The property identifying each feature, e.g. 'REGISTRY_ID' or 'GEOID'
+    style : dict
+        Leaflet path options for the features. Points are drawn as circles
+        of the given radius.
+    colors : dict
+        Optional key_field value: fill color. Features not in it are not filled.
+    keep : sequence
+        Optional key_field values of the only features to draw
+    popup_fields : list
+        Properties to show when a feature is clicked
+    max_zoom : int
+        The highest zoom the tiles were built for. Closer in, those tiles are scaled.
+    '''
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var options = {{ this.options|tojson }};
+                var keep = options.keep ? new Set(options.keep.map(String)) : null;
+                var styles = {};
+                styles[options.layer] = function (properties, zoom) {
+                    var key = String(properties[options.key_field]);
+                    if (keep && !keep.has(key)) { return []; }
+                    var style = Object.assign({}, options.style);
+                    if (options.colors) {
+                        if (key in options.colors) { style.fillColor = options.colors[key]; }
+                        else { style.fillOpacity = 0; }
+                    }
+                    return style;
+                };
+                var layer = L.vectorGrid.protobuf({{ this.url|tojson }}, {
+                    vectorTileLayerStyles: styles, interactive: true, rendererFactory: L.canvas.tile,
+                    maxNativeZoom: options.max_zoom
+                });
+                if (options.popup_fields.length) {
+                    var escape = function (text) {
+                        return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+                    };
+                    layer.on("click", function (e) {
+                        var p = e.layer.properties;
+                        var html = options.popup_fields.filter(function (f) { return p[f] !== undefined; })
+                            .map(function (f) { return "<b>" + escape(f) + "</b>: " + escape(p[f]); }).join("<br>");
+                        L.popup().setLatLng(e.latlng).setContent(html).openOn({{ this._parent.get_name() }});
+                    });
+                }
+                return layer.addTo({{ this._parent.get_name() }});
+            })();
+        {% endmacro %}"""
+    )
+
+    default_js = [("leaflet_vectorgrid",
+                   "https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.min.js")]
+
+    def __init__(self, url, layer, key_field, style=None, colors=None, keep=None, popup_fields=None,
+                 max_zoom=12):
+        super().__init__()
+        self._name = "VectorTileLayer"
+        self.url = url
+        self.options = {"layer": layer, "key_field": key_field,
+                        "style": {"weight": 1, "color": "#182799", "fill": True} if style is None else style,
+                        "colors": None if colors is None else {str(k): v for k, v in colors.items()},
+                        "keep": None if keep is None else [str(k) for k in keep],
+                        "popup_fields": [] if popup_fields is None else list(popup_fields),
+                        "max_zoom": max_zoom}
+
+
+class _RawScript(Element):
+    '''
+    helper class for `_ColumnarData`
+    Javascript added to a figure as it is, without going through jinja.
+    '''
+    def __init__(self, script):
+        super().__init__()
+        self.script = script
+
+    def render(self, **kwargs):
+        return self.script
+
+
 def mapper(df, bounds=None, no_text=False, name_field="FAC_NAME",
-           lat_field="FAC_LAT", long_field="FAC_LONG"):
+           lat_field="FAC_LAT", long_field="FAC_LONG", tile_url=None, tile_layer="facilities",
+           tile_max_zoom=12):
     '''
     Display a map of the Dataframe passed in.
     Based on https://medium.com/@bobhaffner/folium-markerclusters-and-fastmarkerclusters-1e03b01cb7b1
+    The markers are made in the browser (see ColumnarMarkerCluster), so
+    statewide and nationwide maps are quick to draw.
 
     Parameters
     ----------
@@ -721,6 +893,14 @@ def mapper(df, bounds=None, no_text=False, name_field="FAC_NAME",
         The column of df to identify latitude
     long_field : string
         The column of df to identify longitude
+    tile_url : string
+        Optional URL template of vector tiles with the facilities, e.g. from
+        tiles.serve_tiles. The facilities are then drawn from the tiles,
+        picked out by REGISTRY_ID, rather than sent to the map.
+    tile_layer : string
+        The layer of the tiles with the facilities
+    tile_max_zoom : int
+        The highest zoom the tiles were built for
 
     Returns
     -------
@@ -737,40 +917,82 @@ def mapper(df, bounds=None, no_text=False, name_field="FAC_NAME",
     )
 
     df = df.drop_duplicates(subset=[name_field, lat_field, long_field])
+    df = df[df[lat_field].notna() & df[long_field].notna()]
+    if ( bounds is not None ):
+        df = df[bounds_mask( df, bounds, lat_field, long_field )]
+    if df.empty:
+        print("None of the facilities are in the bounds. There is nothing to map.")
+        return m
+
+    if tile_url is not None and "REGISTRY_ID" not in df.columns and df.index.name != "REGISTRY_ID":
+        print("The facilities need a REGISTRY_ID to be found in the tiles, so they are mapped as markers.")
+        tile_url = None
+    if tile_url is not None:
+        ids = df["REGISTRY_ID"] if "REGISTRY_ID" in df.columns else df.index.to_series()
+        ids = pd.to_numeric(ids, errors="coerce").dropna().astype("int64").unique()
+        style = {"radius": 6, "color": "black", "weight": 1, "fill": True,
+                 "fillColor": "orange", "fillOpacity": 0.4}
+        m.add_child(VectorTileLayer(tile_url, tile_layer, "REGISTRY_ID", style=style, keep=ids,
+                                    popup_fields=None if no_text else [name_field],
+                                    max_zoom=tile_max_zoom))
+    else:
+        # Create the Marker Cluster, with a clickable marker for each facility
+        #kwargs={"disableClusteringAtZoom": 10, "showCoverageOnHover": False}
+        mc = ColumnarMarkerCluster(df[lat_field], df[long_field],
+                                   marker_texts( df, no_text, name_field ))
+        m.add_child(mc)
 
-    # Create the Marker Cluster array
-    #kwargs={"disableClusteringAtZoom": 10, "showCoverageOnHover": False}
-    mc = FastMarkerCluster("")
-
-    # Add a clickable marker for each facility
-    for index, row in df.iterrows():
-        if ( bounds is not None ):
-            if ( not check_bounds( row, bounds )):
-                continue
-        mc.add_child(folium.CircleMarker(
-            location = [row[lat_field], row[long_field]],
-            popup = marker_text( row, no_text, name_field ),
-            radius = 8,
-            color = "black",
-            weight = 1,
-            fill_color = "orange",
-            fill_opacity= .4
-        ))
-    m.add_child(mc)
-
-    bounds = m.get_bounds()
-    m.fit_bounds(bounds)
+    m.fit_bounds([[df[lat_field].min(), df[long_field].min()],
+                  [df[lat_field].max(), df[long_field].max()]])
 
     # Show the map
     return m
 
 
+def points_geojson(df, fields=None, lat_field="FAC_LAT", long_field="FAC_LONG"):
+    '''
+    Make a GeoJSON FeatureCollection of points from the columns of df.
+
+    Parameters
+    ----------
+    df : Dataframe
+        Must contain lat_field and long_field
+    fields : list
+        Optional columns of df to put in the feature properties
+    lat_field : string
+        The latitude field
+    long_field : string
+        The longitude field
+
+    Returns
+    -------
+    dict
+    '''
+
+    fields = [] if fields is None else list(fields)
+    coordinates = np.round(df[[long_field, lat_field]].to_numpy(dtype=float), 6).tolist()
+    # pandas writes the properties a column at a time, as JSON values (null
+    # for missing ones and ISO strings for dates), so the layer can be sent
+    # to the browser
+    if fields:
+        properties = json.loads(df[fields].to_json(orient="records", date_format="iso"))
+    else:
+        properties = [{} for _ in range(len(df))]
+    features = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": c}, "properties": p}
+                for c, p in zip(coordinates, properties)]
+    return {"type": "FeatureCollection", "features": features}
+
+
 def ipymapper(df, bounds=None, no_text=False, lat_field='FAC_LAT', long_field='FAC_LONG', 
            name_field='FAC_NAME', info_field='DFR_URL', zoom=8):
     '''
     Display a map of the Dataframe passed in.
     Based on https://medium.com/@bobhaffner/folium-markerclusters-and-fastmarkerclusters-1e03b01cb7b1
 
+    The facilities are drawn as one GeoJSON layer on a canvas, so the
+    number of widgets doesn't grow with the number of facilities. Shapes
+    drawn on the map are collected in shapes, as in polygon_map.
+
     Parameters
     ----------
     df : Dataframe
@@ -780,19 +1002,19 @@ def ipymapper(df, bounds=None, no_text=False, lat_field='FAC_LAT', long_field='F
 
     Returns
     -------
-    ipyleaflet map
+    (ipyleaflet map, set of drawn shapes)
     '''
 
     if df.empty:
         print("The DataFrame is empty. There is nothing to map.")
         return None
 
-    # icon = AwesomeIcon(name='building')
-
     base = basemap_to_tiles(basemaps.CartoDB.Positron)
   
     df = df.dropna(subset=[name_field, lat_field, long_field])
     df = df.drop_duplicates(subset=[name_field, lat_field, long_field])
+    if ( bounds is not None ):
+        df = df[bounds_mask( df, bounds, lat_field, long_field )]
     center = [df.mean(numeric_only=True)[lat_field], 
               df.mean(numeric_only=True)[long_field]]
     print( f'Center is {center}')
@@ -803,29 +1025,37 @@ def ipymapper(df, bounds=None, no_text=False, lat_field='FAC_LAT', long_field='F
             scroll_wheel_zoom=True,
             min_zoom=2, 
             max_bounds=True,
+            prefer_canvas=True,
             layout=Layout(height='500px')
         )
 
     global shapes
     shapes = set()
     
-    markers = []
-    marker_radius = 10
-    # Add a clickable marker for each facility
-    for index, row in df.iterrows():
-        if ( bounds is not None ):
-            if (not check_bounds( row, bounds, lat_field, long_field)):
-                continue
-        mark = Marker()
-        mark.location = (row[lat_field], row[long_field])
-        mark.radius = marker_radius
-        mark.color = "black"
-        mark.fill_color = "orange"
-        mark.opacity = 0.7
-        mark.title = row[name_field]
-        markers.append(mark)
-    marker_cluster = MarkerCluster(markers=markers)
-    m.add(marker_cluster)
+    # All of the facilities go to the browser as one GeoJSON layer,
+    # rather than a Marker widget each
+    fields = [name_field] + ([info_field] if info_field in df.columns and not no_text else [])
+    facilities = GeoJSON(
+        data=points_geojson(df, fields, lat_field, long_field),
+        point_style={"radius": 6, "color": "black", "weight": 1,
+                     "fillColor": "orange", "fillOpacity": 0.7},
+        hover_style={"fillColor": "red"},
+        name="Facilities"
+    )
+    m.add(facilities)
+
+    # Show the facility under the pointer, and its ECHO report link when clicked
+    info = widgets.HTML()
+    m.add_control(WidgetControl(widget=info, position="bottomright"))
+    def show_name(feature, **kwargs):
+        info.value = str(feature["properties"][name_field])
+    def show_info(feature, **kwargs):
+        properties = feature["properties"]
+        info.value = str(properties[name_field])
+        if info_field in properties:
+            info.value += f" - <a href='{properties[info_field]}' target='_blank'>Link to ECHO detailed report</a>"
+    facilities.on_hover(show_name)
+    facilities.on_click(show_info)
 
     draw_control = GeomanDrawControl(polyline={}, polygon={}, marker={}, circlemarker={})
 
@@ -881,44 +1111,42 @@ def point_mapper(df, aggcol, quartiles=False, other_fac=None, other_text_column=
   if ( df is not None ):
 
     map_of_facilities = folium.Map()
-   
+
+    df = df[df["FAC_LAT"].notna() & df["FAC_LONG"].notna()]
     if quartiles == True:
-      df['quantile'] = pd.qcut(df[aggcol], 4, labels=False, duplicates="drop")
-      scale = {0: 8,1:12, 2: 16, 3: 24} # First quartile = size 8 circles, etc.
+      quantile = pd.qcut(df[aggcol], 4, labels=False, duplicates="drop")
+      scale = np.array([8, 12, 16, 24]) # First quartile = size 8 circles, etc.
+      r = scale[quantile.fillna(0).to_numpy(dtype=int)]
+    else:
+      r = pd.to_numeric(df[aggcol], errors="coerce").fillna(0).to_numpy(dtype=float)
+    lats = [df["FAC_LAT"].to_numpy(dtype=float)]
+    longs = [df["FAC_LONG"].to_numpy(dtype=float)]
+    radii = [r * 1.5] # arbitrary scalar
+    style_ids = [np.zeros(len(df), dtype=int)]
+    popups = [(aggcol + ": " + df[aggcol].astype(str)).tolist()]
+    styles = [{"color": "black", "weight": 1, "fillColor": "orange", "fillOpacity": .4},
+              {"color": "black", "weight": 1, "fillColor": "black", "fillOpacity": 1}]
 
-    # Add a clickable marker for each facility
-    for index, row in df.iterrows():
-      if quartiles == True:
-        r = scale[row["quantile"]]
-      else:
-        r = row[aggcol]
-      map_of_facilities.add_child(folium.CircleMarker(
-          location = [row["FAC_LAT"], row["FAC_LONG"]],
-          popup = aggcol+": "+str(row[aggcol]),
-          radius = r * 1.5, # arbitrary scalar
-          color = "black",
-          weight = 1,
-          fill_color = "orange",
-          fill_opacity= .4
-      ))
-    
     if ( other_fac is not None ):
-      for index, row in other_fac.iterrows():
-        text = "other facility"
-        if other_text_column is not None:
-            text = row[other_text_column]
-        map_of_facilities.add_child(folium.CircleMarker(
-            location = [row["FAC_LAT"], row["FAC_LONG"]],
-            popup = text,
-            radius = 4,
-            color = "black",
-            weight = 1,
-            fill_color = "black",
-            fill_opacity= 1
-        ))
-
-    bounds = map_of_facilities.get_bounds()
-    map_of_facilities.fit_bounds(bounds)
+      other_fac = other_fac[other_fac["FAC_LAT"].notna() & other_fac["FAC_LONG"].notna()]
+      lats.append(other_fac["FAC_LAT"].to_numpy(dtype=float))
+      longs.append(other_fac["FAC_LONG"].to_numpy(dtype=float))
+      radii.append(np.full(len(other_fac), 4))
+      style_ids.append(np.ones(len(other_fac), dtype=int))
+      if other_text_column is not None:
+        popups.append(other_fac[other_text_column].astype(str).tolist())
+      else:
+        popups.append(["other facility"] * len(other_fac))
+
+    # All of the symbols go in one layer, styled by their properties
+    lats, longs = np.concatenate(lats), np.concatenate(longs)
+    map_of_facilities.add_child(ColumnarCircleLayer(
+        lats, longs, np.concatenate(radii), styles,
+        style_ids=np.concatenate(style_ids), popups=[p for part in popups for p in part]
+    ))
+
+    if len(lats):
+      map_of_facilities.fit_bounds([[lats.min(), longs.min()], [lats.max(), longs.max()]])
 
     return map_of_facilities
 
@@ -926,7 +1154,8 @@ def point_mapper(df, aggcol, quartiles=False, other_fac=None, other_text_column=
     print( "There are no facilities to map." )
     
 
-def choropleth(polygons, attribute, key_id, attribute_table=None, legend_name=None, color_scheme="PuRd"):
+def choropleth(polygons, attribute, key_id, attribute_table=None, legend_name=None, color_scheme="PuRd",
+               simplify=True, tile_url=None, tile_layer=None, tile_max_zoom=12):
     '''
     creates choropleth map - shades polygons by attribute
 
@@ -938,6 +1167,12 @@ def choropleth(polygons, attribute, key_id, attribute_table=None, legend_name=No
     attribute_table: dataframe, optional.
     legend_name: str, a nice title for the legend
     color_scheme: str
+    simplify: bool, simplify the polygons to suit the map extent (see geometry.map_regions)
+    tile_url: str, optional URL template of vector tiles with the regions (e.g. from tiles.serve_tiles).
+        The regions are then drawn from the tiles and only their colors are put in the map;
+        polygons may be None if attribute_table is given.
+    tile_layer: str, the layer of the tiles with the regions, e.g. "county"
+    tile_max_zoom: int, the highest zoom the tiles were built for
 
     Returns
     ----------
@@ -949,8 +1184,38 @@ def choropleth(polygons, attribute, key_id, attribute_table=None, legend_name=No
 
     m = folium.Map()
 
+    if tile_url is not None:
+        if tile_layer is None:
+            print("Give the tile_layer that has the regions.")
+            return None
+        data = attribute_table if attribute_table is not None else polygons
+        values = pd.to_numeric(data[attribute], errors="coerce")
+        keys = data[key_id][values.notna()].astype(str)
+        values = values.dropna().to_numpy(dtype=float)
+        if len(values) == 0:
+            print("There are no values to map.")
+            return m
+        # Six equal bins, like folium.Choropleth
+        edges = np.histogram(values, bins=6)[1]
+        palette = np.array(color_brewer(color_scheme, 6))
+        colors = palette[np.searchsorted(edges[1:-1], values, side="left")]
+        style = {"weight": 1, "color": "black", "opacity": 0.2, "fill": True, "fillOpacity": 0.7}
+        m.add_child(VectorTileLayer(tile_url, tile_layer, key_id, style=style,
+                                    colors=dict(zip(keys, colors)), popup_fields=[key_id],
+                                    max_zoom=tile_max_zoom))
+        StepColormap(list(palette), index=list(edges), vmin=edges[0], vmax=edges[-1],
+                     caption=legend_name or "").add_to(m)
+        if isinstance(polygons, geopandas.GeoDataFrame) and polygons.geometry.notna().any():
+            if polygons.crs is not None:
+                polygons = polygons.to_crs(4326)
+            minx, miny, maxx, maxy = polygons.total_bounds
+            m.fit_bounds([[miny, minx], [maxy, maxx]])
+        return m
+
     polygons.reset_index(inplace=True) # Reset index
     polygons = polygons[~polygons.geometry.isna()] # Remove empty geographies we can't map   
+    if simplify:
+        polygons = map_regions(polygons)
     if attribute_table is not None: # if we have a separate attribute table that needs to be joined with the spatial data (polygons)...
         data = attribute_table
     else:
@@ -973,17 +1238,64 @@ def choropleth(polygons, attribute, key_id, attribute_table=None, legend_name=No
     return m
 
 
+def density_map(df, aggcol=None, cell_size=50000, shape="hex", agg="sum", legend_name=None,
+                color_scheme="PuRd", lat_field="FAC_LAT", long_field="FAC_LONG"):
+    '''
+    Map dense facility data (e.g. all active facilities nationally, or all
+    TRI reporters) as a choropleth of hexagonal or square cells rather than
+    one point each. Only the cells are sent to the browser.
+
+    Parameters
+    ----------
+    df : Dataframe
+        The facilities, e.g. the "data" from aggregate_by_facility. They must
+        have FAC_LAT and FAC_LONG fields.
+    aggcol : str
+        Optional field to aggregate, e.g. the "aggregator" from aggregate_by_facility.
+        If None, the facilities in each cell are counted.
+    cell_size : float
+        The width of a cell in (Web Mercator) metres
+    shape : str
+        'hex' or 'square'
+    agg : str
+        'sum' or 'mean' of aggcol in each cell
+    legend_name : str
+        A nice title for the legend
+    color_scheme : str
+    lat_field : str
+    long_field : str
+
+    Returns
+    -------
+    folium.Map
+    '''
+
+    cells = bin_points(df, aggcol, cell_size, shape, agg, lat_field, long_field)
+    if cells.empty:
+        print("There are no facilities to map.")
+        return None
+    attribute = "count" if aggcol is None else aggcol
+    if legend_name is None:
+        legend_name = attribute
+    return choropleth(cells, attribute, "cell", legend_name=legend_name, color_scheme=color_scheme,
+                      simplify=False)
+
+
 def bivariate_map(regions, points, bounds=None, no_text=False, region_fields=None, 
                   region_aliases = None, points_fields=None, points_aliases=None,
-                  show_marker=False):
+                  show_marker=False, simplify=True):
     '''
     show the map of region(s) (e.g. zip codes) and points (e.g. facilities within the regions)
     create the map using a library called Folium (https://github.com/python-visualization/folium)
     bounds can be preset if necessary
     no_text errors can be managed
+    simplify the regions to suit the map extent unless simplify is False
     '''
     m = folium.Map()  
 
+    if simplify:
+        regions = map_regions(regions)
+
     region_popup = None
     if region_fields:
        region_popup = folium.GeoJsonPopup(
@@ -1036,13 +1348,21 @@ def bivariate_map(regions, points, bounds=None, no_text=False, region_fields=Non
     display(m)
 
 
-def show_regions(regions, states, region_type, spatial_tables):
+def show_regions(regions, states, region_type, spatial_tables, simplify=True):
     '''
     show the map of just the regions (e.g. zip codes) and the selected state(s)
     create the map using a library called Folium (https://github.com/python-visualization/folium)
+    simplify the regions and states to suit the map extent unless simplify is False
     '''
     m = folium.Map()  
 
+    if simplify and not states.empty:
+        # The states set the extent of the map, so simplify both to match
+        states = map_regions(states)
+        regions = map_regions(regions, bounds=states.total_bounds)
+    elif simplify:
+        regions = map_regions(regions)
+
     # Show the state(s)
     s = folium.GeoJson(
       states,
@@ -1205,14 +1525,15 @@ def get_top_violators( df_active, flag, noncomp_field, action_field, num_fac=Non
     df = df_active.loc[ df_active[flag] == 'Y' ]
     if ( len( df ) == 0 ):
         return None
-    df_active = df.copy()
-    noncomp = df_active[ noncomp_field ]
-    noncomp_count = noncomp.str.count('S') + noncomp.str.count('V')
-    df_active['noncomp_count'] = noncomp_count
-    df_active = df_active[['FAC_NAME', 'noncomp_count', action_field,
-            'DFR_URL', 'FAC_LAT', 'FAC_LONG']]
-    df_active_all = df_active[df_active['noncomp_count'] > 0]
-    df_active = df_active_all.sort_values(by=['noncomp_count', action_field], 
+    noncomp_count = facility_noncompliance( df, noncomp_field )
+    df_active_all = df.loc[ noncomp_count > 0, ['FAC_NAME', action_field, 'DFR_URL', 'FAC_LAT', 'FAC_LONG'] ].copy()
+    df_active_all.insert( 1, 'noncomp_count', noncomp_count[ noncomp_count > 0 ] )
+    df_active = df_active_all
+    if num_fac is not None and len( df_active ) > num_fac > 0:
+        # Only facilities with at least the num_fac-th highest count can be in the top
+        counts = df_active['noncomp_count'].to_numpy()
+        df_active = df_active[ counts >= np.partition( counts, -num_fac )[-num_fac] ]
+    df_active = df_active.sort_values(by=['noncomp_count', action_field], 
             ascending=False)
     if num_fac is not None:
         df_active = df_active.head(num_fac)
@@ -1365,6 +1686,42 @@ def chart (full_data, date_column, counting_column, measure, function, title, mn
   ax.set_ylabel(title)
 
 
+def chart_rollup(program, level='State', state=None, regions=None, measure='count', unit=None):
+  '''
+  Draw a bar chart of a program's yearly totals for regions from its rollup
+  (see rollup.update_rollup), without going back to the records.
+
+  Parameters
+  ----------
+  program : str
+      The DataSet name, e.g. 'CWA Inspections'
+  level : str
+      One of rollup.ROLLUP_LEVELS, e.g. 'County'
+  state : str
+      Optional - the state of the regions
+  regions : list
+      Optional - the regions. Defaults to all of them at the level.
+  measure : {'count', 'sum', 'facilities'}
+      What to chart
+  unit : str
+      Optional - the y axis label, e.g. a DataSet's unit
+
+  Returns
+  -------
+  matplotlib Axes or None
+  '''
+  totals = yearly_totals(program, level, state, regions)
+  if totals is None or totals.empty:
+    print( "There is no data for this program and region after 2000." )
+    return None
+  title = ' - '.join([program, level] + ([state] if state else []) +
+                     ([', '.join(map(str, regions if isinstance(regions, list) else [regions]))] if regions else []))
+  ax = totals[[measure]].plot(kind='bar', title=title, figsize=(20, 10), legend=False, fontsize=16, color=colour)
+  ax.set_xlabel( 'Reporting Year' )
+  ax.set_ylabel( unit if unit is not None else measure.capitalize() )
+  return ax
+
+
 def handle_draw(self, action, geo_json):
   global shapes
   polygon=[]
@@ -1402,64 +1759,3 @@ def polygon_map(center=(39.8282,-98.5796), zoom=5):
   draw_control.on_draw(handle_draw)
   m.add_control(draw_control)
   return (m, shapes)
-
-def get_min_max_coord(coord_set):
-    '''
-    Get the minimum and maximum values of the set of 
-    (longitude, latitude) coordinates.
-
-    Parameters
-    ----------
-    coord_set : set
-        The set of (longitude, latitude) values.
-
-    Return
-    ------
-    A tuple with the results
-    '''
-
-    min_lat = 90
-    max_lat = 0
-    min_long = 180
-    max_long = -180
-    for x in list(coord_set):
-        lat = x[1]
-        long = x[0]
-        min_lat = lat if lat < min_lat else min_lat
-        max_lat = lat if lat > max_lat else max_lat
-        min_long = long if long < min_long else min_long
-        max_long = long if long > max_long else max_long
-        '''
-        for coord in x:
-            lat = coord[1]
-            long = coord[0]
-            min_lat = lat if lat < min_lat else min_lat
-            max_lat = lat if lat > max_lat else max_lat
-            min_long = long if long < min_long else min_long
-            max_long = long if long > max_long else max_long
-        '''
-    return (min_lat, max_lat, min_long, max_long)
-
-def get_facs_in_rect(df, lat_field, long_field, rect_set):
-    '''
-    Select the facilities whose latitude and longitude values
-    are inside the rectangle
-
-    Parameters
-    ----------
-    df : DataFrame
-        Containing the lat_field and long_field
-
-    lat_field : str
-        The name of the latitude field in the dataframe
-
-    long_field : str
-        The name of the longitude field
-
-    rect_set : set
-        The set of (longitude, latitude) values
-    '''
-    (min_lat, max_lat, min_long, max_long) = get_min_max_coord(rect_set)
-    result_df = df.loc[((df[lat_field] >= min_lat) & (df[lat_field] <= max_lat) & \
-                        (df[long_field] >= min_long) & (df[long_field] <= max_long))]
-    return result_df
@@ -0,0 +1,197 @@
+'''
+Rank the facilities with the most quarters of noncompliance in their
+ECHO_EXPORTER compliance histories, for one region or nationally.
+
+The histories are scored from their bitmasks (see compliance), and
+rank_violators keeps only the top k facilities for each program and
+region as batches of facilities (e.g. one state at a time) stream past,
+so a report like "the top 20 in every state for every program" comes out
+of one pass over the data without holding all of it.
+'''
+
+import numpy as np
+import pandas as pd
+from ECHO_modules.compliance import facility_noncompliance
+from ECHO_modules.get_data import get_echo_data
+
+# Program: its ECHO_EXPORTER flag, compliance history and formal action count fields
+PROGRAMS = {
+    'CAA': dict(flag='AIR_FLAG', history='CAA_3YR_COMPL_QTRS_HISTORY',
+                actions='CAA_FORMAL_ACTION_COUNT'),
+    'CWA': dict(flag='NPDES_FLAG', history='CWA_13QTRS_COMPL_HISTORY',
+                actions='CWA_FORMAL_ACTION_COUNT'),
+    'RCRA': dict(flag='RCRA_FLAG', history='RCRA_3YR_COMPL_QTRS_HISTORY',
+                 actions='RCRA_FORMAL_ACTION_COUNT'),
+    'SDWA': dict(flag='SDWIS_FLAG', history='SDWA_3YR_COMPL_QTRS_HISTORY',
+                 actions='SDWA_FORMAL_ACTION_COUNT'),
+}
+# The facility fields kept with each ranked facility
+RANKING_FIELDS = ['REGISTRY_ID', 'FAC_NAME', 'DFR_URL', 'FAC_LAT', 'FAC_LONG']
+
+
+def score_violators(df, program, region_field=None):
+    '''
+    The facilities in the program with any quarters of noncompliance, with
+    their noncomp_count and formal_action_count.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Facilities with ECHO_EXPORTER fields
+    program : str
+        One of PROGRAMS, e.g. 'CAA'
+    region_field : str
+        Optional - a field to keep with the facilities, e.g. 'FAC_STATE'
+
+    Returns
+    -------
+    DataFrame
+    '''
+    fields = PROGRAMS[program]
+    if 'REGISTRY_ID' not in df.columns and df.index.name == 'REGISTRY_ID':
+        df = df.reset_index()
+    df = df[df[fields['flag']] == 'Y']
+    counts = facility_noncompliance(df, fields['history'])
+    in_violation = counts > 0
+    columns = [c for c in RANKING_FIELDS if c in df.columns]
+    if region_field is not None and region_field not in columns:
+        columns.append(region_field)
+    scored = df.loc[in_violation, columns].copy()
+    scored['noncomp_count'] = counts[in_violation]
+    scored['formal_action_count'] = pd.to_numeric(df.loc[in_violation, fields['actions']], errors='coerce')
+    return scored
+
+
+def _top_k(scored, k):
+    '''
+    helper function for `rank_violators`
+    The k facilities of each program and region with the most quarters of
+    noncompliance, then formal actions, keeping earlier facilities on ties.
+    '''
+    actions = scored['formal_action_count'].fillna(-1).to_numpy()
+    order = np.lexsort((scored['arrival'].to_numpy(), -actions, -scored['noncomp_count'].to_numpy(),
+                        scored['region'].astype(str).to_numpy(), scored['program'].to_numpy()))
+    scored = scored.iloc[order]
+    return scored[scored.groupby(['program', 'region'], sort=False, dropna=False).cumcount().to_numpy() < k]
+
+
+def rank_violators(batches, programs=None, region_field='FAC_STATE', k=20):
+    '''
+    The top k violators of each program in each region, from batches of
+    facilities. Only the top k so far are kept between batches.
+
+    Parameters
+    ----------
+    batches : iterable
+        DataFrames of facilities with ECHO_EXPORTER fields, e.g. from
+        echo_exporter_batches
+    programs : list
+        Optional - programs in PROGRAMS. Defaults to all of them.
+    region_field : str
+        The field to rank within, e.g. 'FAC_STATE'. None ranks nationally.
+    k : int
+        The number of facilities to keep for each program and region
+
+    Returns
+    -------
+    tuple
+        The top violators, with program, region and rank columns
+        The number of violators in each program and region
+    '''
+    if programs is None:
+        programs = list(PROGRAMS)
+    kept = None
+    counts = []
+    arrival = 0
+    for batch in batches:
+        if batch is None or batch.empty:
+            continue
+        for program in programs:
+            scored = score_violators(batch, program, region_field)
+            if scored.empty:
+                continue
+            scored.insert(0, 'program', program)
+            scored.insert(1, 'region', 'All' if region_field is None else scored[region_field])
+            scored['arrival'] = np.arange(arrival, arrival + len(scored))
+            arrival += len(scored)
+            counts.append(scored.groupby(['program', 'region'], observed=True, dropna=False).size())
+            # Cut the batch down to its own top k before merging, as a heap would
+            kept = _top_k(scored if kept is None else pd.concat([kept, _top_k(scored, k)]), k)
+
+    if kept is None:
+        empty = pd.DataFrame(columns=['program', 'region', 'rank', 'noncomp_count', 'formal_action_count'])
+        return empty, pd.Series(dtype='int64', name='violators')
+    kept = kept.drop(columns=['arrival'] + ([region_field] if region_field in kept.columns else []))
+    kept.insert(2, 'rank', kept.groupby(['program', 'region'], sort=False, dropna=False).cumcount().to_numpy() + 1)
+    violators = pd.concat(counts).groupby(level=[0, 1], dropna=False).sum().rename('violators')
+    return kept.reset_index(drop=True), violators
+
+
+def echo_exporter_batches(states=None, programs=None, fields=None, active=True, api=True, token=None):
+    '''
+    Get the ECHO_EXPORTER fields needed to rank violators, one state at a time.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state.
+    programs : list
+        Optional - programs in PROGRAMS. Defaults to all of them.
+    fields : list
+        Optional - other ECHO_EXPORTER fields to get, e.g. ['FAC_DERIVED_CD113']
+    active : bool
+        Only include facilities with FAC_ACTIVE_FLAG set to 'Y'
+    api : bool
+        If True, use the API to get the data. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Yields
+    ------
+    DataFrame
+        The facilities in a state
+    '''
+    if states is None:
+        from ECHO_modules.geographies import states
+    if programs is None:
+        programs = list(PROGRAMS)
+    columns = (RANKING_FIELDS + ['FAC_STATE'] + list(fields or [])
+               + [f for p in programs for f in PROGRAMS[p].values()])
+    columns = list(dict.fromkeys(columns))
+    where = ' and FAC_ACTIVE_FLAG = \'Y\'' if active else ''
+    for state in states:
+        sql = f"select {', '.join(columns)} from ECHO_EXPORTER where FAC_STATE = '{state}'{where}"
+        yield get_echo_data(sql, api=api, token=token)
+
+
+def top_violators_by_region(states=None, programs=None, region_field='FAC_STATE', k=20,
+                            api=True, token=None):
+    '''
+    The top k active violators of each program in each region, e.g. the top
+    20 CAA, CWA, RCRA and SDWA violators in every state, in one pass over
+    ECHO_EXPORTER.
+
+    Parameters
+    ----------
+    states : list
+        Optional - state abbreviations. Defaults to every state.
+    programs : list
+        Optional - programs in PROGRAMS. Defaults to all of them.
+    region_field : str
+        The field to rank within, e.g. 'FAC_STATE'. None ranks nationally.
+    k : int
+        The number of facilities to keep for each program and region
+    api : bool
+        If True, use the API to get the data. If False, use the local delta lake connection
+    token : str
+        The authentication token for the api
+
+    Returns
+    -------
+    tuple
+        See rank_violators
+    '''
+    fields = [] if region_field is None else [region_field]
+    batches = echo_exporter_batches(states, programs, fields, api=api, token=token)
+    return rank_violators(batches, programs, region_field, k)
+
@@ -0,0 +1,111 @@
+"""
+Tests for aggregating DataSet records by facility.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import ECHO_modules.facilities as facilities
+from ECHO_modules.DataSet import DataSet
+from ECHO_modules.aggregation import aggregate_records, facility_dimension, record_dates
+from ECHO_modules.utilities import aggregate_by_facility
+
+
+def _records():
+    # Facility B's coordinates differ between its records
+    return pd.DataFrame({'NPDES_ID': ['A', 'B', 'A', 'B', None, 'C'],
+                         'FAC_NAME': ['Mill', 'Plant', 'Mill', 'Plant', 'X', 'Yard'],
+                         'FAC_LAT': [42.0, 43.0, 42.0, 43.0001, 44.0, np.nan],
+                         'FAC_LONG': [-75.0, -76.0, -75.0, -76.0, -77.0, -78.0],
+                         'YEARQTR': [20191, 20201, 20204, 20211, 20211, 20192],
+                         'NUME90Q': [1, 0, 2, 1, 5, 1], 'NUMCVDT': [0, 0, 1, 0, 0, 0],
+                         'NUMSVCD': [0, 0, 0, 0, 0, 0], 'NUMPSCH': [0, 0, np.nan, 2, 0, 0]})
+
+
+def test_aggregate_records():
+    df = _records()
+    dates = record_dates(df['YEARQTR'], '%Y')
+    assert dates[0] == np.datetime64('2019-01-01')
+    result = aggregate_records(df, 'NPDES_ID', df['NUME90Q'], dates, 'sum')
+
+    # One row per ID, with the attributes of its first record
+    assert result['NPDES_ID'].tolist() == ['A', 'B', 'C']
+    assert result['FAC_LAT'].tolist()[:2] == [42.0, 43.0]
+    assert result['count'].tolist() == [2, 2, 1]
+    assert result['sum'].tolist() == [3, 1, 1]
+    assert result['first_date'].tolist() == [pd.Timestamp('2019'), pd.Timestamp('2020'), pd.Timestamp('2019')]
+    assert result['last_date'].tolist() == [pd.Timestamp('2020'), pd.Timestamp('2021'), pd.Timestamp('2019')]
+    assert result['sum_2019'].tolist() == [1, 0, 1]
+    assert result['sum_2020'].tolist() == [2, 0, 0]
+    assert result['sum_2021'].tolist() == [0, 1, 0]
+    # Without values, records are counted
+    counts = aggregate_records(df, 'NPDES_ID', dates=dates)
+    assert counts['count_2020'].tolist() == [1, 1, 0]
+
+    # get_echo_data leaves the IDs in the index
+    indexed = aggregate_records(df.set_index('NPDES_ID'), 'NPDES_ID', df['NUME90Q'], dates, 'sum')
+    pd.testing.assert_frame_equal(indexed, result)
+
+    dimension = facility_dimension(df, 'NPDES_ID')
+    assert dimension.index.name == 'NPDES_ID' and dimension.loc['C', 'FAC_NAME'] == 'Yard'
+
+
+def test_aggregate_by_facility():
+    df = _records()
+    before = df.copy()
+    dataset = SimpleNamespace(name='CWA Violations', idx_field='NPDES_ID', date_field='YEARQTR',
+                              date_format='%Y', agg_col='NUME90Q')
+    records = SimpleNamespace(dataframe=df, dataset=dataset)
+    result = aggregate_by_facility(records, 'CWA Violations')
+
+    # The records are left alone, B isn't split by its coordinates, and C
+    # has no location to map
+    pd.testing.assert_frame_equal(df, before)
+    assert result['aggregator'] == 'sum' and result['diff'] is None
+    data = result['data']
+    assert data['NPDES_ID'].tolist() == ['A', 'B']
+    assert data['sum'].tolist() == [4, 3]
+
+
+def test_other_records_queries_the_region_once(monkeypatch):
+    queries = []
+
+    def get_active_facilities(state, region_type, regions_selected, **kwargs):
+        queries.append((state, region_type, regions_selected))
+        return pd.DataFrame({'NPDES_IDS': ['A', 'B', 'D', None], 'RCRA_IDS': ['R1', None, 'R2', 'R3']},
+                            index=pd.Index([1, 2, 3, 4], name='REGISTRY_ID'))
+
+    monkeypatch.setattr(facilities, 'get_active_facilities', get_active_facilities)
+    facilities.clear_active_universe()
+    dataset = SimpleNamespace(name='CWA Violations', idx_field='NPDES_ID', date_field='YEARQTR',
+                              date_format='%Y', agg_col='NUME90Q', echo_type='NPDES')
+    records = SimpleNamespace(dataframe=_records(), dataset=dataset, state='NY',
+                              region_type='County', region_value=['ALBANY'])
+    diff = aggregate_by_facility(records, 'CWA Violations', other_records=True)['diff']
+    assert diff.index.tolist() == [3]
+
+    # Another program in the same region doesn't query it again
+    assert facilities.facilities_without('NY', 'County', ['ALBANY'], 'RCRA', ['R2']).index.tolist() == [1, 4]
+    assert len(queries) == 1
+    facilities.clear_active_universe()
+
+
+def test_aggregate_stored_dates():
+    # DataSet.store_results parses the date field before the records are aggregated
+    dataset = DataSet('CWA Inspections', 'NPDES_INSPECTIONS', 'NPDES_INSPECTIONS_MVIEW', echo_type='NPDES',
+                      idx_field='NPDES_ID', date_field='ACTUAL_END_DATE', date_format='%m/%d/%Y',
+                      agg_type='count')
+    df = dataset._apply_date_filter(pd.DataFrame({
+        'NPDES_ID': ['A', 'B', 'A', 'B'], 'FAC_LAT': [42.0, 43.0, 42.0, 43.0], 'FAC_LONG': [-75.0, -76.0, -75.0, -76.0],
+        'ACTUAL_END_DATE': ['01/02/2019', '05/06/2020', '07/08/2021', 'bad']}), [2001, 2030])
+    assert pd.api.types.is_datetime64_any_dtype(df['ACTUAL_END_DATE'])
+    dates = record_dates(df['ACTUAL_END_DATE'], dataset.date_format)
+    assert dates.tolist() == record_dates(['01/02/2019', '05/06/2020', '07/08/2021'], '%m/%d/%Y').tolist()
+
+    records = SimpleNamespace(dataframe=df, dataset=dataset)
+    data = aggregate_by_facility(records, 'CWA Inspections')['data']
+    assert data['NPDES_ID'].tolist() == ['A', 'B']
+    assert data['first_date'].tolist() == [pd.Timestamp('2019-01-02'), pd.Timestamp('2020-05-06')]
+    assert data['last_date'].tolist() == [pd.Timestamp('2021-07-08'), pd.Timestamp('2020-05-06')]
+    assert data['count_2020'].tolist() == [0, 1]
@@ -0,0 +1,167 @@
+"""
+Tests for the paged ArcGIS REST fetcher, run against a local stand-in
+for an ArcGIS feature service so they don't need the network.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+import ECHO_modules.cache
+import ECHO_modules.get_data
+from ECHO_modules.get_data import get_arcgis_features, get_huc8_index, get_spatial_data, get_watersheds
+
+LAYER_PATH = "/arcgis/rest/services/Test/FeatureServer/0"
+FEATURES = [
+    {"type": "Feature", "id": i,
+     "properties": {"OBJECTID": i, "ZIP_CODE": f"{14200 + i}", "STATE": "NY" if i % 2 else "PA",
+                    "huc8": f"0202{i:04d}"},
+     "geometry": {"type": "Polygon", "coordinates": [[[-78.8 + i / 100, 42.9], [-78.7 + i / 100, 42.9],
+                                                      [-78.7 + i / 100, 43.0], [-78.8 + i / 100, 42.9]]]}}
+    for i in range(1, 12)
+]
+
+
+def _matches(where, properties):
+    # Only supports the "FIELD = 'x'" and "FIELD IN ('x', 'y')" clauses used below
+    if where == "1=1":
+        return True
+    field, values = re.match(r"(\w+) (?:=|IN) (.*)", where).groups()
+    return properties[field] in re.findall(r"'([^']*)'", values)
+
+
+class StandInArcGIS(BaseHTTPRequestHandler):
+    max_record_count = 3
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        cls = type(self)
+        cls.requests.append(form)
+        if self.path == LAYER_PATH:
+            return self._reply({"maxRecordCount": cls.max_record_count,
+                                "objectIdField": "OBJECTID"})
+        if self.path != LAYER_PATH + "/query":
+            return self._reply({"error": {"code": 400, "message": "Invalid URL"}})
+
+        matched = [f for f in FEATURES if _matches(form["where"], f["properties"])]
+        if form.get("returnCountOnly") == "true":
+            return self._reply({"count": len(matched)})
+
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(0.05)
+        offset = int(form.get("resultOffset", 0))
+        count = min(int(form.get("resultRecordCount", cls.max_record_count)),
+                    cls.max_record_count)
+        with cls.lock:
+            cls.in_flight -= 1
+        self._reply({"type": "FeatureCollection", "features": matched[offset:offset + count]})
+
+
+@pytest.fixture
+def service():
+    StandInArcGIS.requests = []
+    StandInArcGIS.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInArcGIS)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}{LAYER_PATH}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_pages_past_max_record_count(service):
+    gdf = get_arcgis_features(service + "/query", max_workers=2)
+    assert len(gdf) == len(FEATURES)
+    assert sorted(gdf["OBJECTID"]) == list(range(1, 12))
+    assert str(gdf.crs) == "EPSG:4326"
+    pages = [r for r in StandInArcGIS.requests if "resultOffset" in r]
+    assert sorted(int(r["resultOffset"]) for r in pages) == [0, 3, 6, 9]
+    assert all(r["orderByFields"] == "OBJECTID" for r in pages)
+    assert StandInArcGIS.max_in_flight <= 2
+
+
+def test_where_clause_and_page_size(service):
+    gdf = get_arcgis_features(service, where="STATE = 'NY'", page_size=2)
+    assert set(gdf["STATE"]) == {"NY"}
+    assert len(gdf) == 6
+    assert len([r for r in StandInArcGIS.requests if "resultOffset" in r]) == 3
+
+
+def test_no_matches_are_empty_and_errors_none(service):
+    assert get_arcgis_features(service, where="STATE = 'XX'").empty
+    assert get_arcgis_features(service.replace("/0", "/9")) is None
+
+
+def test_spatial_data_from_a_failed_service(service, tmp_path, monkeypatch):
+    monkeypatch.setattr(ECHO_modules.cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ECHO_modules.get_data, "WATERSHED_URL", service.replace("/0", "/9"))
+    regions, _ = get_spatial_data("HUC10 Watersheds", ["NY"], region_filter=["0202000101"])
+    assert regions.empty
+
+    # Every service is unreachable
+    broken = service.replace("/0", "/9")
+    features = ECHO_modules.get_data.get_arcgis_features
+    monkeypatch.setattr(ECHO_modules.get_data, "get_arcgis_features",
+                        lambda url, *args, **kwargs: features(broken, *args, **kwargs))
+    for region_type in ("County", "Zip Code", "Census Block Group"):
+        regions, states = get_spatial_data(region_type, ["NY"], region_filter=["Albany"])
+        assert regions.empty and states.empty
+
+
+def test_watersheds_are_chunked_and_cached(service, tmp_path, monkeypatch):
+    monkeypatch.setattr(ECHO_modules.cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ECHO_modules.get_data, "WATERSHED_URL", service)
+    monkeypatch.setattr(ECHO_modules.get_data, "HUC8_IDS_PER_REQUEST", 2)
+
+    gdf = get_watersheds(huc8_codes=[2020001, "02020002", "02020003"])
+    assert sorted(gdf["huc8"]) == ["02020001", "02020002", "02020003"]
+    wheres = [r["where"] for r in StandInArcGIS.requests if "resultOffset" in r]
+    assert sorted(wheres) == ["huc8 IN ('02020001', '02020002')", "huc8 IN ('02020003')"]
+
+    # Repeat requests are served from the cache, and only new HUC8s are fetched
+    StandInArcGIS.requests = []
+    gdf = get_watersheds(huc8_codes=["02020001", "02020004"])
+    assert sorted(gdf["huc8"]) == ["02020001", "02020004"]
+    wheres = [r["where"] for r in StandInArcGIS.requests if "resultOffset" in r]
+    assert wheres == ["huc8 IN ('02020004')"]
+
+    index = get_huc8_index()
+    assert "NY" in index.loc["02020001", "states"]
+    assert index.loc["02020001", "minx"] < index.loc["02020001", "maxx"]
+    assert index["minx"].notna().sum() == 4
+
+    # The index picks the HUC8s for states, and those already cached aren't requested
+    StandInArcGIS.requests = []
+    gdf = get_watersheds(["NY"])
+    assert sorted(gdf["huc8"]) == [f"0202{i:04d}" for i in range(1, 9)]
+    wheres = [r["where"] for r in StandInArcGIS.requests if "returnCountOnly" in r]
+    assert all("02020001" not in w for w in wheres)
+
+
+def test_watersheds_need_states_or_codes():
+    with pytest.raises(ValueError, match="states or the huc8_codes"):
+        get_watersheds()
+    with pytest.raises(ValueError, match="level"):
+        get_watersheds(["NY"], level=11)
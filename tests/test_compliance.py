@@ -0,0 +1,59 @@
+"""
+Tests for the compliance history bitmasks.
+"""
+import numpy as np
+import pandas as pd
+
+from ECHO_modules.compliance import (add_history_bitmasks, consecutive_quarters, facility_noncompliance,
+                                     history_bitmasks, longest_run, noncompliance_counts, popcount,
+                                     quarters_between)
+from ECHO_modules.get_data import _add_facility_columns
+
+
+def test_history_bitmasks():
+    history = pd.Series(["V__________S", "SSVV________", "____VVVVVVVS", None, "", "_VV_U",
+                         "VVVVVVVVVVVVV"])
+    violations, snc = history_bitmasks(history)
+    assert violations.dtype == np.uint16 and snc.dtype == np.uint16
+    # The last character is bit 0
+    assert violations.tolist() == [1 << 11, 0b0011 << 8, 0b1111111 << 1, 0, 0, 0b0110 << 1, (1 << 13) - 1]
+    assert snc.tolist() == [1, 0b1100 << 8, 1, 0, 0, 0, 0]
+
+    noncomp = violations | snc
+    assert popcount(noncomp).tolist() == noncompliance_counts(history).tolist()
+    assert consecutive_quarters(noncomp).tolist() == [1, 0, 8, 0, 0, 0, 13]
+    assert longest_run(noncomp).tolist() == [1, 4, 8, 0, 0, 2, 13]
+    assert quarters_between(violations, 0, 4).tolist() == [0, 0, 3, 0, 0, 2, 4]
+    assert quarters_between(violations, 4, 8).tolist() == [0, 0, 4, 0, 0, 0, 4]
+    assert popcount(np.array([0xffff, 0x8001], dtype=np.uint16)).tolist() == [16, 2]
+    assert consecutive_quarters(np.array([0xffff], dtype=np.uint16)).tolist() == [16]
+
+
+def test_facility_noncompliance_uses_bitmasks():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"CAA_3YR_COMPL_QTRS_HISTORY": ["".join(rng.choice(list("__VSU"), 12))
+                                                      for _ in range(500)],
+                       "CWA_13QTRS_COMPL_HISTORY": "_" * 13})
+    expected = noncompliance_counts(df["CAA_3YR_COMPL_QTRS_HISTORY"]).to_numpy()
+    assert (facility_noncompliance(df, "CAA_3YR_COMPL_QTRS_HISTORY") == expected).all()
+
+    add_history_bitmasks(df)
+    assert {"CAA_3YR_COMPL_QTRS_HISTORY_VIOL_MASK", "CWA_13QTRS_COMPL_HISTORY_SNC_MASK"} <= set(df.columns)
+    # The history isn't read again once there are bitmasks
+    df["CAA_3YR_COMPL_QTRS_HISTORY"] = None
+    assert (facility_noncompliance(df, "CAA_3YR_COMPL_QTRS_HISTORY") == expected).all()
+
+
+def test_noncompliance_with_missing_masks():
+    # Facilities concatenated from data with and without the masks
+    field = 'CAA_3YR_COMPL_QTRS_HISTORY'
+    with_masks = add_history_bitmasks(pd.DataFrame({field: ["VV__S", "_____"]}))
+    df = pd.concat([with_masks, pd.DataFrame({field: ["SVV__"]})], ignore_index=True)
+    assert df[field + '_VIOL_MASK'].isna().any()
+    assert facility_noncompliance(df, field).tolist() == [3, 0, 3]
+
+
+def test_masks_are_only_added_to_echo_exporter():
+    df = pd.DataFrame({'CAA_3YR_COMPL_QTRS_HISTORY': ["VV__S"]})
+    assert list(_add_facility_columns(df.copy(), 'CAA_VIOLATIONS_MVIEW').columns) == ['CAA_3YR_COMPL_QTRS_HISTORY']
+    assert 'CAA_3YR_COMPL_QTRS_HISTORY_SNC_MASK' in _add_facility_columns(df.copy(), 'ECHO_EXPORTER').columns
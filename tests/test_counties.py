@@ -0,0 +1,77 @@
+"""
+Tests for selecting counties by all of the FAC_COUNTY names ECHO has for them.
+"""
+from types import SimpleNamespace
+
+import pandas as pd
+
+import ECHO_modules.DataSet
+import ECHO_modules.facilities as facilities
+from ECHO_modules.DataSet import DataSet
+
+from ECHO_modules.get_data import _add_facility_columns
+from ECHO_modules.reference import add_county_canon, canonical_counties, county_canon
+from ECHO_modules.facilities import county_filter, get_county_variants, get_facs_in_counties
+
+
+def test_variants_are_limited_to_the_state():
+    variants = get_county_variants("TX", ["JEFFERSON"])
+    assert sorted(variants) == ["JEFFERSON", "JEFFERSON COUNTY"]
+    assert len(get_county_variants(None, ["JEFFERSON"])) > len(variants)
+
+
+def test_filter_quotes_names():
+    sql = county_filter("MD", "PRINCE GEORGE'S")
+    assert sql.startswith("FAC_STATE = 'MD' and (FAC_COUNTY in (")
+    assert "'PRINCE GEORGE''S COUNTY'" in sql
+    assert sql.endswith("or UPPER(TRIM(FAC_COUNTY)) like 'PRINCE GEORGE''S%')")
+    assert county_filter("TX", ["NOWHERE"]) == \
+        "FAC_STATE = 'TX' and (FAC_COUNTY in ('') or UPPER(TRIM(FAC_COUNTY)) like 'NOWHERE%')"
+
+
+def test_new_spellings_are_selected(monkeypatch):
+    # Spellings the corrected county table doesn't have, and a county the filter also matches
+    queries = []
+
+    def get_echo_data(sql, *args, **kwargs):
+        queries.append(sql)
+        return pd.DataFrame({"FAC_STATE": "TX", "FAC_ACTIVE_FLAG": "Y",
+                             "FAC_COUNTY": ["JEFFERSON", "Jefferson County ", "JEFFERSON CNTY", "JEFFERSON DAVIS"]},
+                            index=pd.Index([1, 2, 3, 4], name="REGISTRY_ID"))
+
+    monkeypatch.setattr(facilities, "get_echo_data", get_echo_data)
+    active = facilities.get_active_facilities("TX", "County", ["JEFFERSON"])
+    assert "like 'JEFFERSON%'" in queries[0]
+    assert active.index.tolist() == [1, 2]
+
+    monkeypatch.setattr(ECHO_modules.DataSet, "get_echo_data", get_echo_data)
+    dataset = DataSet("TX Facilities", "ECHO_EXPORTER", "ECHO_EXPORTER", echo_type="NPDES", idx_field="REGISTRY_ID",
+                      date_field="FAC_DATE", date_format="%m/%d/%Y", token="token")
+    dataset.last_modified_is_set = True
+    monkeypatch.setattr(dataset, "_apply_date_filter", lambda df, years: df)
+    monkeypatch.setattr(ECHO_modules.DataSet.requests, "get", lambda *args, **kwargs: SimpleNamespace(
+        status_code=200, json=lambda: {"last_modified": "Mon, 01 Jan 2024 00:00:00 "}))
+    records = dataset.get_data_delta("County", ["JEFFERSON"], "TX")
+    assert records.index.tolist() == [1, 2]
+
+
+def test_canonical_counties():
+    df = pd.DataFrame({"FAC_STATE": ["TX", "TX", "TX", "IL", "AK", "IL"],
+                       "FAC_COUNTY": ["JEFFERSON", "JEFFERSON COUNTY", "Jefferson County ",
+                                      "MC HENRY", "NEWTOWN CENSUS AREA", None]})
+    canon = add_county_canon(df)["FAC_COUNTY_CANON"]
+    assert isinstance(canon.dtype, pd.CategoricalDtype)
+    # Known names are looked up, others have their suffix stripped
+    assert list(canon[:5]) == ["JEFFERSON"] * 3 + ["MCHENRY", "NEWTOWN"]
+    assert pd.isna(canon[5])
+    assert list(canonical_counties(df["FAC_COUNTY"][:4])) == ["JEFFERSON"] * 3 + ["MC HENRY"]
+    assert list(get_facs_in_counties(df, ["JEFFERSON"]).index) == [0, 1, 2]
+
+
+def test_canon_is_only_added_to_echo_exporter():
+    df = pd.DataFrame({"FAC_STATE": ["TX", "TX"], "FAC_COUNTY": ["JEFFERSON COUNTY", "Jefferson County "]})
+    assert list(_add_facility_columns(df.copy(), "NPDES_INSPECTIONS_MVIEW").columns) == ["FAC_STATE", "FAC_COUNTY"]
+    assert list(_add_facility_columns(pd.DataFrame({"PGM_ID": ["TX01"]}), "ECHO_EXPORTER").columns) == ["PGM_ID"]
+    assert list(_add_facility_columns(df.copy(), "ECHO_EXPORTER")["FAC_COUNTY_CANON"]) == ["JEFFERSON"] * 2
+    # Records without the column are corrected when they are selected or grouped
+    assert list(county_canon(df)) == ["JEFFERSON"] * 2
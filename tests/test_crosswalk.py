@@ -0,0 +1,72 @@
+"""
+Tests for the facility to geography crosswalk, built from made up
+facilities and regions so they don't need the network.
+"""
+import geopandas
+import pandas as pd
+import pytest
+from shapely.geometry import box
+
+import ECHO_modules.cache
+import ECHO_modules.crosswalk
+from ECHO_modules.crosswalk import (build_crosswalk, crosswalk_codes, crosswalk_registry_ids,
+                                    load_crosswalk)
+
+FACILITIES = pd.DataFrame({
+    "REGISTRY_ID": ["110000000003", "110000000001", "110000000002", "110000000004"],
+    "FAC_LAT": [0.5, 0.5, 1.5, None],
+    "FAC_LONG": [0.5, 1.5, 0.5, 0.5],
+})
+HUC12S = geopandas.GeoDataFrame(
+    {"huc12": ["020200010101", "020200010102", "020200010103"]},
+    geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1), box(0, 1, 1, 2)], crs=4326)
+
+
+@pytest.fixture
+def crosswalk(tmp_path, monkeypatch):
+    monkeypatch.setattr(ECHO_modules.cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ECHO_modules.crosswalk, "get_echo_data", lambda sql, **kwargs: FACILITIES)
+    monkeypatch.setattr(ECHO_modules.crosswalk, "get_spatial_data",
+                        lambda region_type, states, state_boundaries=True: (HUC12S, None))
+    ECHO_modules.crosswalk._load_state.cache_clear()
+    assert build_crosswalk(["NY"], levels=["HUC12"]) == ["NY"]
+    yield
+    ECHO_modules.crosswalk._load_state.cache_clear()
+
+
+def test_build_stores_sorted_ids_and_categorical_codes(crosswalk):
+    df = load_crosswalk(["NY"])
+    assert df.index.dtype == "int64"
+    assert df.index.is_monotonic_increasing
+    assert isinstance(df["HUC12"].dtype, pd.CategoricalDtype)
+    assert pd.isna(df.loc[110000000004, "HUC12"])
+
+
+def test_registry_ids_for_regions(crosswalk):
+    ids = crosswalk_registry_ids("HUC12 Watersheds", "020200010101, 020200010103", ["NY"])
+    assert sorted(ids) == [110000000002, 110000000003]
+    assert len(crosswalk_registry_ids("HUC12 Watersheds", ["999"], ["NY"])) == 0
+    assert crosswalk_registry_ids("HUC12 Watersheds", ["020200010101"], ["PA"]) is None
+
+
+def test_codes_for_registry_ids(crosswalk):
+    codes = crosswalk_codes(["110000000001", 110000000003, "110000000009"], "HUC12")
+    assert list(codes[:2]) == ["020200010102", "020200010101"]
+    assert pd.isna(codes[2])
+    assert crosswalk_codes([110000000001], "TRACT_GEOID") is None
+
+
+def test_states_without_boundaries_are_not_written(crosswalk, monkeypatch):
+    # get_spatial_data returns empty boundaries when the service can't be reached
+    fetched = []
+
+    def get_spatial_data(region_type, states, state_boundaries=True):
+        fetched.append((region_type, states, state_boundaries))
+        return (HUC12S if states == ["NY"] else HUC12S.iloc[0:0]), None
+
+    monkeypatch.setattr(ECHO_modules.crosswalk, "get_spatial_data", get_spatial_data)
+    assert build_crosswalk(["PA", "NY"], levels=["HUC12"]) == ["NY"]
+    # Only the regions are fetched, not the states' boundaries
+    assert fetched == [("HUC12 Watersheds", ["PA"], False), ("HUC12 Watersheds", ["NY"], False)]
+    # PA is left to be built again rather than having no facilities in any HUC12
+    assert crosswalk_registry_ids("HUC12 Watersheds", ["020200010101"], ["PA"]) is None
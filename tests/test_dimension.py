@@ -0,0 +1,95 @@
+"""
+Tests for the local facility dimension, built from made up facilities so
+they don't need the network.
+"""
+import pandas as pd
+import pytest
+import requests
+
+import ECHO_modules.cache
+import ECHO_modules.dimension
+import ECHO_modules.facilities
+import ECHO_modules.get_data
+from ECHO_modules.dimension import build_facility_dimension, load_facility_dimension, lookup_facilities
+from ECHO_modules.facilities import get_active_facilities
+from ECHO_modules.get_data import get_last_modified
+from ECHO_modules.rsei_utilities import get_this_by_that
+
+FACILITIES = pd.DataFrame({
+    "REGISTRY_ID": ["110000000003", "110000000001", "110000000002", "110000000004"],
+    "FAC_NAME": ["C", "A", "B", "D"],
+    "FAC_STATE": ["NY"] * 4,
+    "FAC_COUNTY": ["ALBANY", "ALBANY COUNTY", "ERIE", "ALBANY"],
+    "FAC_COUNTY_CANON": ["ALBANY", "ALBANY", "ERIE", "ALBANY"],
+    "FAC_ZIP": ["12203", "12204", "14201", "12203"],
+    "FAC_LAT": ["42.6", "42.7", "42.9", None],
+    "FAC_LONG": ["-73.8", "-73.7", "-78.9", None],
+    "FAC_ACTIVE_FLAG": ["Y", "Y", "Y", "N"],
+    "NPDES_FLAG": ["Y", "N", "Y", "Y"],
+    "NPDES_IDS": ["NY0000003", None, "NY0000002", "NY0000004"],
+})
+
+
+@pytest.fixture
+def dimension(tmp_path, monkeypatch):
+    queries = []
+
+    def get_echo_data(sql, **kwargs):
+        queries.append(sql)
+        return FACILITIES.copy()
+
+    monkeypatch.setattr(ECHO_modules.cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ECHO_modules.dimension, "get_echo_data", get_echo_data)
+    ECHO_modules.dimension._load_state.cache_clear()
+    assert build_facility_dimension(["NY"], last_modified="v1") == ["NY"]
+    yield queries
+    ECHO_modules.dimension._load_state.cache_clear()
+
+
+def test_build_is_refreshed_by_last_modified(dimension):
+    df = load_facility_dimension("NY")
+    assert df["REGISTRY_ID"].is_monotonic_increasing and df["REGISTRY_ID"].dtype == "int64"
+    assert isinstance(df["NPDES_FLAG"].dtype, pd.CategoricalDtype)
+    assert build_facility_dimension(["NY"], last_modified="v1") == []
+    assert build_facility_dimension(["NY"], last_modified="v2") == ["NY"]
+    assert len(dimension) == 2
+
+
+def test_lookups_are_local(dimension, monkeypatch):
+    remote = []
+    monkeypatch.setattr(ECHO_modules.facilities, "get_echo_data", lambda sql, *args, **kwargs: remote.append(sql))
+    found = lookup_facilities([110000000002, 999, 110000000003], ["FAC_NAME"])
+    assert found.index.tolist() == [110000000002, 110000000003] and found["FAC_NAME"].tolist() == ["B", "C"]
+
+    county = get_active_facilities("NY", "County", ["ALBANY"], local=True)
+    assert county.index.tolist() == [110000000001, 110000000003]
+    assert remote == []
+    # A ZIP code could be in a state that isn't stored, so it's queried
+    get_active_facilities(None, "Zip Code", "12203", local=True)
+    assert len(remote) == 1
+
+    df = get_this_by_that("ECHO_EXPORTER", pd.Series(["110000000001", "110000000004"]), "REGISTRY_ID",
+                          this_columns="REGISTRY_ID, FAC_NAME")
+    assert df.to_dict("list") == {"REGISTRY_ID": [110000000001, 110000000004], "FAC_NAME": ["A", "D"]}
+
+
+def test_failed_states_are_skipped(dimension, monkeypatch):
+    # get_echo_data returns an empty DataFrame when the API request fails
+    results = {"NJ": pd.DataFrame(), "NY": FACILITIES.copy()}
+    monkeypatch.setattr(ECHO_modules.dimension, "get_echo_data",
+                        lambda sql, **kwargs: results[sql[-3:-1]])
+    assert build_facility_dimension(["NJ", "NY"], last_modified="v2") == ["NY"]
+    assert load_facility_dimension("NJ") is None
+
+
+def test_last_modified_times_out(monkeypatch):
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(kwargs)
+        raise requests.exceptions.ConnectTimeout("stalled")
+
+    monkeypatch.setattr(ECHO_modules.get_data.requests, "get", get)
+    assert get_last_modified("ECHO_EXPORTER", token="token", timeout=5) is None
+    assert calls[0]["timeout"] == 5
+    assert get_last_modified("NO_SUCH_TABLE", api=False) is None
@@ -0,0 +1,92 @@
+"""
+Tests for summarizing discharge monitoring reports in batches.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import ECHO_modules.DataSet
+import ECHO_modules.dmr as dmr
+from ECHO_modules.DataSet import DataSet
+from ECHO_modules.dmr import summarize_batch, summarize_dmrs
+
+DMRS = SimpleNamespace(name='2022 Discharge Monitoring', idx_field='EXTERNAL_PERMIT_NMBR', table_name='DMR_FY2022_MVIEW',
+                       date_field='LIMIT_BEGIN_DATE', date_format='%m/%d/%Y')
+
+
+def _reports(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'EXTERNAL_PERMIT_NMBR': rng.choice(['NY0001', 'NY0002', 'NY0003'], n),
+        'PERM_FEATURE_NMBR': rng.choice(['001', '002'], n),
+        'PARAMETER_CODE': rng.choice(['00310', '00530'], n),
+        'PARAMETER_DESC': 'BOD',
+        'LIMIT_BEGIN_DATE': rng.choice(['01/01/2022', '02/01/2022', '03/01/2022'], n),
+        'DMR_VALUE_STANDARD_UNITS': np.where(rng.random(n) < 0.2, np.nan, rng.random(n)),
+        'NODI_CODE': np.where(rng.random(n) < 0.1, 'C', None),
+        'EXCEEDENCE_PCT': np.where(rng.random(n) < 0.3, rng.integers(1, 500, n), np.nan),
+        'VIOLATION_CODE': np.where(rng.random(n) < 0.05, 'E90', None),
+    })
+
+
+def test_batches_match_one_pass():
+    batches = [_reports(500, seed) for seed in range(4)]
+    streamed = summarize_dmrs(iter(batches), DMRS)
+    whole = summarize_dmrs([pd.concat(batches, ignore_index=True)], DMRS)
+    pd.testing.assert_frame_equal(streamed, whole)
+    assert streamed['records'].sum() == 2000 and len(streamed) == 12
+
+
+def test_summarize_batch():
+    reports = pd.DataFrame({'EXTERNAL_PERMIT_NMBR': ['NY0001'] * 3, 'PERM_FEATURE_NMBR': ['001'] * 3,
+                            'PARAMETER_CODE': ['00310'] * 3, 'PARAMETER_DESC': ['BOD'] * 3,
+                            'LIMIT_BEGIN_DATE': ['01/01/2022', '02/01/2022', '03/01/2022'],
+                            'DMR_VALUE_STANDARD_UNITS': [1.0, np.nan, 3.0], 'NODI_CODE': [None, 'C', None],
+                            'EXCEEDENCE_PCT': [np.nan, np.nan, 40.0], 'VIOLATION_CODE': ['E90', None, 'E90']})
+    before = reports.copy()
+    row = summarize_dmrs([reports], DMRS).loc[('NY0001', '001', '00310')]
+    pd.testing.assert_frame_equal(reports, before)
+    assert row[['records', 'reported', 'exceedances', 'max_exceedence_pct']].tolist() == [3, 2, 2, 40.0]
+    assert row['completeness'] == 2 / 3 and row['last_period'] == pd.Timestamp('2022-03-01')
+    assert len(summarize_batch(reports, DMRS)) == 1
+    assert summarize_dmrs([], DMRS) is None
+
+
+def _dataset():
+    return DataSet('2022 Discharge Monitoring', 'NPDES_DMRS_FY2022', 'DMR_FY2022_MVIEW', echo_type='NPDES',
+                   idx_field='EXTERNAL_PERMIT_NMBR', date_field='LIMIT_BEGIN_DATE', date_format='%m/%d/%Y')
+
+
+def test_region_dmr_summary_queries_by_permit(monkeypatch):
+    queries = []
+
+    def get_echo_data(sql, **kwargs):
+        queries.append(sql)
+        return _reports(10, len(queries))
+
+    def get_active_facilities(state, region_type, region_value, **kwargs):
+        return pd.DataFrame({'NPDES_FLAG': ['Y', 'N', 'Y']}, index=pd.Index([11, 12, 13], name='REGISTRY_ID'))
+
+    # The EXP_PGM index has the program IDs of the facilities
+    monkeypatch.setattr(ECHO_modules.DataSet, 'program_ids', lambda ids: pd.DataFrame(
+        {'REGISTRY_ID': [11, 11, 13], 'PGM_ID': ['NY0001', 'NY0002', 'NY0001']}))
+    monkeypatch.setattr(dmr, 'get_echo_data', get_echo_data)
+    monkeypatch.setattr(dmr, 'get_active_facilities', get_active_facilities)
+    summary = dmr.region_dmr_summary(_dataset(), 'County', ['ALBANY'], 'NY', ids_per_request=1)
+
+    assert queries == [
+        "select EXTERNAL_PERMIT_NMBR, LIMIT_BEGIN_DATE, PERM_FEATURE_NMBR, PARAMETER_CODE, PARAMETER_DESC, "
+        "DMR_VALUE_STANDARD_UNITS, NODI_CODE, EXCEEDENCE_PCT, VIOLATION_CODE from DMR_FY2022_MVIEW "
+        "where EXTERNAL_PERMIT_NMBR in ('{}')".format(i) for i in ['NY0001', 'NY0002']]
+    assert summary['records'].sum() == 20
+
+
+def test_summarize_stored_dates():
+    # Reports DataSet.get_data has stored, with the date field parsed
+    dataset = _dataset()
+    reports = dataset._apply_date_filter(_reports(50, 0), [2001, 2030])
+    summary = summarize_dmrs([reports], dataset)
+    assert summary['records'].sum() == 50
+    assert summary['first_period'].min() == pd.Timestamp('2022-01-01')
+    assert summary['last_period'].max() == pd.Timestamp('2022-03-01')
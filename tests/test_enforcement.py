@@ -0,0 +1,65 @@
+"""
+Tests for matching violations to the responses that followed them.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from ECHO_modules.DataSet import DataSet
+from ECHO_modules.DataSetResults import DataSetResults
+from ECHO_modules.enforcement import repeat_gaps, response_lags, response_summary
+
+VIOLATIONS = SimpleNamespace(idx_field='ID_NUMBER', date_field='DATE_VIOLATION_DETERMINED', date_format='%m/%d/%Y')
+PENALTIES = SimpleNamespace(idx_field='ID_NUMBER', date_field='ENFORCEMENT_ACTION_DATE', date_format='%m/%d/%Y')
+
+
+def _violations():
+    return pd.DataFrame({'ID_NUMBER': ['A', 'A', 'B', 'C', 'A', None],
+                         'DATE_VIOLATION_DETERMINED': ['01/01/2020', '06/01/2020', '03/01/2020', '01/01/2021',
+                                                       '01/01/2022', '01/01/2020']}).set_index('ID_NUMBER')
+
+
+def test_response_lags():
+    penalties = pd.DataFrame({'ID_NUMBER': ['A', 'B', 'A', 'C'],
+                              'ENFORCEMENT_ACTION_DATE': ['03/01/2020', '02/01/2020', '12/31/2020', '06/01/2022']})
+    lags = response_lags(_violations(), penalties, violation_dataset=VIOLATIONS, response_dataset=PENALTIES)
+    lags = lags.set_index(['ID_NUMBER', 'violation_date'])['lag_days']
+    # The first response on or after each violation at the same facility
+    assert lags[('A', pd.Timestamp('2020-01-01'))] == 60
+    assert lags[('A', pd.Timestamp('2020-06-01'))] == 213
+    assert np.isnan(lags[('A', pd.Timestamp('2022-01-01'))])
+    assert np.isnan(lags[('B', pd.Timestamp('2020-03-01'))])
+    assert lags[('C', pd.Timestamp('2021-01-01'))] == 516
+
+    windowed = response_lags(_violations(), penalties, window=365, violation_dataset=VIOLATIONS,
+                             response_dataset=PENALTIES)
+    summary = response_summary(windowed)
+    assert summary.loc['All', ['violations', 'responded']].tolist() == [5, 2]
+    assert response_summary(windowed, 'year').loc[2020, 'response_rate'] == 2 / 3
+
+
+def test_repeat_gaps():
+    gaps = repeat_gaps(_violations(), VIOLATIONS)
+    assert gaps[gaps['ID_NUMBER'] == 'A']['gap_days'].tolist()[1:] == [152, 579]
+    assert gaps.groupby('ID_NUMBER').head(1)['gap_days'].isna().all()
+
+
+def test_stored_results():
+    # DataSetResults hold records whose date field DataSet.get_data has parsed
+    violations = DataSet('RCRA Violations', 'RCRA_VIOLATIONS', 'RCRA_VIOLATIONS_MVIEW', echo_type='RCRA',
+                         idx_field='ID_NUMBER', date_field='DATE_VIOLATION_DETERMINED', date_format='%m/%d/%Y')
+    penalties = DataSet('RCRA Penalties', 'RCRA_ENFORCEMENTS', 'RCRA_ENFORCEMENTS_MVIEW', echo_type='RCRA',
+                        idx_field='ID_NUMBER', date_field='ENFORCEMENT_ACTION_DATE', date_format='%m/%d/%Y')
+    stored_violations = DataSetResults(violations, 'State', state='NY')
+    stored_violations.store(violations._apply_date_filter(_violations(), [2001, 2030]))
+    stored_penalties = DataSetResults(penalties, 'State', state='NY')
+    stored_penalties.store(penalties._apply_date_filter(pd.DataFrame({
+        'ID_NUMBER': ['A', 'C'], 'ENFORCEMENT_ACTION_DATE': ['03/01/2020', '06/01/2022']}), [2001, 2030]))
+    assert pd.api.types.is_datetime64_any_dtype(stored_violations.dataframe['DATE_VIOLATION_DETERMINED'])
+
+    lags = response_lags(stored_violations, stored_penalties)
+    assert len(lags) == 5
+    assert lags['lag_days'].dropna().tolist() == [60, 516]
+    gaps = repeat_gaps(stored_violations)
+    assert gaps[gaps['ID_NUMBER'] == 'A']['gap_days'].tolist()[1:] == [152, 579]
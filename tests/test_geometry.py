@@ -0,0 +1,85 @@
+"""
+Tests for preparing boundary geometries for maps.
+"""
+import geopandas
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Polygon
+
+from ECHO_modules.geometry import (bin_points, map_regions, pick_tolerance, points_to_regions,
+                                   simplify_regions)
+
+
+def _neighbors():
+    # Two regions sharing a wiggly, densely sampled edge along x = 0
+    ys = np.linspace(0, 1, 2001)
+    edge = [(0.001 * np.sin(y * 80), y) for y in ys]
+    west = Polygon([(-1, 1), (-1, 0)] + edge)
+    east = Polygon(edge + [(1, 1), (1, 0)])
+    return geopandas.GeoDataFrame({"name": ["west", "east"]},
+                                  geometry=[west, east], crs="EPSG:4326")
+
+
+def shared_edge_length(a, b):
+    return a.boundary.intersection(b.boundary).length
+
+
+def test_simplified_neighbors_leave_no_gaps():
+    regions = _neighbors()
+    levels = simplify_regions(regions)
+    for level in levels.values():
+        west, east = level.geometry
+        assert west.intersection(east).area < 1e-12
+        assert abs(west.union(east).area - 2) < 1e-9
+        assert shared_edge_length(west, east) > 0.99
+
+
+def test_map_regions_shrinks_payload_without_slivers():
+    regions = _neighbors()
+    mapped = map_regions(regions, bounds=(-50, -20, 50, 20))
+    assert len(mapped.to_json()) * 10 < len(regions.to_json())
+    west, east = mapped.geometry
+    assert abs(west.union(east).area - 2) < 1e-9
+    assert shared_edge_length(west, east) > 0.99
+
+
+def test_pick_tolerance():
+    assert pick_tolerance((0, 0, 0.01, 0.01)) is None
+    assert pick_tolerance((-125, 24, -66, 50)) == 0.02
+    assert pick_tolerance((-80, 40, -79, 41)) == 0.001
+
+
+def test_points_to_regions():
+    regions = _neighbors()
+    facilities = pd.DataFrame({"FAC_LAT": [0.5, 0.5, 5, None, 0.0],
+                               "FAC_LONG": [-0.5, 0.5, 0, -0.5, 0.0]},
+                              index=["a", "b", "c", "d", "a"])
+    ids = points_to_regions(facilities, regions, "name")
+    assert ids.iloc[:4].fillna("none").tolist() == ["west", "east", "none", "none"]
+    # On the shared edge, a point is assigned to exactly one region
+    assert ids.iloc[4] in ("west", "east")
+
+
+def test_bin_points():
+    rng = np.random.default_rng(0)
+    points = pd.DataFrame({"FAC_LAT": rng.uniform(25, 49, 5000), "FAC_LONG": rng.uniform(-124, -67, 5000),
+                           "sum": rng.integers(0, 10, 5000)})
+    points.loc[0, "FAC_LAT"] = np.nan
+    located = points.dropna()
+    facilities = geopandas.GeoDataFrame(located, crs="EPSG:4326",
+                                        geometry=geopandas.points_from_xy(located.FAC_LONG, located.FAC_LAT))
+    for shape in ("hex", "square"):
+        cells = bin_points(points, "sum", cell_size=100000, shape=shape)
+        assert cells["count"].sum() == len(located)
+        assert cells["sum"].sum() == located["sum"].sum()
+        assert cells["cell"].is_unique
+        # Each facility is in exactly the cell it was counted in
+        joined = geopandas.sjoin(facilities, cells, predicate="within")
+        assert joined.index.is_unique and len(joined) == len(located)
+        assert (joined.groupby("cell").size().sort_index() == cells.set_index("cell")["count"].sort_index()).all()
+    mean = bin_points(points, "sum", cell_size=100000, agg="mean")
+    assert np.allclose(mean["sum"] * mean["count"], bin_points(points, "sum", cell_size=100000)["sum"])
+    with pytest.raises(ValueError):
+        bin_points(points, shape="triangle")
+    assert bin_points(points.head(0)).empty
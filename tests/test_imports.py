@@ -0,0 +1,29 @@
+"""
+The data layer should import without the mapping, charting and widget
+libraries, and within a time budget, so batch jobs don't pay for them.
+"""
+import json
+import subprocess
+import sys
+
+# Seconds to import the data layer in a fresh interpreter. It is about
+# half a second, nearly all of it pandas; importing utilities takes several.
+IMPORT_BUDGET = 3.0
+UI_MODULES = ["folium", "ipyleaflet", "ipywidgets", "seaborn", "matplotlib", "IPython",
+              "ECHO_modules.utilities"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import ECHO_modules.get_data, ECHO_modules.DataSet, ECHO_modules.make_data_sets
+import ECHO_modules.data_set_presets, ECHO_modules.facilities, ECHO_modules.crosswalk
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def test_data_layer_imports_without_ui_libraries():
+    result = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert [m for m in UI_MODULES if m in report["modules"]] == []
+    assert report["elapsed"] < IMPORT_BUDGET
@@ -0,0 +1,84 @@
+"""
+Tests for the folium mapping helpers in utilities.
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+from ECHO_modules.utilities import (bounds_mask, check_bounds, ipymapper, mapper, marker_text, marker_texts,
+                                    point_mapper, points_geojson)
+
+FACILITIES = pd.DataFrame({
+    "FAC_NAME": ["Plant A", "Plant </script> B", None, "Plant D", "Plant E"],
+    "FAC_LAT": [42.9, 43.1, 42.5, 40.0, np.nan],
+    "FAC_LONG": [-78.8, -78.6, -79.0, -75.0, -78.0],
+    "DFR_URL": ["https://echo.epa.gov/a", "https://echo.epa.gov/b", "https://echo.epa.gov/c",
+                "https://echo.epa.gov/d", "https://echo.epa.gov/e"],
+})
+BOUNDS = pd.DataFrame({"minx": [-80.0], "miny": [42.0], "maxx": [-78.0], "maxy": [44.0]})
+
+
+def test_vectorized_helpers_match_row_helpers():
+    rows = FACILITIES.dropna()
+    assert list(marker_texts(rows, False)) == [marker_text(row, False) for _, row in rows.iterrows()]
+    assert list(bounds_mask(rows, BOUNDS)) == [check_bounds(row, BOUNDS) for _, row in rows.iterrows()]
+    assert list(marker_texts(FACILITIES, True)) == [""] * 5
+    assert list(bounds_mask(FACILITIES, BOUNDS)) == [True, True, True, False, False]
+
+
+def test_mapper_sends_columns_to_the_browser():
+    html = mapper(FACILITIES, bounds=BOUNDS).get_root().render()
+    data = json.loads(re.search(r"_data = (\{.*?\});\n", html).group(1))
+    assert data["lat"] == [42.9, 43.1, 42.5]
+    assert data["long"] == [-78.8, -78.6, -79.0]
+    assert data["text"][1].startswith("Plant </script> B - ")
+    assert "</script> B" not in html
+    assert html.count("L.circleMarker") == 1
+
+
+def _layer_data(html):
+    return json.loads(re.search(r"_data = (\{.*?\});\n", html).group(1))
+
+
+def test_point_mapper_uses_one_layer():
+    aggregated = pd.DataFrame({"FAC_LAT": [42.9, 43.1, 42.5, 40.0], "FAC_LONG": [-78.8, -78.6, -79.0, -75.0],
+                               "violations": [1, 5, 10, 20]})
+    other = FACILITIES.head(2)
+    data = _layer_data(point_mapper(aggregated, "violations").get_root().render())
+    assert data["radius"] == [1.5, 7.5, 15.0, 30.0]
+    assert data["popup"][3] == "violations: 20"
+
+    html = point_mapper(aggregated, "violations", quartiles=True, other_fac=other,
+                        other_text_column="FAC_NAME").get_root().render()
+    data = _layer_data(html)
+    assert data["radius"] == [12.0, 18.0, 24.0, 36.0, 4.0, 4.0]
+    assert data["style"] == [0, 0, 0, 0, 1, 1]
+    assert data["popup"][4:] == ["Plant A", "Plant </script> B"]
+    assert html.count("L.geoJSON") == 1
+    assert "quantile" not in aggregated.columns
+
+
+def test_ipymapper_uses_one_layer():
+    many = pd.concat([FACILITIES.dropna()] * 1000, ignore_index=True)
+    many["FAC_LAT"] += np.arange(len(many)) / 1e6 # so they aren't dropped as duplicates
+    m, shapes = ipymapper(many, bounds=BOUNDS)
+    layers = [layer for layer in m.layers if layer.name == "Facilities"]
+    assert len(layers) == 1
+    assert len(layers[0].data["features"]) == 2000
+    assert len(m.layers) == 2 # the basemap and the facilities
+    assert shapes == set()
+
+
+def test_points_geojson():
+    df = pd.DataFrame({'FAC_LAT': [42.1234567, 43.0], 'FAC_LONG': [-75.0, -76.5], 'FAC_NAME': ['A', None],
+                       'COUNT': np.array([3, 4], dtype=np.int64), 'DATE': pd.to_datetime(['2020-01-02', None])},
+                      index=[10, 20])
+    collection = points_geojson(df, ['FAC_NAME', 'COUNT', 'DATE'])
+    json.dumps(collection)
+    assert [f['geometry']['coordinates'] for f in collection['features']] == [[-75.0, 42.123457], [-76.5, 43.0]]
+    assert collection['features'][0]['properties'] == {'FAC_NAME': 'A', 'COUNT': 3,
+                                                       'DATE': '2020-01-02T00:00:00.000'}
+    assert collection['features'][1]['properties'] == {'FAC_NAME': None, 'COUNT': 4, 'DATE': None}
+    assert points_geojson(df)['features'][1]['properties'] == {}
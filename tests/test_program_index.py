@@ -0,0 +1,55 @@
+"""
+Tests for the local REGISTRY_ID to program ID index, built from a made up
+EXP_PGM so they don't need the network.
+"""
+import pandas as pd
+import pytest
+
+import ECHO_modules.cache
+import ECHO_modules.program_index
+from ECHO_modules.program_index import build_program_index, program_ids, registry_ids
+
+EXP_PGM = pd.DataFrame({
+    "REGISTRY_ID": ["110000000002", "110000000001", "110000000002", "110000000003", "110000000002", None],
+    "PGM_ID": ["NY0000001", "NYD000000001", "NYD000000001", "NY0000001", "NY0000001", "X"],
+})
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    queries = []
+
+    def get_echo_data(sql, **kwargs):
+        queries.append(sql)
+        return EXP_PGM
+
+    monkeypatch.setattr(ECHO_modules.cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(ECHO_modules.program_index, "get_echo_data", get_echo_data)
+    ECHO_modules.program_index._load_index.cache_clear()
+    assert build_program_index(last_modified="v1")
+    yield queries
+    ECHO_modules.program_index._load_index.cache_clear()
+
+
+def test_lookups_in_both_directions(index):
+    found = program_ids([110000000002, 999, "110000000001"])
+    # Each facility's program IDs, once each and in order
+    assert found.values.tolist() == [[110000000002, "NY0000001"], [110000000002, "NYD000000001"],
+                                     [110000000001, "NYD000000001"]]
+    found = registry_ids(["NYD000000001", "NY0000001", "NONE"])
+    assert found.values.tolist() == [["NYD000000001", 110000000001], ["NYD000000001", 110000000002],
+                                     ["NY0000001", 110000000002], ["NY0000001", 110000000003]]
+    assert program_ids([]).empty
+
+
+def test_rebuilt_by_last_modified(index):
+    assert not build_program_index(last_modified="v1")
+    assert build_program_index(last_modified="v2")
+    assert len(index) == 2
+
+
+def test_failed_read_keeps_the_index(index, monkeypatch):
+    # get_echo_data returns an empty DataFrame when the API request fails
+    monkeypatch.setattr(ECHO_modules.program_index, "get_echo_data", lambda sql, **kwargs: pd.DataFrame())
+    assert not build_program_index(last_modified="v2")
+    assert program_ids([110000000001]).values.tolist() == [[110000000001, "NYD000000001"]]
@@ -0,0 +1,36 @@
+"""
+Tests for the packaged reference tables.
+"""
+import json
+import os
+
+import pandas as pd
+
+import ECHO_modules.geographies as geographies
+from ECHO_modules import reference
+
+DATA = os.path.join(os.path.dirname(__file__), "..", "data")
+
+
+def test_tables_match_the_source_data(tmp_path):
+    reference.build_reference_tables(DATA, str(tmp_path))
+    for name, filename in reference.REFERENCE_TABLES.items():
+        pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / filename), reference.load_table(name))
+    with open(os.path.join(DATA, "state_huc8_map.json")) as f:
+        assert reference.huc8_map() == json.load(f)
+
+
+def test_lookups():
+    assert reference.fips_map()["NY"] == "36"
+    assert reference.county_variants("TX", ["JEFFERSON"]) == ["JEFFERSON", "JEFFERSON COUNTY"]
+    assert "JEFFERSON" in reference.state_counties("TX")
+    assert reference.state_cds("NY")[:2] == [1, 2]
+    assert reference.state_huc8s(["NY", "NJ"]) == sorted(set(reference.state_huc8s("NY") + reference.state_huc8s("NJ")))
+    assert "NY" in reference.huc8_states(2020001)
+    assert reference.state_counties("XX") == []
+
+
+def test_geographies_loads_lazily():
+    assert "huc8" not in vars(geographies)
+    assert geographies.fips["NY"] == "36"
+    assert geographies.huc8["NY"] == reference.huc8_map()["NY"]
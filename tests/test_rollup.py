@@ -0,0 +1,84 @@
+"""
+Tests for the rollup of program records by year and region.
+"""
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import ECHO_modules.cache
+from ECHO_modules.DataSet import DataSet
+from ECHO_modules.rollup import load_rollup, region_totals, update_rollup, yearly_totals
+from ECHO_modules.utilities import chart_rollup
+
+INSPECTIONS = SimpleNamespace(name='CWA Inspections', idx_field='NPDES_ID', date_field='ACTUAL_END_DATE',
+                              date_format='%m/%d/%Y', agg_col='NPDES_ID')
+
+
+def _records(ids, dates, counties, state='NY'):
+    return pd.DataFrame({'NPDES_ID': ids, 'ACTUAL_END_DATE': dates, 'FAC_STATE': state,
+                         'FAC_COUNTY_CANON': counties, 'FAC_ZIP': '12203-1234',
+                         'FAC_DERIVED_HUC': 2020006.0, 'FAC_DERIVED_CD113': 20}).set_index('NPDES_ID')
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(ECHO_modules.cache, 'CACHE_DIR', str(tmp_path))
+
+
+def test_rollup_levels(cache):
+    records = _records(['A', 'A', 'B', 'C', 'C'],
+                       ['01/05/2019', '03/05/2019', '06/01/2020', '02/02/2019', None],
+                       ['ALBANY', 'ALBANY', 'ALBANY', 'ERIE', 'ERIE'])
+    before = records.copy()
+    update_rollup(records, INSPECTIONS)
+    pd.testing.assert_frame_equal(records, before)
+
+    facility = load_rollup('CWA Inspections', 'Facility', regions=['A'])
+    assert facility[['year', 'count']].values.tolist() == [[2019, 2]]
+    county = load_rollup('CWA Inspections', 'County', 'NY', ['ALBANY'])
+    assert county[['year', 'count', 'facilities']].values.tolist() == [[2019, 2, 1], [2020, 1, 1]]
+    assert load_rollup('CWA Inspections', 'Zip Code')['region'].unique().tolist() == ['12203']
+    assert load_rollup('CWA Inspections', 'Watershed')['region'].unique().tolist() == ['02020006']
+    assert yearly_totals('CWA Inspections', 'State', 'NY')['count'].to_dict() == {2019: 3, 2020: 1}
+    totals = region_totals('CWA Inspections', 'County', 'NY')
+    assert totals.loc[('NY', 'ALBANY'), ['count', 'facilities']].tolist() == [3, 2]
+
+
+def test_rollup_is_incremental(cache):
+    update_rollup(_records(['A', 'B'], ['01/05/2019', '06/01/2020'], ['ALBANY', 'ERIE']), INSPECTIONS)
+    # New records for A replace its rows, and B's are kept
+    update_rollup(_records(['A', 'A', 'D'], ['01/05/2019', '01/05/2021', '01/01/2021'],
+                           ['ALBANY', 'ALBANY', 'ALBANY']), INSPECTIONS)
+    assert yearly_totals('CWA Inspections', 'State', 'NY')['count'].to_dict() == {2019: 1, 2020: 1, 2021: 2}
+    assert yearly_totals('CWA Inspections', 'County', 'NY', ['ALBANY'])['facilities'].to_dict() == \
+        {2019: 1, 2021: 2}
+
+
+def test_chart_rollup(cache):
+    update_rollup(_records(['A', 'B'], ['01/05/2019', '06/01/2020'], ['ALBANY', 'ERIE']), INSPECTIONS)
+    ax = chart_rollup('CWA Inspections', 'County', 'NY', ['ALBANY'])
+    assert [t.get_text() for t in ax.get_xticklabels()] == ['2019']
+    assert chart_rollup('CWA Penalties') is None
+
+
+def test_rollup_stored_dates(cache):
+    # DataSetResults hold records whose date field DataSet.get_data has parsed
+    dataset = DataSet('CWA Inspections', 'NPDES_INSPECTIONS', 'NPDES_INSPECTIONS_MVIEW', echo_type='NPDES',
+                      idx_field='NPDES_ID', date_field='ACTUAL_END_DATE', date_format='%m/%d/%Y')
+    records = dataset._apply_date_filter(_records(['A', 'A', 'B'], ['01/05/2019', '03/05/2019', '06/01/2020'],
+                                                  ['ALBANY', 'ALBANY', 'ERIE']), [2001, 2030])
+    assert pd.api.types.is_datetime64_any_dtype(records['ACTUAL_END_DATE'])
+    update_rollup(SimpleNamespace(dataframe=records, dataset=dataset))
+    assert yearly_totals('CWA Inspections', 'State', 'NY')['count'].to_dict() == {2019: 2, 2020: 1}
+    county = load_rollup('CWA Inspections', 'County', 'NY', ['ERIE'])
+    assert county[['year', 'count', 'facilities']].values.tolist() == [[2020, 1, 1]]
+
+
+def test_rollup_corrects_county_spellings(cache):
+    # Records without FAC_COUNTY_CANON, e.g. locally mirrored ones
+    records = _records(['A', 'B'], ['01/05/2019', '06/01/2019'], None).drop(columns='FAC_COUNTY_CANON')
+    records['FAC_COUNTY'] = ['ALBANY', 'Albany County ']
+    update_rollup(records, INSPECTIONS)
+    county = load_rollup('CWA Inspections', 'County')
+    assert county[['region', 'count', 'facilities']].values.tolist() == [['ALBANY', 2, 2]]
@@ -0,0 +1,228 @@
+"""
+Tests for building vector tiles into an MBTiles file, with a small
+protobuf reader so they don't need a vector tile library. If
+mapbox_vector_tile is installed, the tiles are also decoded with it.
+"""
+import gzip
+import json
+import sqlite3
+import struct
+import urllib.request
+
+import geopandas
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Polygon, box, shape
+
+import ECHO_modules.cache
+import ECHO_modules.dimension
+import ECHO_modules.get_data
+from ECHO_modules.dimension import build_facility_dimension
+from ECHO_modules.tiles import build_echo_tiles, build_tiles, read_tile, serve_tiles
+from ECHO_modules.utilities import mapper
+
+
+def _varint(data, i):
+    shift = value = 0
+    while True:
+        byte = data[i]
+        value |= (byte & 0x7f) << shift
+        i += 1
+        shift += 7
+        if byte < 0x80:
+            return value, i
+
+
+def _fields(data):
+    i = 0
+    while i < len(data):
+        key, i = _varint(data, i)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, i = _varint(data, i)
+        elif wire_type == 1:
+            value, i = data[i:i + 8], i + 8
+        else:
+            length, i = _varint(data, i)
+            value, i = data[i:i + length], i + length
+        yield number, value
+
+
+def _packed(data):
+    i, values = 0, []
+    while i < len(data):
+        value, i = _varint(data, i)
+        values.append(value)
+    return values
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _rings(commands):
+    # The number of ClosePath commands in a geometry
+    i, rings = 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        rings += command == 7
+        i += 1 + (2 * count if command in (1, 2) else 0)
+    return rings
+
+
+def _decode(tile):
+    layers = {}
+    for _, layer in _fields(tile):
+        fields = list(_fields(layer))
+        name = next(v for n, v in fields if n == 1).decode()
+        keys = [v.decode() for n, v in fields if n == 3]
+        values = []
+        for _, value in (f for f in fields if f[0] == 4):
+            number, raw = next(_fields(value))
+            values.append({1: lambda r: r.decode(), 3: lambda r: struct.unpack('<d', r)[0],
+                           6: _unzigzag, 7: bool}[number](raw))
+        features = []
+        for _, feature in (f for f in fields if f[0] == 2):
+            parts = dict(_fields(feature))
+            tags = _packed(parts.get(2, b''))
+            features.append({'id': parts.get(1), 'type': parts[3],
+                             'properties': {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])},
+                             'geometry': _packed(parts[4])})
+        layers[name] = {'extent': dict(fields)[5], 'features': features}
+    return layers
+
+
+def _layers():
+    facilities = pd.DataFrame({'FAC_NAME': ['A', 'B', 'C'], 'FAC_LAT': [42.5, 42.5, np.nan],
+                               'FAC_LONG': [-78.5, -73.0, -75.0], 'score': [1.5, np.nan, 2.0]},
+                              index=pd.Index([110000000001, 110000000002, 110000000003], name='REGISTRY_ID'))
+    regions = geopandas.GeoDataFrame({'GEOID': ['36001', '36003']},
+                                     geometry=[Polygon([(-79, 42), (-76, 42), (-76, 43), (-79, 43)],
+                                                       [[(-78, 42.2), (-77, 42.2), (-77, 42.8), (-78, 42.8)]]),
+                                               box(-76, 42, -72, 43)], crs=4326)
+    return {'facilities': facilities, 'county': regions}
+
+
+def test_build_tiles(tmp_path):
+    path = str(tmp_path / 'echo.mbtiles')
+    assert build_tiles(path, _layers(), 0, 6, last_modified={'facilities': 'Mon, 01 Jan 2024'}) == \
+        ['facilities', 'county']
+
+    connection = sqlite3.connect(path)
+    metadata = dict(connection.execute('SELECT name, value FROM metadata'))
+    assert metadata['format'] == 'pbf' and metadata['maxzoom'] == '6'
+    vector_layers = {l['id']: l for l in json.loads(metadata['json'])['vector_layers']}
+    assert vector_layers['facilities']['fields'] == {'FAC_NAME': 'String', 'score': 'Number'}
+    assert [float(b) for b in metadata['bounds'].split(',')] == [-79, 42, -72, 43]
+    # MBTiles rows count from the south
+    assert connection.execute('SELECT tile_row FROM tiles WHERE zoom_level = 0').fetchall() == [(0,)]
+    connection.close()
+
+    # One tile has the whole world, with the layers joined
+    tile = _decode(gzip.decompress(read_tile(path, 0, 0, 0)))
+    assert sorted(tile) == ['county', 'facilities']
+    facilities = tile['facilities']['features']
+    assert [f['id'] for f in facilities] == [110000000001, 110000000002]
+    assert facilities[0]['properties'] == {'FAC_NAME': 'A', 'score': 1.5}
+    assert facilities[1]['properties'] == {'FAC_NAME': 'B'}
+    # A single point: MoveTo(1), then its zigzagged x and y
+    x = (-78.5 + 180) / 360 * 4096
+    y = (1 - np.log(np.tan(np.radians(42.5)) + 1 / np.cos(np.radians(42.5))) / np.pi) / 2 * 4096
+    command, zx, zy = facilities[0]['geometry']
+    assert command == 9 and (_unzigzag(zx), _unzigzag(zy)) == (round(x), round(y))
+
+    # At zoom 6 the facilities and regions are split between tiles, and
+    # the polygon keeps its hole
+    west = _decode(gzip.decompress(read_tile(path, 6, 18, 23)))
+    assert [f['id'] for f in west['facilities']['features']] == [110000000001]
+    polygon = next(f for f in west['county']['features'] if f['properties']['GEOID'] == '36001')
+    assert polygon['type'] == 3 and _rings(polygon['geometry']) == 2
+    assert read_tile(path, 6, 0, 0) is None
+
+
+def test_build_tiles_is_incremental(tmp_path):
+    path = str(tmp_path / 'echo.mbtiles')
+    layers = _layers()
+    build_tiles(path, layers, 0, 4, last_modified={'facilities': 'v1'})
+    assert build_tiles(path, layers, 0, 4, last_modified={'facilities': 'v1'}) == []
+
+    # A new last_modified rebuilds that layer, changed boundaries are found
+    # by their content, and layers that aren't passed in are kept
+    layers['facilities'] = layers['facilities'].iloc[:1]
+    assert build_tiles(path, {'facilities': layers['facilities']}, 0, 4,
+                       last_modified={'facilities': 'v2'}) == ['facilities']
+    tile = _decode(gzip.decompress(read_tile(path, 0, 0, 0)))
+    assert len(tile['facilities']['features']) == 1 and len(tile['county']['features']) == 2
+    assert build_tiles(path, {'county': layers['county']}, 0, 4) == []
+    assert build_tiles(path, {'county': layers['county'].iloc[:1]}, 0, 4) == ['county']
+    assert build_tiles(path, {'county': layers['county'].iloc[:1]}, 0, 5) == ['county']
+
+
+def test_serve_tiles_and_map(tmp_path):
+    path = str(tmp_path / 'echo.mbtiles')
+    build_tiles(path, _layers(), 0, 2)
+    url, server = serve_tiles(path)
+    try:
+        with urllib.request.urlopen(url.format(z=0, x=0, y=0)) as response:
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'facilities' in _decode(gzip.decompress(response.read()))
+        with urllib.request.urlopen(url.format(z=2, x=0, y=0)) as response:
+            assert response.read() == b''
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The map draws the facilities from the tiles rather than embedding them
+    df = _layers()['facilities'].reset_index().dropna(subset=['FAC_LAT'])
+    html = mapper(df, tile_url=url).get_root().render()
+    assert 'L.vectorGrid.protobuf' in html and '"110000000002"' in html
+    assert 'ColumnarMarkerCluster' not in html
+
+
+def test_tiles_decode_with_mapbox_vector_tile(tmp_path):
+    mapbox_vector_tile = pytest.importorskip('mapbox_vector_tile')
+    path = str(tmp_path / 'echo.mbtiles')
+    build_tiles(path, _layers(), 0, 6)
+
+    def decode(z, x, y):
+        return mapbox_vector_tile.decode(gzip.decompress(read_tile(path, z, x, y)),
+                                         default_options={'y_coord_down': True})
+
+    tile = decode(0, 0, 0)
+    assert sorted(tile) == ['county', 'facilities'] and tile['facilities']['extent'] == 4096
+    facilities = tile['facilities']['features']
+    assert [f['id'] for f in facilities] == [110000000001, 110000000002]
+    assert [f['properties'] for f in facilities] == [{'FAC_NAME': 'A', 'score': 1.5}, {'FAC_NAME': 'B'}]
+    x = (-78.5 + 180) / 360 * 4096
+    y = (1 - np.log(np.tan(np.radians(42.5)) + 1 / np.cos(np.radians(42.5))) / np.pi) / 2 * 4096
+    assert facilities[0]['geometry'] == {'type': 'Point', 'coordinates': [round(x), round(y)]}
+
+    # The polygons are valid, and the one with a hole keeps it
+    west = decode(6, 18, 23)
+    counties = {f['properties']['GEOID']: shape(f['geometry']) for f in west['county']['features']}
+    assert all(g.is_valid for g in counties.values())
+    assert counties['36001'].geom_type == 'Polygon' and len(counties['36001'].interiors) == 1
+
+
+def test_build_echo_tiles_from_the_facility_dimension(tmp_path, monkeypatch):
+    monkeypatch.setattr(ECHO_modules.cache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(ECHO_modules.dimension, 'get_echo_data', lambda sql, **kwargs: pd.DataFrame({
+        'REGISTRY_ID': ['110000000001', '110000000002'], 'FAC_NAME': ['A', 'B'], 'FAC_STATE': ['NY', 'NY'],
+        'FAC_LAT': ['42.5', '42.5'], 'FAC_LONG': ['-78.5', '-73.0'], 'DFR_URL': ['a', 'b']}))
+    ECHO_modules.dimension._load_state.cache_clear()
+    build_facility_dimension(['NY'], last_modified='v1')
+
+    def get_echo_data(sql, **kwargs):
+        raise AssertionError('ECHO_EXPORTER was queried')
+
+    monkeypatch.setattr(ECHO_modules.get_data, 'get_echo_data', get_echo_data)
+    path = str(tmp_path / 'echo.mbtiles')
+    try:
+        assert build_echo_tiles(path, ['NY'], region_types=(), max_zoom=2) == ['facilities']
+        # The facilities are only rebuilt once the dimension is
+        assert build_echo_tiles(path, ['NY'], region_types=(), max_zoom=2) == []
+    finally:
+        ECHO_modules.dimension._load_state.cache_clear()
+    tile = _decode(gzip.decompress(read_tile(path, 0, 0, 0)))
+    assert [f['id'] for f in tile['facilities']['features']] == [110000000001, 110000000002]
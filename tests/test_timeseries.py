@@ -0,0 +1,69 @@
+"""
+Tests for the yearly time series behind DataSetResults.show_chart.
+"""
+from types import SimpleNamespace
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from ECHO_modules.DataSet import DataSet
+from ECHO_modules.DataSetResults import DataSetResults
+from ECHO_modules.timeseries import program_series
+
+matplotlib.use('Agg')
+
+
+def _stored(dataset, df):
+    # The records as DataSet.get_data stores them, with the date field parsed
+    return dataset._apply_date_filter(df, [2001, 2030])
+
+
+def test_penalties_chart_twice_without_changing_the_records():
+    dataset = DataSet('CWA Penalties', 'CASE_ENFORCEMENT_CONCLUSIONS', 'CASE_ENFORCEMENT_CONCLUSIONS_MVIEW',
+                      echo_type='NPDES', idx_field='NPDES_ID', date_field='SETTLEMENT_ENTERED_DATE',
+                      date_format='%m/%d/%Y', agg_col='FED_PENALTY_ASSESSED_AMT', unit='dollars')
+    df = _stored(dataset, pd.DataFrame({
+        'SETTLEMENT_ENTERED_DATE': ['01/02/2019', '05/06/2019', '07/08/2021', '01/01/1999', None],
+        'FED_PENALTY_ASSESSED_AMT': [100.0, np.nan, 50.0, 10.0, 5.0],
+        'STATE_LOCAL_PENALTY_AMT': [1.0, 2.0, np.nan, 0.0, 0.0]}))
+    results = DataSetResults(dataset, 'State', state='NY')
+    results.store(df.copy())
+    first = results.show_chart()
+    second = results.show_chart()
+    pd.testing.assert_frame_equal(results.dataframe, df)
+    assert [p.get_height() for p in first.patches] == [p.get_height() for p in second.patches]
+    # The years between are filled in, as resampling did
+    amounts = results.yearly_series()['Amount']
+    assert amounts.to_dict() == {2019: 103.0, 2020: 0.0, 2021: 50.0}
+    assert results.yearly_series() is results.yearly_series()
+
+
+def test_chart_and_export_stored_dates(tmp_path):
+    for name, echo_type, date_field in [('CWA Inspections', 'NPDES', 'ACTUAL_END_DATE'),
+                                        ('SDWA Site Visits', 'SDWA', 'SITE_VISIT_DATE')]:
+        dataset = DataSet(name, 'TABLE', 'TABLE_MVIEW', echo_type=echo_type, idx_field='ID',
+                          date_field=date_field, date_format='%m/%d/%Y')
+        df = _stored(dataset, pd.DataFrame({'ID': ['A', 'B', 'A', 'C'],
+                                            date_field: ['01/02/2019', '01/03/2019', 'bad', '03/04/2021']}))
+        assert pd.api.types.is_datetime64_any_dtype(df[date_field])
+        results = DataSetResults(dataset, 'State', state='NY')
+        results.store(df)
+        assert results.show_chart() is not None
+        path = tmp_path / 'series.csv'
+        results.export_series(path)
+        exported = pd.read_csv(path, index_col='year')
+        assert exported[date_field].to_dict() == {2019: 2, 2020: 0, 2021: 1}
+
+
+def test_program_series():
+    violations = pd.DataFrame({'YEARQTR': [20191, 20192, 20211, 19994], 'NUME90Q': [1, 2, 3, 4],
+                               'NUMCVDT': [0, 1, 0, 0], 'NUMSVCD': [0, 0, 0, 0], 'NUMPSCH': [1, 0, 0, 0]})
+    series = program_series(violations, SimpleNamespace(name='CWA Violations'))
+    assert series.index.tolist() == [2019, 2021]
+    assert series.loc[2019].tolist() == [3, 1, 0, 1]
+
+    inspections = pd.DataFrame({'ACTUAL_END_DATE': ['01/02/2019', '01/03/2019', 'bad', '03/04/2020']})
+    series = program_series(inspections, SimpleNamespace(name='CWA Inspections', date_field='ACTUAL_END_DATE',
+                                                         date_format='%m/%d/%Y'))
+    assert series['ACTUAL_END_DATE'].to_dict() == {2019: 2, 2020: 1}
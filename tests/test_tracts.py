@@ -0,0 +1,100 @@
+"""
+Tests for the per-state Census Tract cache, built from made up tracts so
+they don't need the network.
+"""
+import io
+import os
+import zipfile
+from types import SimpleNamespace
+
+import geopandas
+import pyarrow.parquet as pq
+import pytest
+import requests
+from shapely.geometry import box
+
+import ECHO_modules.cache
+import ECHO_modules.get_data
+from ECHO_modules.cache import cache_path
+from ECHO_modules.get_data import get_tract_boundaries
+
+# State FIPS: GEOID10 and the longitude of the tract's western edge
+TRACTS = {
+    "36": {"36001000100": -74.0, "36001000200": -73.9, "36029000100": -78.8},
+    "34": {"34001000100": -74.6},
+}
+
+
+def _tracts(fips):
+    tracts = TRACTS[fips]
+    return geopandas.GeoDataFrame(
+        {"GEOID10": list(tracts), "NAMELSAD10": [f"Census Tract {g[-6:]}" for g in tracts],
+         "ALAND10": [1000] * len(tracts)},
+        geometry=[box(west, 42.6, west + 0.05, 42.65) for west in tracts.values()], crs="EPSG:4269")
+
+
+def _shapefile_zip(fips, tmp_path):
+    # The zipped shapefile TIGER serves for a state
+    folder = tmp_path / f"shp{fips}"
+    folder.mkdir()
+    _tracts(fips).to_file(folder / f"tl_2010_{fips}_tract10.shp")
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as z:
+        for name in os.listdir(folder):
+            z.write(folder / name, name)
+    return content.getvalue()
+
+
+@pytest.fixture
+def tiger(tmp_path, monkeypatch):
+    downloads = []
+    zips = {fips: _shapefile_zip(fips, tmp_path) for fips in TRACTS}
+
+    def get(url, **kwargs):
+        downloads.append(url)
+        fips = url.rsplit("_", 2)[-2]
+        if fips not in zips:
+            raise requests.exceptions.ConnectionError("no such state")
+        return SimpleNamespace(content=zips[fips], raise_for_status=lambda: None)
+
+    monkeypatch.setattr(ECHO_modules.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(ECHO_modules.get_data.requests, "get", get)
+    return downloads
+
+
+def test_states_are_downloaded_once_into_their_own_files(tiger):
+    tracts = get_tract_boundaries(["NY", "NJ"])
+    assert sorted(tracts["geoid10"]) == ["34001000100", "36001000100", "36001000200", "36029000100"]
+    assert tracts.crs == "EPSG:4269"
+    assert len(tiger) == 2
+    for fips in TRACTS:
+        path = cache_path("tracts", f"tl_2010_{fips}_tract10.parquet")
+        # The covering bbox column lets reads skip row groups
+        assert "bbox" in pq.read_schema(path).names
+
+    assert len(get_tract_boundaries(["NY"])) == 3
+    assert len(tiger) == 2
+
+
+def test_reads_are_narrowed_in_the_file(tiger):
+    _tracts("36").rename(columns=str.lower).to_parquet(
+        cache_path("tracts", "tl_2010_36_tract10.parquet"), write_covering_bbox=True)
+
+    tracts = get_tract_boundaries(["NY"], columns=["geoid10"])
+    assert list(tracts.columns) == ["geoid10", "geometry"] and len(tracts) == 3
+    albany = get_tract_boundaries(["NY"], bbox=(-74.1, 42.5, -73.8, 42.7))
+    assert sorted(albany["geoid10"]) == ["36001000100", "36001000200"]
+    one = get_tract_boundaries(["NY"], region_filter=[36029000100])
+    assert one["geoid10"].tolist() == ["36029000100"]
+    for gdf in (tracts, albany, one):
+        assert gdf.crs == "EPSG:4269"
+    assert tiger == []
+
+
+def test_failed_downloads_are_left_out(tiger):
+    tracts = get_tract_boundaries(["NY", "CT"])
+    assert sorted(tracts["geoid10"].str[:2].unique()) == ["36"]
+
+    tracts = get_tract_boundaries(["CT"])
+    assert tracts.empty and tracts.crs == "EPSG:4269"
+    assert not os.path.exists(cache_path("tracts", "tl_2010_09_tract10.parquet"))
@@ -0,0 +1,74 @@
+"""
+Tests for scoring compliance histories and ranking violators.
+"""
+import numpy as np
+import pandas as pd
+
+from ECHO_modules.compliance import noncompliance_counts
+from ECHO_modules.utilities import get_top_violators
+from ECHO_modules.violators import rank_violators
+
+
+def _facilities(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    chars = np.array(list("___________VS U-"))
+    history = ["".join(rng.choice(chars, 12)) for _ in range(n)]
+    df = pd.DataFrame({
+        "FAC_NAME": [f"Facility {i}" for i in range(n)],
+        "FAC_STATE": rng.choice(["NY", "NJ", "PA"], n),
+        "AIR_FLAG": rng.choice(["Y", "N"], n, p=[0.8, 0.2]),
+        "CAA_3YR_COMPL_QTRS_HISTORY": history,
+        "CAA_FORMAL_ACTION_COUNT": rng.integers(0, 4, n).astype(float),
+        "NPDES_FLAG": "Y",
+        "CWA_13QTRS_COMPL_HISTORY": [h + "V" for h in history],
+        "CWA_FORMAL_ACTION_COUNT": rng.integers(0, 4, n).astype(float),
+        "DFR_URL": "url", "FAC_LAT": 42.0, "FAC_LONG": -75.0,
+    }, index=pd.Index(np.arange(n) + 110000000000, name="REGISTRY_ID"))
+    df.loc[df.index[:5], "CAA_3YR_COMPL_QTRS_HISTORY"] = None
+    df.loc[df.index[5:10], "CAA_FORMAL_ACTION_COUNT"] = np.nan
+    return df
+
+
+def test_noncompliance_counts():
+    history = pd.Series(["__VS__S_____", None, "", "SSSSSSSSSSSS", "UUUU"], index=[5, 6, 7, 8, 9])
+    counts = noncompliance_counts(history)
+    assert counts.tolist() == [3, 0, 0, 12, 0]
+    assert counts.index.tolist() == [5, 6, 7, 8, 9]
+    assert noncompliance_counts(pd.Series([], dtype=object)).empty
+
+
+def test_get_top_violators_matches_full_sort():
+    df = _facilities()
+    top, violators = get_top_violators(df, "AIR_FLAG", "CAA_3YR_COMPL_QTRS_HISTORY", "CAA_FORMAL_ACTION_COUNT", 20)
+    # What the function used to do
+    expected = df[df["AIR_FLAG"] == "Y"].copy()
+    history = expected["CAA_3YR_COMPL_QTRS_HISTORY"]
+    expected["noncomp_count"] = history.str.count("S") + history.str.count("V")
+    expected = expected[["FAC_NAME", "noncomp_count", "CAA_FORMAL_ACTION_COUNT", "DFR_URL", "FAC_LAT", "FAC_LONG"]]
+    expected = expected[expected["noncomp_count"] > 0]
+    assert violators.index.equals(expected.index)
+    expected = expected.sort_values(by=["noncomp_count", "CAA_FORMAL_ACTION_COUNT"], ascending=False).head(20)
+    assert top.index.equals(expected.index)
+    assert top["noncomp_count"].tolist() == expected["noncomp_count"].astype(int).tolist()
+
+
+def test_rank_violators_streams_batches():
+    df = _facilities()
+    batches = [df.iloc[i:i + 700] for i in range(0, len(df), 700)]
+    top, violators = rank_violators(batches, ["CAA", "CWA"], "FAC_STATE", k=5)
+
+    for (program, state), rows in top.groupby(["program", "region"]):
+        flag, history, actions = (("AIR_FLAG", "CAA_3YR_COMPL_QTRS_HISTORY", "CAA_FORMAL_ACTION_COUNT")
+                                  if program == "CAA" else
+                                  ("NPDES_FLAG", "CWA_13QTRS_COMPL_HISTORY", "CWA_FORMAL_ACTION_COUNT"))
+        expected = get_top_violators(df[df["FAC_STATE"] == state], flag, history, actions, 5)[0]
+        assert rows["REGISTRY_ID"].tolist() == expected.index.tolist()
+        assert rows["rank"].tolist() == [1, 2, 3, 4, 5]
+        assert violators[(program, state)] == len(get_top_violators(df[df["FAC_STATE"] == state],
+                                                                    flag, history, actions)[1])
+    assert len(top) == 2 * 3 * 5
+
+    national, counts = rank_violators(batches, ["CAA"], None, k=3)
+    assert national["region"].unique().tolist() == ["All"]
+    assert counts[("CAA", "All")] == violators.loc["CAA"].sum()
+    assert rank_violators([], ["CAA"])[0].empty